@@ -2,53 +2,77 @@ from typing import Any, Text, Dict, List, Optional
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet, FollowupAction
-import os
-from actions.utils.vector_search import VectorSearchManager
+from actions.utils.embedders import cosine_rows
+from actions.utils.executors import run_in_pool
 from actions.utils.multi_question_handler import MultiQuestionHandler
 from actions.utils.context_manager import ContextManager
 from actions.utils.llm_response_generator import LLMResponseGenerator
+from actions.utils.tenants import indexes_from_env, registry_from_env, tenant_id
+from src.runtime_config import runtime_config
 
 class ActionHospitalFAQOptimized(Action):
     def __init__(self):
         super().__init__()
-        self.vector_search = VectorSearchManager()
+        self.tenants = registry_from_env()
+        # Per-tenant FAQ (and ingested document) indexes sharing one embedder; the default one is loaded up front
+        self.indexes = indexes_from_env(documents=True)
+        self.indexes.get(self.tenants.default)
         self.context_manager = ContextManager()
-        self.llm_generator = LLMResponseGenerator()
+        self.llm_generator = LLMResponseGenerator(default_tenant=self.tenants.default)
         self.multi_handler = MultiQuestionHandler()
+        self.runtime = runtime_config()
+        # Let the grounding check accept paraphrases the embedder considers equivalent
+        if self.indexes.embedder is not None:
+            self.llm_generator.validator.similarity = self.embedding_similarity
+
+    def embedding_similarity(self, a: str, b: str) -> float:
+        vectors = self.indexes.embedder.encode([a, b])
+        return float(cosine_rows(vectors[:1], vectors[1:])[0])
 
     def name(self) -> Text:
         return "action_hospital_faq_optimized"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         user_message = tracker.latest_message.get('text', '')
-        user_id = tracker.sender_id
+        tenant = self.tenants.get(tenant_id(tracker))
+        user_id = tenant.session_key(tracker.sender_id)
         intent = tracker.latest_message.get('intent', {}).get('name')
-        confidence = tracker.latest_message.get('intent', {}).get('confidence', 0.0)
         context = self.context_manager.get_context(user_id)
+        # Loading (or building) a tenant's index is blocking work too
+        vector_search = self.indexes.peek(tenant) or await run_in_pool("retrieval", self.indexes.get, tenant)
+
+        settings = self.runtime.current()
+        use_llm = settings.use_llm
 
-        # Multi-question detection
-        is_multi = self.multi_handler.detect_multi_questions(user_message)
-        if is_multi:
-            questions = self.multi_handler.split_questions_with_context(user_message)
-            faqs = []
-            for q in questions:
-                results = self.vector_search.hybrid_search(q, context, top_k=1)
-                if results:
+        # Multi-question: segment once, retrieve all clauses in one batch, answer once
+        faqs = []
+        questions = self.multi_handler.split_questions_with_context(user_message)
+        if len(questions) > 1:
+            batch = await run_in_pool("retrieval", vector_search.hybrid_search_batch, questions, context, top_k=1)
+            seen = set()
+            for results in batch:
+                # A clause nothing matches well is noise, not a question to answer
+                if not results or results[0].get('similarity_score', 0.0) < settings.low_similarity:
+                    continue
+                if results[0].get('id') not in seen:
+                    seen.add(results[0].get('id'))
                     faqs.append(results[0])
-            if not faqs:
-                response = "Maaf, saya tidak dapat menemukan jawaban untuk pertanyaan-pertanyaan Anda. Mohon perjelas pertanyaan Anda."
-            else:
-                response = self.llm_generator.generate_response(user_message, faqs, context, confidence, multi_question=True)
-            # Update context with the last FAQ
-            if faqs:
+            if len(faqs) > 1:
+                best_score = min(f.get('similarity_score', 0.0) for f in faqs)
+                if use_llm and self.llm_generator.should_generate(user_message, faqs, best_score, intent, multi_question=True):
+                    response = await run_in_pool("generation", self.llm_generator.generate_response, user_message, faqs, context, best_score, multi_question=True, tenant=tenant)
+                else:
+                    response = "\n\n".join(f.get('answer', '') for f in faqs if f.get('answer'))
+                # Update context with the last FAQ
                 self.context_manager.update_context(user_id, user_message, response, faqs[-1])
-            dispatcher.utter_message(text=response)
-            return []
+                dispatcher.utter_message(text=response)
+                return []
 
-        # Single question flow
-        faqs = self.vector_search.hybrid_search(user_message, context, top_k=3)
+        # Single question flow; a multi-question message whose clauses all land on one FAQ answers as that FAQ
+        if not faqs:
+            faqs = await run_in_pool("retrieval", vector_search.hybrid_search, user_message, context, top_k=3)
         if not faqs:
             response = "Maaf, saya tidak dapat menemukan informasi yang relevan. Silakan tanyakan dengan cara lain atau hubungi administrasi."
             dispatcher.utter_message(text=response)
@@ -57,17 +81,13 @@ class ActionHospitalFAQOptimized(Action):
         # Confidence-based LLM integration
         best_faq = faqs[0]
         sim_score = best_faq.get('similarity_score', 0.0)
-        use_llm = os.getenv("USE_LLM", "true").lower() == "true"
-        if use_llm:
-            if sim_score >= 0.8:
-                response = self.llm_generator.generate_response(user_message, [best_faq], context, sim_score)
-            elif sim_score >= 0.4:
-                response = self.llm_generator.generate_response(user_message, [best_faq], context, sim_score)
-            else:
-                response = self.llm_generator.generate_response(user_message, faqs, context, sim_score)
+        if use_llm and self.llm_generator.llm and sim_score < settings.low_similarity:
+            response = self.llm_generator.low_conf_fallback(user_message, faqs, context)
+        elif use_llm and self.llm_generator.should_generate(user_message, [best_faq], sim_score, intent):
+            response = await run_in_pool("generation", self.llm_generator.generate_response, user_message, [best_faq], context, sim_score, tenant=tenant)
         else:
             response = best_faq.get('answer', 'Maaf, saya tidak dapat membantu.')
 
         self.context_manager.update_context(user_id, user_message, response, best_faq)
         dispatcher.utter_message(text=response)
-        return []
\ No newline at end of file
+        return []
@@ -1,25 +1,56 @@
-from typing import Any, Text, Dict, List
+import logging
+from typing import Any, Text, Dict, List, Optional
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
-import json
 import os
-import time
 import hashlib
-import pickle
-from llama_cpp import Llama
+import re
+import threading
+import time
+from collections import OrderedDict
+from actions.utils.executors import run_in_pool
+from actions.utils.llm_loader import load_llama
+from actions.utils.metrics import record_cache, timed_completion, track_stage
+from actions.utils.prefetch import RelatedFaqPrefetcher, prefetcher_from_env
+from actions.utils.prompt_builder import PromptBuilder, PromptTooLong, Slot, corpus_version
+from actions.utils.session_state import SessionSnapshot, history_turns, store_from_env, transcript
+from actions.utils.single_flight import SingleFlight
+from actions.utils.tenants import Tenant, registry_from_env, tenant_id
+from src.runtime_config import runtime_config
+
+logger = logging.getLogger(__name__)
+
+PREFETCHED_ANSWERS = 256  # Prefetched answers kept across all tenants, least recently used first out
 
 class OptimizedConversationalAction(Action):
     def __init__(self):
         super().__init__()
-        # Load FAQ data
-        self.faq_data = self.load_faq_data()
+        # FAQ corpora, hospital names and prompt overrides per tenant (one by default)
+        self.tenants = registry_from_env()
+        # Generation budgets and the response cache size, tunable without reloading the model
+        self.runtime = runtime_config()
         
         # Initialize llama.cpp model with optimizations
         self.llm = None
         self.cache = {}  # Simple in-memory cache
+        self.llm_lock = threading.Lock()  # One llama.cpp context = one generation at a time
+        self.inflight = SingleFlight("response")  # Identical concurrent questions share one generation
+        self.sessions = None  # Per-sender KV snapshots so history costs only the new turn
+        self.prompts = None
         self.initialize_llm()
-        self.warm_up_model()
+        if self.llm:
+            self.sessions = store_from_env()
+            self.prompts = PromptBuilder(self.llm)
+        # Prefork workers warm up after the fork instead (src/prefork.py): a child
+        # forked after llama.cpp's OpenMP pool has run in the parent can hang
+        if int(os.getenv("WEB_CONCURRENCY", 1)) <= 1:
+            self.warm_up_model()
+        # Answer FAQs a sender is likely to ask about next while idle, keyed by (tenant, FAQ id)
+        self.prefetchers: Dict[str, Optional[RelatedFaqPrefetcher]] = {}
+        self._prefetchers_lock = threading.Lock()
+        self.prefetched = OrderedDict()  # (tenant id, FAQ id) -> (corpus version, prepared at, answer)
+        self._prefetched_lock = threading.Lock()
     
     def initialize_llm(self):
         """Initialize the llama.cpp model with optimizations"""
@@ -30,19 +61,15 @@ class OptimizedConversationalAction(Action):
         for model_path in model_paths:
             if os.path.exists(model_path):
                 try:
-                    print(f"🔄 Loading optimized model: {model_path}")
+                    logger.info(f"Loading optimized model: {model_path}")
                     
                     # Optimized configuration based on the article
-                    self.llm = Llama(
-                        model_path=model_path,
+                    # (LLAMA_CONTEXT_SIZE / LLAMA_N_THREADS / LLAMA_N_BATCH override these)
+                    self.llm = load_llama(
+                        model_path,
                         n_ctx=1024,        # Reduced from 2048 for speed
-                        n_threads=8,       # Optimized for M2
+                        n_threads=8,
                         n_batch=512,       # Larger batch for efficiency
-                        n_gpu_layers=0,    # CPU only
-                        verbose=False,
-                        use_mmap=True,     # Memory mapping
-                        use_mlock=False,   # Don't lock memory
-                        seed=42,           # Deterministic
                         f16_kv=True,       # Use f16 for key/value cache
                         vocab_only=False,
                         embedding=False,
@@ -50,21 +77,21 @@ class OptimizedConversationalAction(Action):
                         rope_freq_scale=1.0
                     )
                     
-                    print(f"✅ Optimized model loaded: {model_path}")
-                    print(f"📊 Model size: {os.path.getsize(model_path) / (1024**3):.2f} GB")
+                    logger.info(f"Optimized model loaded: {model_path}")
+                    logger.info(f"Model size: {os.path.getsize(model_path) / (1024**3):.2f} GB")
                     return
                     
                 except Exception as e:
-                    print(f"❌ Failed to load {model_path}: {e}")
+                    logger.error(f"Failed to load {model_path}: {e}")
                     continue
         
-        print("⚠️  No models found. Will use predefined responses only.")
+        logger.warning("No models found. Will use predefined responses only.")
         self.llm = None
     
     def warm_up_model(self):
         """Warm up the model to reduce first request latency"""
         if self.llm:
-            print("🔥 Warming up model...")
+            logger.info("Warming up model...")
             try:
                 # Quick warm-up with minimal tokens
                 _ = self.llm(
@@ -75,13 +102,18 @@ class OptimizedConversationalAction(Action):
                     top_k=20,
                     repeat_penalty=1.1
                 )
-                print("✅ Model warmed up successfully!")
+                logger.info("Model warmed up successfully!")
             except Exception as e:
-                print(f"⚠️  Warm-up failed: {e}")
+                logger.warning(f"Warm-up failed: {e}")
+    
+    @staticmethod
+    def normalize_message(user_message: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key"""
+        return " ".join(re.sub(r"[^\w\s]", " ", user_message.lower()).split())
     
-    def get_cache_key(self, user_message: str, intent: str) -> str:
-        """Generate cache key for user message"""
-        content = f"{user_message}:{intent}"
+    def get_cache_key(self, user_message: str, intent: str, tenant: str = "", corpus=None) -> str:
+        """Generate cache key for user message (scoped to the tenant id and its FAQ corpus version)"""
+        content = f"{tenant}:{corpus}:{self.normalize_message(user_message)}:{intent}"
         return hashlib.md5(content.encode()).hexdigest()
     
     def get_cached_response(self, cache_key: str) -> str:
@@ -90,28 +122,30 @@ class OptimizedConversationalAction(Action):
     
     def cache_response(self, cache_key: str, response: str):
         """Cache response (simple in-memory cache)"""
-        # Keep cache size manageable (max 100 entries)
-        if len(self.cache) > 100:
-            # Remove oldest entries
-            oldest_keys = list(self.cache.keys())[:20]
+        # Keep cache size manageable (response_cache_size entries, 0 disables it)
+        limit = self.runtime.current().response_cache_size
+        if limit == 0:
+            return
+        if len(self.cache) > limit:
+            # Remove oldest entries (a fifth at a time; all the excess if the limit was lowered)
+            oldest_keys = list(self.cache.keys())[:len(self.cache) - limit + max(1, limit // 5)]
             for key in oldest_keys:
-                del self.cache[key]
+                self.cache.pop(key, None)
         
         self.cache[cache_key] = response
     
-    def load_faq_data(self):
-        """Load FAQ data from JSON file"""
-        try:
-            with open("data/faqs.json", "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"❌ Failed to load FAQ data: {e}")
-            return []
+    def prefetcher_for(self, tenant: Tenant) -> Optional[RelatedFaqPrefetcher]:
+        """Related-FAQ prefetcher of a tenant, started on its first FAQ question"""
+        if tenant.id not in self.prefetchers:
+            with self._prefetchers_lock:
+                if tenant.id not in self.prefetchers:
+                    self.prefetchers[tenant.id] = prefetcher_from_env(tenant.faqs(), lambda faq: self.prefetch_faq(faq, tenant))
+        return self.prefetchers[tenant.id]
     
     def name(self) -> Text:
         return "action_optimized_conversational"
     
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
@@ -121,34 +155,113 @@ class OptimizedConversationalAction(Action):
         # Get the user message
         user_message = tracker.latest_message.get('text', '')
         
+        # Get conversation history (last 4 messages for context)
+        conversation_history = self.get_conversation_history(tracker)
+        tenant = self.tenants.get(tenant_id(tracker))
+        # KV snapshots and prefetch predictions are per sender within a tenant
+        session_id = tenant.session_key(tracker.sender_id)
+        if intent and intent.startswith('faq_'):
+            prefetcher = self.prefetcher_for(tenant)
+            if prefetcher:
+                prefetched = None
+                if prefetcher.observe(session_id, intent):
+                    prefetched = self.take_prefetched(tenant, intent, prefetcher.prediction_ttl)
+                prefetcher.served(prefetched is not None)
+                if prefetched:
+                    # The predicted follow-up: answer it now, in the first-turn and contextual paths alike
+                    if self.sessions is not None:
+                        await run_in_pool("retrieval", self.remember_turn, session_id, user_message, prefetched)
+                    dispatcher.utter_message(text=prefetched)
+                    return []
+        
+        # Follow-ups ("kalau hari Sabtu?") depend on the conversation, so only
+        # first turns are answered from / stored in the shared response cache
+        contextual = self.sessions is not None and any(m['type'] == 'bot' for m in conversation_history)
+        if contextual:
+            with track_stage("action_response"):
+                response = await run_in_pool("generation", self.respond, user_message, intent, conversation_history, session_id, tenant)
+            dispatcher.utter_message(text=response)
+            return []
+        
         # Check cache first
-        cache_key = self.get_cache_key(user_message, intent)
+        cache_key = self.get_cache_key(user_message, intent, tenant.id, corpus_version(tenant.faqs_path))
         cached_response = self.get_cached_response(cache_key)
+        record_cache("response", bool(cached_response))
         
         if cached_response:
-            print(f"⚡ Using cached response for: {user_message[:30]}...")
+            logger.debug(f"Using cached response for: {user_message[:30]}...")
             dispatcher.utter_message(text=cached_response)
             return []
         
-        # Get conversation history (last 4 messages for context)
-        conversation_history = self.get_conversation_history(tracker)
-        
-        # Handle different types of interactions
-        if intent == 'greet':
-            response = self.handle_greeting(user_message, conversation_history)
-        elif intent == 'goodbye':
-            response = self.handle_goodbye(user_message, conversation_history)
-        elif intent.startswith('faq_'):
-            response = self.handle_faq_question(user_message, intent, conversation_history)
-        else:
-            response = self.handle_casual_conversation(user_message, conversation_history)
+        async def generate() -> str:
+            # Handle different types of interactions
+            with track_stage("action_response"):
+                if self.llm:
+                    # Generation blocks for seconds; keep the event loop free for other conversations
+                    response = await run_in_pool("generation", self.respond, user_message, intent, conversation_history, session_id, tenant)
+                else:
+                    # Predefined responses are cheap enough to answer inline
+                    response = self.respond(user_message, intent, conversation_history, tenant=tenant)
+            
+            # Cache the response before waking up any coalesced duplicates
+            self.cache_response(cache_key, response)
+            return response
         
-        # Cache the response
-        self.cache_response(cache_key, response)
+        # Concurrent misses for the same key (e.g. after a broadcast) wait for one generation
+        response = await self.inflight.do(cache_key, generate)
         
         dispatcher.utter_message(text=response)
         return []
     
+    def respond(self, user_message: str, intent: str, conversation_history: List[Dict], session_id: str = None,
+                tenant: Tenant = None) -> str:
+        """Route to the handler for the intent (blocking while llama.cpp generates)"""
+        tenant = tenant or self.tenants.default
+        with self.llm_lock:
+            if intent == 'greet':
+                return self.handle_greeting(user_message, conversation_history, session_id, tenant)
+            elif intent == 'goodbye':
+                return self.handle_goodbye(user_message, conversation_history, session_id, tenant)
+            elif intent and intent.startswith('faq_'):
+                return self.handle_faq_question(user_message, intent, conversation_history, session_id, tenant)
+            else:
+                return self.handle_casual_conversation(user_message, conversation_history, session_id, tenant)
+
+    def build_prompt(self, tenant: Tenant, name: str, stage: str, max_tokens: int, **slots) -> str:
+        """Fill the tenant's `name` template with its hospital name and `slots`"""
+        return self.prompts.build(tenant.template(name), stage, max_tokens,
+                                  hospital_name=Slot(tenant.name, cacheable=True), **slots)
+
+    def complete(self, prompt: str, stage: str, session_id: str = None, history: List[Dict] = None, **kwargs) -> Dict:
+        """Run a completion, continuing the sender's conversation when sessions are on.
+
+        The sender's snapshot is restored first, so llama.cpp's prefix match
+        only evaluates this turn's prompt; afterwards the new state is saved.
+        Once the oldest turns have to be dropped the snapshot no longer
+        prefixes the transcript and is not restored. Must be called with
+        llm_lock held.
+        """
+        if self.sessions is None or session_id is None:
+            return timed_completion(self.llm, prompt, stage, **kwargs)
+
+        snapshot = self.sessions.get(session_id)
+        turns = list(snapshot.turns) if snapshot else history_turns(history or [])
+        # Drop the oldest turns once the transcript would crowd out the reply
+        budget = self.prompts.token_budget(kwargs.get('max_tokens', 128))
+        used = self.prompts.count(prompt) + sum(self.prompts.count(transcript([turn], "")) for turn in turns)
+        trimmed = False
+        while turns and used > budget:
+            used -= self.prompts.count(transcript([turns.pop(0)], ""))
+            trimmed = True
+        full_prompt = transcript(turns, prompt)
+        if snapshot is not None and not trimmed:
+            snapshot.restore(self.llm)
+
+        response = timed_completion(self.llm, full_prompt, stage, **kwargs)
+        turns.append((prompt, response['choices'][0]['text']))
+        self.sessions.put(session_id, SessionSnapshot.capture(self.llm, turns))
+        return response
+    
     def get_conversation_history(self, tracker: Tracker) -> List[Dict]:
         """Get recent conversation history for context"""
         history = []
@@ -173,21 +286,25 @@ class OptimizedConversationalAction(Action):
         # Return last 4 exchanges (8 messages max)
         return messages[-8:] if len(messages) > 8 else messages
     
-    def handle_greeting(self, user_message: str, history: List[Dict]) -> str:
+    def handle_greeting(self, user_message: str, history: List[Dict], session_id: str = None, tenant: Tenant = None) -> str:
         """Handle greetings with optimized generation"""
+        tenant = tenant or self.tenants.default
+        fallback = f"Halo! Saya adalah asisten {tenant.name}. Ada yang bisa saya bantu?"
         if not self.llm:
-            return "Halo! Saya adalah asisten RS Bhayangkara Brimob. Ada yang bisa saya bantu?"
+            return fallback
         
         try:
             # Short, focused prompt
-            prompt = f"""<s>[INST] Kamu adalah asisten RS Bhayangkara Brimob yang ramah. User berkata: "{user_message}"
-
-Jawab dengan ramah dalam bahasa Indonesia. Singkat dan natural. Jangan gunakan emoji atau bahasa Inggris. [/INST]"""
+            budget = self.runtime.current().generation("greeting")  # Short for speed
+            prompt = self.build_prompt(tenant, "greeting", "llm_greeting", budget["max_tokens"], user_message=user_message)
 
-            response = self.llm(
+            response = self.complete(
                 prompt,
-                max_tokens=60,      # Shorter for speed
-                temperature=0.7,    # Balanced creativity
+                "llm_greeting",
+                session_id,
+                history,
+                max_tokens=budget["max_tokens"],
+                temperature=budget["temperature"],
                 top_p=0.9,
                 top_k=40,
                 repeat_penalty=1.1,
@@ -197,28 +314,32 @@ Jawab dengan ramah dalam bahasa Indonesia. Singkat dan natural. Jangan gunakan e
             generated_text = response['choices'][0]['text'].strip()
             
             if not generated_text or len(generated_text) < 5:
-                return "Halo! Saya adalah asisten RS Bhayangkara Brimob. Ada yang bisa saya bantu?"
+                return fallback
             
             return generated_text
             
         except Exception as e:
-            print(f"❌ Greeting generation failed: {e}")
-            return "Halo! Saya adalah asisten RS Bhayangkara Brimob. Ada yang bisa saya bantu?"
+            logger.error(f"Greeting generation failed: {e}")
+            return fallback
     
-    def handle_goodbye(self, user_message: str, history: List[Dict]) -> str:
+    def handle_goodbye(self, user_message: str, history: List[Dict], session_id: str = None, tenant: Tenant = None) -> str:
         """Handle goodbyes with optimized generation"""
+        tenant = tenant or self.tenants.default
+        fallback = f"Terima kasih telah menghubungi {tenant.name}. Semoga hari Anda menyenangkan!"
         if not self.llm:
-            return "Terima kasih telah menghubungi RS Bhayangkara Brimob. Semoga hari Anda menyenangkan!"
+            return fallback
         
         try:
-            prompt = f"""<s>[INST] Kamu adalah asisten RS Bhayangkara Brimob. User berkata: "{user_message}"
+            budget = self.runtime.current().generation("goodbye")
+            prompt = self.build_prompt(tenant, "goodbye", "llm_goodbye", budget["max_tokens"], user_message=user_message)
 
-Jawab dengan ramah untuk mengucapkan selamat tinggal dalam bahasa Indonesia. Singkat. Jangan gunakan emoji atau bahasa Inggris. [/INST]"""
-
-            response = self.llm(
+            response = self.complete(
                 prompt,
-                max_tokens=50,
-                temperature=0.7,
+                "llm_goodbye",
+                session_id,
+                history,
+                max_tokens=budget["max_tokens"],
+                temperature=budget["temperature"],
                 top_p=0.9,
                 top_k=40,
                 repeat_penalty=1.1,
@@ -228,34 +349,35 @@ Jawab dengan ramah untuk mengucapkan selamat tinggal dalam bahasa Indonesia. Sin
             generated_text = response['choices'][0]['text'].strip()
             
             if not generated_text or len(generated_text) < 5:
-                return "Terima kasih telah menghubungi RS Bhayangkara Brimob. Semoga hari Anda menyenangkan!"
+                return fallback
             
             return generated_text
             
         except Exception as e:
-            print(f"❌ Goodbye generation failed: {e}")
-            return "Terima kasih telah menghubungi RS Bhayangkara Brimob. Semoga hari Anda menyenangkan!"
+            logger.error(f"Goodbye generation failed: {e}")
+            return fallback
     
-    def handle_casual_conversation(self, user_message: str, history: List[Dict]) -> str:
+    def handle_casual_conversation(self, user_message: str, history: List[Dict], session_id: str = None, tenant: Tenant = None) -> str:
         """Handle casual conversation with optimized generation"""
+        tenant = tenant or self.tenants.default
         if not self.llm:
             return "Maaf, saya tidak dapat membantu dengan pertanyaan tersebut. Silakan hubungi bagian administrasi untuk informasi lebih lanjut."
         
         try:
+            budget = self.runtime.current().generation("casual")
             # Check if it's a casual question
             if any(word in user_message.lower() for word in ['apa kabar', 'bagaimana kabar', 'selamat pagi', 'selamat siang', 'selamat malam']):
-                prompt = f"""<s>[INST] Kamu adalah asisten RS Bhayangkara Brimob yang ramah. User bertanya: "{user_message}"
-
-Jawab dengan ramah dan natural dalam bahasa Indonesia. Singkat. Jangan gunakan emoji atau bahasa Inggris. [/INST]"""
+                prompt = self.build_prompt(tenant, "smalltalk", "llm_casual", budget["max_tokens"], user_message=user_message)
             else:
-                prompt = f"""<s>[INST] Kamu adalah asisten RS Bhayangkara Brimob. User berkata: "{user_message}"
-
-Jawab dengan ramah dalam bahasa Indonesia. Jika tentang layanan RS, bantu dengan informasi yang ada. Jika percakapan santai, jawab dengan hangat. Jangan gunakan emoji atau bahasa Inggris. [/INST]"""
+                prompt = self.build_prompt(tenant, "casual", "llm_casual", budget["max_tokens"], user_message=user_message)
 
-            response = self.llm(
+            response = self.complete(
                 prompt,
-                max_tokens=80,
-                temperature=0.7,
+                "llm_casual",
+                session_id,
+                history,
+                max_tokens=budget["max_tokens"],
+                temperature=budget["temperature"],
                 top_p=0.9,
                 top_k=40,
                 repeat_penalty=1.1,
@@ -270,32 +392,41 @@ Jawab dengan ramah dalam bahasa Indonesia. Jika tentang layanan RS, bantu dengan
             return generated_text
             
         except Exception as e:
-            print(f"❌ Casual conversation generation failed: {e}")
+            logger.error(f"Casual conversation generation failed: {e}")
             return "Maaf, saya tidak dapat membantu dengan pertanyaan tersebut. Silakan hubungi bagian administrasi untuk informasi lebih lanjut."
     
-    def handle_faq_question(self, user_message: str, intent: str, history: List[Dict]) -> str:
+    def handle_faq_question(self, user_message: str, intent: str, history: List[Dict], session_id: str = None, tenant: Tenant = None) -> str:
         """Handle FAQ questions with optimized generation"""
+        tenant = tenant or self.tenants.default
         # Find relevant FAQ
-        relevant_faq = self.find_relevant_faq(intent, user_message)
+        relevant_faq = self.find_relevant_faq(intent, user_message, tenant)
         
         if not relevant_faq:
-            return self.handle_casual_conversation(user_message, history)
+            return self.handle_casual_conversation(user_message, history, session_id, tenant)
         
         if not self.llm:
             return relevant_faq.get('answer', 'Maaf, saya tidak dapat membantu dengan pertanyaan tersebut.')
         
+        return self.generate_faq_answer(user_message, relevant_faq, history, session_id, tenant=tenant)
+    
+    def generate_faq_answer(self, user_message: str, faq: Dict, history: List[Dict] = None,
+                            session_id: str = None, stage: str = "llm_faq", tenant: Tenant = None) -> str:
+        """Rephrase the FAQ answer for the message (llm_lock must be held)"""
+        tenant = tenant or self.tenants.default
         try:
-            # Optimized prompt for FAQ responses
-            prompt = f"""<s>[INST] Kamu adalah asisten RS Bhayangkara Brimob. User bertanya: "{user_message}"
-
-Informasi RS: {relevant_faq.get('answer', '')}
-
-Jawab dengan natural dalam bahasa Indonesia menggunakan informasi di atas. Ramah dan membantu. Jangan gunakan emoji atau bahasa Inggris. [/INST]"""
+            # Optimized prompt for FAQ responses (lower temperature for more focused answers)
+            budget = self.runtime.current().generation("faq")
+            prompt = self.build_prompt(tenant, "faq", stage, budget["max_tokens"],
+                                       user_message=Slot(user_message, priority=1, min_tokens=32),
+                                       answer=Slot(faq.get('answer', ''), cacheable=True, required=True))
 
-            response = self.llm(
+            response = self.complete(
                 prompt,
-                max_tokens=100,
-                temperature=0.6,    # Lower temperature for more focused responses
+                stage,
+                session_id,
+                history,
+                max_tokens=budget["max_tokens"],
+                temperature=budget["temperature"],
                 top_p=0.9,
                 top_k=40,
                 repeat_penalty=1.1,
@@ -305,35 +436,98 @@ Jawab dengan natural dalam bahasa Indonesia menggunakan informasi di atas. Ramah
             generated_text = response['choices'][0]['text'].strip()
             
             if not generated_text or len(generated_text) < 10:
-                return relevant_faq.get('answer', 'Maaf, saya tidak dapat membantu dengan pertanyaan tersebut.')
+                return faq.get('answer', 'Maaf, saya tidak dapat membantu dengan pertanyaan tersebut.')
             
             return generated_text
             
+        except PromptTooLong as e:
+            # The answer can't fit next to the message; the facts as written beat a reply without them
+            logger.info(f"Answering verbatim: {e}")
+            return faq.get('answer', 'Maaf, saya tidak dapat membantu dengan pertanyaan tersebut.')
         except Exception as e:
-            print(f"❌ FAQ generation failed: {e}")
-            return relevant_faq.get('answer', 'Maaf, saya tidak dapat membantu dengan pertanyaan tersebut.')
+            logger.error(f"FAQ generation failed: {e}")
+            return faq.get('answer', 'Maaf, saya tidak dapat membantu dengan pertanyaan tersebut.')
     
-    def find_relevant_faq(self, intent: str, user_message: str) -> Dict:
-        """Find relevant FAQ based on intent and user message"""
-        intent_to_faq = {
-            'faq_operating_hours': 'faq_operating_hours',
-            'faq_bpjs': 'faq_bpjs',
-            'faq_online_registration': 'faq_online_registration',
-            'faq_registration_location': 'faq_registration_location',
-            'faq_emergency': 'faq_emergency',
-            'faq_dental': 'faq_dental',
-            'faq_pediatric': 'faq_pediatric',
-            'faq_fees': 'faq_fees'
-        }
-        
-        if intent in intent_to_faq:
-            faq_id = intent_to_faq[intent]
-            for faq in self.faq_data:
-                if faq.get('id') == faq_id:
-                    return faq
-        
-        return {}
+    def prefetch_faq(self, faq: Dict, tenant: Tenant = None) -> bool:
+        """Answer a likely follow-up FAQ ahead of time; False while the model is busy
+
+        The answer is stored by FAQ id rather than under a response cache key,
+        so a predicted sender gets it whatever the wording of the follow-up and
+        whether or not the turn continues a session.
+        """
+        tenant = tenant or self.tenants.default
+        if not self.llm:
+            # Without the model the FAQ answer is served verbatim anyway
+            return True
+        key = (tenant.id, faq['id'])
+        version = corpus_version(tenant.faqs_path)
+        with self._prefetched_lock:
+            entry = self.prefetched.get(key)
+            if entry is not None and entry[0] == version:
+                return True
+        # Never make a sender wait behind a prefetch that hasn't started yet
+        if not self.llm_lock.acquire(blocking=False):
+            return False
+        try:
+            answer = self.generate_faq_answer(faq.get('question', ''), faq, stage="llm_prefetch", tenant=tenant)
+        finally:
+            self.llm_lock.release()
+        if answer:
+            with self._prefetched_lock:
+                self.prefetched[key] = (version, time.monotonic(), answer)
+                self.prefetched.move_to_end(key)
+                while len(self.prefetched) > PREFETCHED_ANSWERS:
+                    self.prefetched.popitem(last=False)
+        return True
+
+    def take_prefetched(self, tenant: Tenant, faq_id: str, ttl: float) -> Optional[str]:
+        """Prefetched answer to `faq_id`, unless the corpus changed or it is older than `ttl`"""
+        key = (tenant.id, faq_id)
+        with self._prefetched_lock:
+            entry = self.prefetched.get(key)
+            if entry is None:
+                return None
+            version, prepared_at, answer = entry
+            if version != corpus_version(tenant.faqs_path) or time.monotonic() - prepared_at > ttl:
+                del self.prefetched[key]
+                return None
+            self.prefetched.move_to_end(key)
+            return answer
+
+    def remember_turn(self, session_id: str, user_message: str, answer: str):
+        """Add a turn answered without the model to the sender's transcript
+
+        The KV cache is left as it was; the next completion evaluates this turn
+        along with its own prompt through llama.cpp's prefix match.
+        """
+        snapshot = self.sessions.get(session_id)
+        if snapshot is None:
+            return  # The next turn seeds its transcript from the tracker history
+        turns = list(snapshot.turns) + [(f"<s>[INST] {user_message} [/INST] ", answer)]
+        self.sessions.put(session_id, SessionSnapshot(turns, snapshot.input_ids, snapshot.state, snapshot.seed))
     
+    def find_relevant_faq(self, intent: str, user_message: str, tenant: Tenant = None) -> Dict:
+        """Find relevant FAQ based on intent and user message"""
+        # FAQ ids double as intent names in every tenant's corpus
+        return (tenant or self.tenants.default).faq(intent)
+
+    def match_faq_by_keywords(self, user_message: str, tenant: Tenant = None) -> Dict:
+        """Best FAQ by keyword overlap - no NLU, embeddings or LLM involved"""
+        message = self.normalize_message(user_message)
+        best, best_hits = {}, 0
+        for faq in (tenant or self.tenants.default).faqs():
+            hits = sum(1 for kw in faq.get('keywords', []) if kw.lower() in message)
+            if hits > best_hits:
+                best, best_hits = faq, hits
+        return best
+
+    def degraded_response(self, user_message: str, tenant: Tenant = None) -> str:
+        """Verbatim FAQ answer for senders over their inference budget"""
+        faq = self.match_faq_by_keywords(user_message, tenant)
+        if faq.get('answer'):
+            return faq['answer']
+        return "Mohon maaf, pesan Anda sedang kami proses. Silakan tunggu sebentar sebelum mengirim pertanyaan berikutnya."
+
     def format_history(self, history: List[Dict]) -> str:
         """Format conversation history for the prompt"""
         if not history:
@@ -1,26 +1,31 @@
+import logging
 from typing import Any, Text, Dict, List
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
 import json
 import random
+from actions.utils.tenants import registry_from_env, tenant_id
+
+logger = logging.getLogger(__name__)
 
 class SimpleConversationalAction(Action):
     def __init__(self):
         super().__init__()
+        self.tenants = registry_from_env()
         # Load FAQ data
         self.faq_data = self.load_faq_data()
         
-        # Predefined responses for different scenarios
+        # Predefined responses for different scenarios ({hospital} = the tenant's name)
         self.greeting_responses = [
-            "Halo! Saya adalah asisten RS Bhayangkara Brimob. Ada yang bisa saya bantu?",
-            "Selamat datang di RS Bhayangkara Brimob! Ada yang bisa saya bantu?",
-            "Halo! Saya siap membantu Anda dengan informasi RS Bhayangkara Brimob.",
-            "Selamat datang! Ada yang bisa saya bantu terkait layanan RS Bhayangkara Brimob?"
+            "Halo! Saya adalah asisten {hospital}. Ada yang bisa saya bantu?",
+            "Selamat datang di {hospital}! Ada yang bisa saya bantu?",
+            "Halo! Saya siap membantu Anda dengan informasi {hospital}.",
+            "Selamat datang! Ada yang bisa saya bantu terkait layanan {hospital}?"
         ]
         
         self.goodbye_responses = [
-            "Terima kasih telah menghubungi RS Bhayangkara Brimob. Semoga hari Anda menyenangkan!",
+            "Terima kasih telah menghubungi {hospital}. Semoga hari Anda menyenangkan!",
             "Terima kasih! Jika ada pertanyaan lain, jangan ragu untuk menghubungi kami lagi.",
             "Sampai jumpa! Semoga informasi yang saya berikan bermanfaat.",
             "Terima kasih telah menggunakan layanan kami. Semoga sehat selalu!"
@@ -28,7 +33,7 @@ class SimpleConversationalAction(Action):
         
         self.casual_responses = [
             "Baik, terima kasih! Ada yang bisa saya bantu terkait layanan RS?",
-            "Senang mendengarnya! Ada pertanyaan tentang layanan RS Bhayangkara Brimob?",
+            "Senang mendengarnya! Ada pertanyaan tentang layanan {hospital}?",
             "Bagus! Jika ada yang ingin ditanyakan tentang RS, saya siap membantu.",
             "Alhamdulillah! Ada yang bisa saya bantu terkait informasi RS?"
         ]
@@ -39,7 +44,7 @@ class SimpleConversationalAction(Action):
             with open("data/faqs.json", "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception as e:
-            print(f"❌ Failed to load FAQ data: {e}")
+            logger.error(f"Failed to load FAQ data: {e}")
             return []
     
     def name(self) -> Text:
@@ -68,7 +73,7 @@ class SimpleConversationalAction(Action):
         else:
             response = self.handle_casual_conversation(user_message, previous_intent)
         
-        dispatcher.utter_message(text=response)
+        dispatcher.utter_message(text=response.replace("{hospital}", self.tenants.get(tenant_id(tracker)).name))
         return []
     
     def get_previous_intent(self, tracker: Tracker) -> str:
@@ -96,7 +101,7 @@ class SimpleConversationalAction(Action):
         """Handle goodbyes with context awareness"""
         # Check if user got helpful information
         if previous_intent.startswith('faq_'):
-            return "Senang bisa membantu! Terima kasih telah menghubungi RS Bhayangkara Brimob."
+            return "Senang bisa membantu! Terima kasih telah menghubungi {hospital}."
         
         return random.choice(self.goodbye_responses)
     
@@ -110,7 +115,7 @@ class SimpleConversationalAction(Action):
         
         # If previous intent was FAQ, provide helpful follow-up
         if previous_intent.startswith('faq_'):
-            return "Ada yang ingin ditanyakan lebih lanjut tentang layanan RS Bhayangkara Brimob?"
+            return "Ada yang ingin ditanyakan lebih lanjut tentang layanan {hospital}?"
         
         # Default response
         return "Maaf, saya tidak dapat membantu dengan pertanyaan tersebut. Silakan hubungi bagian administrasi untuk informasi lebih lanjut."
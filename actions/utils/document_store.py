@@ -0,0 +1,153 @@
+"""
+Append-only on-disk store of embedded document chunks.
+
+Written by actions/utils/ingest.py, read by VectorSearchManager. A store
+directory holds four row-aligned files:
+
+- chunks.jsonl    one JSON object per chunk (id, source_id, source, chunk, title, text, hash)
+- embeddings.f32  raw float32 vectors, `dimension` per row
+- offsets.i64     byte offset of each row in chunks.jsonl, so a hit is one seek
+- state.json      what has been committed: row count, model, and per source
+                  its file stamp, progress, the row ranges of its current version
+                  and the sources owning chunks it skipped as duplicates
+
+Data is appended first and state.json is replaced atomically afterwards, so
+anything past the committed row count is an interrupted batch: readers ignore
+it and the next ingest run truncates it. Rows of a source that changed or was
+pruned stay in the files but drop out of its ranges and are not loaded.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+CHUNKS = "chunks.jsonl"
+VECTORS = "embeddings.f32"
+OFFSETS = "offsets.i64"
+STATE = "state.json"
+
+
+class DocumentStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._chunks = None
+        self._vectors = None
+        self._offsets = None
+        self.state: Dict[str, Any] = self.load_state()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def exists(directory: Optional[str]) -> bool:
+        return bool(directory) and os.path.exists(os.path.join(directory, STATE))
+
+    def version(self) -> Optional[int]:
+        """Changes on every commit"""
+        try:
+            return os.stat(self.path(STATE)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.path(STATE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"rows": 0, "chunks_bytes": 0, "model": None, "dimension": None, "sources": {}}
+
+    @property
+    def rows(self) -> int:
+        return self.state["rows"]
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.state.get("dimension")
+
+    # Reading
+
+    def live_rows(self) -> np.ndarray:
+        """Store rows belonging to the current version of every source, in row order"""
+        ranges = sorted(r for source in self.state["sources"].values() for r in source.get("ranges", []))
+        if not ranges:
+            return np.zeros(0, dtype="int64")
+        return np.concatenate([np.arange(start, end, dtype="int64") for start, end in ranges])
+
+    def iter_vectors(self, rows: np.ndarray, block: int = 8192) -> Iterator[np.ndarray]:
+        """Vectors of `rows` in blocks, read through a memmap so the file is never loaded whole"""
+        if not len(rows):
+            return
+        vectors = np.memmap(self.path(VECTORS), dtype="float32", mode="r", shape=(self.rows, self.dimension))
+        try:
+            for i in range(0, len(rows), block):
+                yield np.ascontiguousarray(vectors[rows[i:i + block]])
+        finally:
+            del vectors
+
+    def chunk(self, row: int) -> Dict[str, Any]:
+        with open(self.path(OFFSETS), "rb") as f:
+            f.seek(row * 8)
+            offset = int(np.frombuffer(f.read(8), dtype="int64")[0])
+        with open(self.path(CHUNKS), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def iter_chunks(self) -> Iterator[Dict[str, Any]]:
+        """Committed chunk records in row order"""
+        if not os.path.exists(self.path(CHUNKS)):
+            return
+        with open(self.path(CHUNKS), "rb") as f:
+            for _ in range(self.rows):
+                yield json.loads(f.readline())
+
+    # Writing
+
+    def open_for_append(self, model: str):
+        """Drop any uncommitted tail and open the data files for appending"""
+        if self.state.get("model") not in (None, model):
+            raise ValueError(f"Store {self.directory} holds {self.state['model']} vectors; "
+                             f"ingest with that model or rebuild it for {model}")
+        os.makedirs(self.directory, exist_ok=True)
+        self.state["model"] = model
+        dimension = self.dimension or 0
+        for name, size in ((CHUNKS, self.state["chunks_bytes"]), (VECTORS, self.rows * dimension * 4), (OFFSETS, self.rows * 8)):
+            with open(self.path(name), "ab") as f:
+                f.truncate(size)
+        self._chunks = open(self.path(CHUNKS), "ab")
+        self._vectors = open(self.path(VECTORS), "ab")
+        self._offsets = open(self.path(OFFSETS), "ab")
+
+    def append(self, records: List[Dict[str, Any]], vectors: np.ndarray) -> int:
+        """Write rows (uncommitted until `commit`); returns the first new row"""
+        if self.dimension is None and len(records):
+            self.state["dimension"] = int(vectors.shape[1])
+        first = self.rows
+        offset = self.state["chunks_bytes"]
+        offsets = np.empty(len(records), dtype="int64")
+        for i, record in enumerate(records):
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            self._chunks.write(line)
+            offsets[i] = offset
+            offset += len(line)
+        self._offsets.write(offsets.tobytes())
+        self._vectors.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+        self.state["rows"] = first + len(records)
+        self.state["chunks_bytes"] = offset
+        return first
+
+    def commit(self):
+        for f in (self._chunks, self._vectors, self._offsets):
+            f.flush()
+            os.fsync(f.fileno())
+        tmp = self.path(STATE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path(STATE))
+
+    def close(self):
+        for f in (self._chunks, self._vectors, self._offsets):
+            if f is not None:
+                f.close()
+        self._chunks = self._vectors = self._offsets = None
@@ -0,0 +1,257 @@
+"""
+Sentence embedders for VectorSearchManager.
+
+Two backends produce the same vector space:
+
+- "torch": sentence-transformers on PyTorch (the reference implementation)
+- "onnx" / "onnx-int8": the same transformer exported to ONNX and run with
+  ONNX Runtime, fp32 or with dynamically quantized int8 weights. Only
+  onnxruntime, numpy and the `tokenizers` library are imported at serve time,
+  so neither torch nor sentence-transformers is loaded.
+
+Export once with `python -m benchmarks.embedder_parity --export`, which also
+verifies the exported graphs against torch on data/faqs.json.
+"""
+
+import abc
+import logging
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FP32 = "model.onnx"
+ONNX_INT8 = "model_int8.onnx"
+ONNX_META = "embedder.json"
+
+
+def default_onnx_dir(model_name: str) -> str:
+    return os.path.join("models", "onnx", model_name.replace("/", "__"))
+
+
+class Embedder(abc.ABC):
+    """What VectorSearchManager needs from an embedding model"""
+
+    name: str = ""
+    backend: str = ""
+    dimension: int = 0
+
+    @abc.abstractmethod
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, batch_size: int = 32) -> np.ndarray:
+        """float32 rows, one per text"""
+
+    def model_bytes(self) -> int:
+        """Approximate memory held by the weights"""
+        return 0
+
+
+class SentenceTransformerEmbedder(Embedder):
+    backend = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, batch_size: int = 32) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=batch_size, convert_to_tensor=False), dtype="float32")
+
+    def model_bytes(self) -> int:
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class OnnxEmbedder(Embedder):
+    """Tokenize with `tokenizers`, run the exported transformer, pool and normalize in numpy"""
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.name = meta["model"]
+        self.backend = "onnx-int8" if quantized else "onnx"
+        self.dimension = meta["dimension"]
+        self.pooling = meta.get("pooling", "mean")
+        self.normalize = meta.get("normalize", True)
+        self.max_seq_length = meta.get("max_seq_length", 256)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.path = os.path.join(model_dir, ONNX_INT8 if quantized else ONNX_FP32)
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def model_bytes(self) -> int:
+        # ORT keeps its own copy of the initializers; the file size is a close lower bound
+        return os.path.getsize(self.path)
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(texts), length), dtype="int64")
+        attention_mask = np.zeros((len(texts), length), dtype="int64")
+        token_type_ids = np.zeros((len(texts), length), dtype="int64")
+        for row, enc in enumerate(encodings):
+            n = len(enc.ids)
+            input_ids[row, :n] = enc.ids
+            attention_mask[row, :n] = enc.attention_mask
+            token_type_ids[row, :n] = enc.type_ids
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(attention_mask[..., None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            mask = attention_mask[..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype("float32")
+
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        # Batch similar lengths together so short queries aren't padded to long ones
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.empty((len(texts), self.dimension), dtype="float32")
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            out[chunk] = self._run([texts[i] for i in chunk])
+        return out
+
+
+_load_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load(model_name: str, backend: str, onnx_dir: str, threads: int) -> Embedder:
+    if backend in ("onnx", "onnx-int8"):
+        weights = os.path.join(onnx_dir, ONNX_INT8 if backend == "onnx-int8" else ONNX_FP32)
+        if os.path.exists(weights) and os.path.exists(os.path.join(onnx_dir, ONNX_META)):
+            embedder = OnnxEmbedder(onnx_dir, quantized=backend == "onnx-int8", threads=threads)
+            if embedder.name == model_name:
+                logger.info(f"Embedding model {model_name} loaded ({backend})")
+                return embedder
+            logger.warning(f"{onnx_dir} holds {embedder.name}, not {model_name}; falling back to torch")
+        else:
+            logger.warning(f"{weights} not found, falling back to torch. Export it with: "
+                           f"python -m benchmarks.embedder_parity --export --model {model_name}")
+    embedder = SentenceTransformerEmbedder(model_name)
+    logger.info(f"Embedding model {model_name} loaded (torch)")
+    return embedder
+
+
+def load_embedder(model_name: Optional[str] = None, backend: Optional[str] = None, onnx_dir: Optional[str] = None) -> Embedder:
+    """Shared embedder for Config.EMBEDDING_MODEL on Config.EMBEDDING_BACKEND (one instance per process)"""
+    model_name = model_name or Config.EMBEDDING_MODEL
+    backend = (backend or Config.EMBEDDING_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    onnx_dir = onnx_dir or Config.EMBEDDING_ONNX_DIR or default_onnx_dir(model_name)
+    with _load_lock:
+        return _load(model_name, backend, onnx_dir, Config.EMBEDDING_THREADS)
+
+
+def export_onnx(model_name: str, out_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """Export a sentence-transformers model to ONNX (plus int8 weights) in `out_dir`"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    st = SentenceTransformer(model_name, device="cpu")
+    st.eval()
+    transformer = st[0].auto_model
+    pooling = next((m for m in st if isinstance(m, Pooling)), None)
+    meta = {
+        "model": model_name,
+        "dimension": st.get_sentence_embedding_dimension(),
+        "pooling": pooling.get_pooling_mode_str() if pooling else "mean",
+        "normalize": any(isinstance(m, Normalize) for m in st),
+        "max_seq_length": st.max_seq_length,
+    }
+    if meta["pooling"] not in ("mean", "cls", "max"):
+        raise ValueError(f"Pooling mode {meta['pooling']!r} is not supported by the ONNX backend")
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids, return_dict=False)[0]
+
+    os.makedirs(out_dir, exist_ok=True)
+    sample = st.tokenizer(["contoh kalimat", "jam buka poli gigi hari sabtu"], padding=True, return_tensors="pt")
+    if "token_type_ids" not in sample:
+        sample["token_type_ids"] = torch.zeros_like(sample["input_ids"])
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(out_dir, ONNX_FP32)
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer),
+            tuple(sample[n] for n in names),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in names}, "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    st.tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, ONNX_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, os.path.join(out_dir, ONNX_INT8), weight_type=QuantType.QInt8)
+    return out_dir
+
+
+def verify_export(model_name: str, out_dir: str, texts: List[str], min_cosine: float = 0.99) -> dict:
+    """Compare each exported backend with torch on `texts`; report cosine agreement"""
+    import onnx
+
+    onnx.checker.check_model(os.path.join(out_dir, ONNX_FP32))
+    reference = SentenceTransformerEmbedder(model_name).encode(texts)
+    report = {}
+    for backend, quantized in (("onnx", False), ("onnx-int8", True)):
+        if quantized and not os.path.exists(os.path.join(out_dir, ONNX_INT8)):
+            continue
+        vectors = OnnxEmbedder(out_dir, quantized=quantized).encode(texts)
+        cosines = cosine_rows(reference, vectors)
+        report[backend] = {
+            "min_cosine": float(cosines.min()),
+            "mean_cosine": float(cosines.mean()),
+            "max_abs_diff": float(np.abs(reference - vectors).max()),
+            "ok": bool(cosines.min() >= min_cosine),
+        }
+    return report
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+from actions.utils.metrics import QUEUE_DEPTH
+
+# Pool name -> (size env var, default size).
+# FAISS, the sentence-transformers encoder and llama.cpp all release the GIL
+# while they compute, so threads give real parallelism here without having to
+# load a second copy of each model the way a process pool would. One llama.cpp
+# context can only run one generation at a time, so extra generation threads
+# only help when several model instances exist.
+POOL_SIZES = {
+    "retrieval": ("RETRIEVAL_POOL_SIZE", 2),
+    "generation": ("GENERATION_POOL_SIZE", 1),
+}
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> ThreadPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            env_var, default = POOL_SIZES.get(name, (f"{name.upper()}_POOL_SIZE", 1))
+            size = max(1, int(os.getenv(env_var, default)))
+            pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{name}-pool")
+            _pools[name] = pool
+        return pool
+
+
+async def run_in_pool(name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking `fn` on the named pool without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    QUEUE_DEPTH.inc(queue=f"{name}_pool")
+    try:
+        return await loop.run_in_executor(get_pool(name), partial(fn, *args, **kwargs))
+    finally:
+        QUEUE_DEPTH.dec(queue=f"{name}_pool")
+
+
+def shutdown_pools(wait: bool = False):
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=wait)
+        _pools.clear()
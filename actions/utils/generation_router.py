@@ -0,0 +1,144 @@
+"""
+Decide before generation whether an LLM rephrase is worth running, and check
+afterwards that the rephrase is still grounded in the FAQ answer.
+"""
+
+import random
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from actions.utils.metrics import REGISTRY
+
+ROUTED = REGISTRY.counter("chatbot_generation_routed_total", "Pre-generation routing decisions", ("decision", "reason"))
+VALIDATED = REGISTRY.counter("chatbot_generation_validated_total", "Grounding validation results for generated answers", ("result",))
+
+# Numbers, clock times ("08.00", "08:00"), prices ("50.000") and day names must survive a rephrase
+_NUMBER = re.compile(r"\d+(?:[.:,]\d+)*")
+_TOKEN = re.compile(r"\w+")
+DAY_NAMES = frozenset({"senin", "selasa", "rabu", "kamis", "jumat", "sabtu", "minggu"})
+STOPWORDS = frozenset({
+    "yang", "dan", "di", "ke", "dari", "untuk", "dengan", "pada", "ini", "itu", "adalah", "kami", "anda",
+    "ada", "bisa", "dapat", "akan", "atau", "juga", "sesuai", "ya", "tidak", "saja", "silakan", "pukul",
+    "dalam", "oleh", "para", "kita", "kamu", "jika", "bila", "agar", "sudah", "belum", "lebih", "the",
+})
+
+
+def extract_facts(text: str) -> Set[str]:
+    lower = text.lower()
+    facts = {n.replace(":", ".") for n in _NUMBER.findall(lower)}
+    facts.update(w for w in _TOKEN.findall(lower) if w in DAY_NAMES)
+    return facts
+
+
+def content_tokens(text: str) -> Set[str]:
+    # Numbers and day names are checked as facts, not as wording
+    return {w for w in _TOKEN.findall(text.lower())
+            if w not in STOPWORDS and w not in DAY_NAMES and not w.isdigit() and len(w) > 1}
+
+
+class GroundingValidator:
+    """Cheap check that a generated answer still says what the FAQ says.
+
+    Every number, time and day name in the FAQ answers must appear in the
+    response, and the response may not introduce numbers found in neither the
+    answers nor the user's message. Wording is checked by content-token recall
+    of each answer; when that is low, an optional `similarity` function
+    (e.g. embedding cosine) can still accept a faithful paraphrase.
+    """
+
+    def __init__(self, min_overlap: float = 0.5, min_similarity: float = 0.8,
+                 similarity: Optional[Callable[[str, str], float]] = None):
+        self.min_overlap = min_overlap
+        self.min_similarity = min_similarity
+        self.similarity = similarity
+
+    def check(self, response: str, faqs: List[Dict], user_message: str = "") -> Tuple[bool, str]:
+        if not response or len(response.strip()) < 10:
+            return False, "too_short"
+        answers = [f.get('answer', '') for f in faqs if f.get('answer')]
+        if not answers:
+            return False, "no_answer"
+
+        response_facts = extract_facts(response)
+        source_facts = set().union(*(extract_facts(a) for a in answers))
+        if source_facts - response_facts:
+            return False, "missing_fact"
+        if response_facts - source_facts - extract_facts(user_message):
+            return False, "new_fact"
+
+        response_tokens = content_tokens(response)
+        for answer in answers:
+            tokens = content_tokens(answer)
+            overlap = len(tokens & response_tokens) / len(tokens) if tokens else 1.0
+            if overlap >= self.min_overlap:
+                continue
+            if self.similarity is not None and self.similarity(response, answer) >= self.min_similarity:
+                continue
+            return False, "low_overlap"
+        return True, "ok"
+
+
+class GenerationRouter:
+    """Predict whether an LLM rephrase adds value over the verbatim FAQ answer.
+
+    Short, on-intent questions with a confident match are answered verbatim;
+    multi-question, off-intent and conversational messages are rephrased. Each
+    FAQ's rephrases are tracked online: once a FAQ has `min_samples` attempts
+    and its acceptance rate drops below `min_acceptance`, it is answered
+    verbatim except for an `explore` fraction of requests that keep the
+    estimate fresh.
+    """
+
+    def __init__(self, short_message_words: int = 5, min_acceptance: float = 0.3, min_samples: int = 5,
+                 explore: float = 0.1, decay: float = 0.98):
+        self.short_message_words = short_message_words
+        self.min_acceptance = min_acceptance
+        self.min_samples = min_samples
+        self.explore = explore
+        self.decay = decay
+        self._stats: Dict[str, List[float]] = {}  # faq id -> [decayed attempts, decayed accepts]
+        self._lock = threading.Lock()
+
+    def acceptance_rate(self, faq_id: str) -> Tuple[float, float]:
+        """(rate, effective sample count) with a weak optimistic prior"""
+        with self._lock:
+            attempts, accepted = self._stats.get(faq_id, (0.0, 0.0))
+        return (accepted + 1.0) / (attempts + 1.5), attempts
+
+    def record(self, faqs: List[Dict], accepted: bool):
+        VALIDATED.inc(result="accepted" if accepted else "rejected")
+        with self._lock:
+            for faq in faqs:
+                stats = self._stats.setdefault(faq.get('id'), [0.0, 0.0])
+                stats[0] = stats[0] * self.decay + 1.0
+                stats[1] = stats[1] * self.decay + (1.0 if accepted else 0.0)
+
+    def decide(self, user_message: str, faqs: List[Dict], score: float, intent: Optional[str] = None,
+               multi_question: bool = False) -> Tuple[bool, str]:
+        if not faqs:
+            return False, "no_faq"
+        for faq in faqs:
+            rate, samples = self.acceptance_rate(faq.get('id'))
+            if samples >= self.min_samples and rate < self.min_acceptance:
+                if random.random() >= self.explore:
+                    return False, "low_acceptance"
+                return True, "explore"
+        if multi_question:
+            return True, "multi_question"
+        words = len(user_message.split())
+        on_intent = intent is not None and intent == faqs[0].get('id')
+        if on_intent and words <= self.short_message_words:
+            # "jam buka?" -> the stored answer is already the best reply
+            return False, "short_on_intent"
+        if score >= 0.8 and words <= self.short_message_words:
+            return False, "short_high_score"
+        if not on_intent:
+            return True, "off_intent"
+        return True, "conversational"
+
+    def should_generate(self, user_message: str, faqs: List[Dict], score: float, intent: Optional[str] = None,
+                        multi_question: bool = False) -> bool:
+        generate, reason = self.decide(user_message, faqs, score, intent, multi_question)
+        ROUTED.inc(decision="generate" if generate else "verbatim", reason=reason)
+        return generate
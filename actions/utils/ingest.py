@@ -0,0 +1,474 @@
+"""
+Streaming ingestion of hospital documents into a DocumentStore.
+
+Policies, schedules and tariff lists exported as text, Markdown or HTML are
+read incrementally (line by line, or fed to an HTML parser in 64 KB blocks),
+split into overlapping chunks that never cross a heading, de-duplicated on
+their normalized text and embedded in batches by a pool of worker processes,
+each holding its own copy of the embedding model. At most a few batches are
+in flight, so memory stays flat however large the inputs are.
+
+Every written batch is committed to the store (see document_store.py). An
+interrupted run is resumed by running the same command again: committed
+chunks are kept, the uncommitted tail is dropped, unchanged documents are
+skipped and a document cut off halfway continues from its next chunk.
+Documents whose size or mtime changed are re-ingested and their old chunks
+stop being served. A chunk already served from another document is skipped
+and the owner remembered; when the owner changes or is pruned, documents that
+skipped its chunks are scanned again so the shared text is not lost.
+
+Usage:
+    python -m actions.utils.ingest docs/policies docs/tarif.html --store models/docs
+    python -m actions.utils.ingest docs/ --store models/docs --workers 4 --prune
+
+The bot serves the store of a tenant's `docs_dir` (DOCS_DIR for the default
+tenant) next to its FAQs.
+"""
+
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import sys
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from actions.utils.document_store import DocumentStore
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {".txt": "text", ".md": "markdown", ".markdown": "markdown", ".html": "html", ".htm": "html"}
+READ_BLOCK = 64 * 1024
+
+
+# Reading: (section title, paragraph) pairs, one paragraph in memory at a time
+
+def _clean_markdown(line: str) -> str:
+    line = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", line)  # [text](url), ![alt](src)
+    line = re.sub(r"(\*\*|__|`)", "", line)
+    return line.lstrip("> ").strip()
+
+
+def _text_blocks(path: str, title: str, markdown: bool, max_chars: int) -> Iterator[Tuple[str, str]]:
+    section = title
+    lines: List[str] = []
+    size = 0
+    in_code = False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for raw in f:
+            line = raw.strip()
+            flush = not line
+            if markdown and line.startswith("```"):
+                in_code = not in_code
+                continue
+            if markdown and not in_code and line:
+                heading = re.match(r"#{1,6}\s+(.*)", line)
+                if heading:
+                    if lines:
+                        yield section, "\n".join(lines)
+                        lines, size = [], 0
+                    section = _clean_markdown(heading.group(1).strip("# ")) or section
+                    continue
+                if re.fullmatch(r"[|:\- ]+", line):  # Table separator row
+                    continue
+                # List items are paragraphs of their own
+                flush = bool(re.match(r"([-*+]|\d+[.)])\s", line))
+                line = _clean_markdown(line)
+            if flush and lines:
+                yield section, "\n".join(lines)
+                lines, size = [], 0
+            if line:
+                lines.append(line)
+                size += len(line)
+                # A file without blank lines must not become one giant paragraph
+                if size >= max_chars:
+                    yield section, "\n".join(lines)
+                    lines, size = [], 0
+    if lines:
+        yield section, "\n".join(lines)
+
+
+class _HtmlBlocks(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    BLOCKS = {"p", "div", "li", "tr", "br", "section", "article", "table", "ul", "ol", "dl", "dt", "dd",
+              "blockquote", "pre", "header", "footer", "main", "aside", "nav", "form", "caption", "hr"}
+
+    def __init__(self, title: str, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.section = title
+        self.max_chars = max_chars
+        self.blocks: List[Tuple[str, str]] = []
+        self.text: List[str] = []
+        self.size = 0
+        self.skip = 0
+        self.heading: Optional[List[str]] = None
+        self.title: Optional[List[str]] = None
+        self.seen_heading = False
+
+    def flush(self):
+        text = " ".join("".join(self.text).split())
+        if text:
+            self.blocks.append((self.section, text))
+        self.text, self.size = [], 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip += 1
+        elif tag == "title":
+            self.title = []
+        elif tag in self.HEADINGS:
+            self.flush()
+            self.heading = []
+        elif tag in ("td", "th"):
+            if "".join(self.text).strip():
+                self.text.append(" | ")
+        elif tag in self.BLOCKS:
+            self.flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skip = max(0, self.skip - 1)
+        elif tag == "title" and self.title is not None:
+            title = " ".join("".join(self.title).split())
+            if title and not self.seen_heading:
+                self.section = title
+            self.title = None
+        elif tag in self.HEADINGS and self.heading is not None:
+            heading = " ".join("".join(self.heading).split())
+            if heading:
+                self.section = heading
+                self.seen_heading = True
+            self.heading = None
+        elif tag in self.BLOCKS:
+            self.flush()
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        if self.title is not None:
+            self.title.append(data)
+        elif self.heading is not None:
+            self.heading.append(data)
+        else:
+            self.text.append(data)
+            self.size += len(data)
+            if self.size >= self.max_chars:
+                self.flush()
+
+
+def _html_blocks(path: str, title: str, max_chars: int) -> Iterator[Tuple[str, str]]:
+    parser = _HtmlBlocks(title, max_chars)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            data = f.read(READ_BLOCK)
+            if not data:
+                break
+            parser.feed(data)
+            yield from parser.blocks
+            parser.blocks.clear()
+    parser.close()
+    parser.flush()
+    yield from parser.blocks
+
+
+def read_blocks(path: str, max_chars: int = 4000) -> Iterator[Tuple[str, str]]:
+    """(section, paragraph) pairs of a document, read incrementally"""
+    kind = EXTENSIONS[os.path.splitext(path)[1].lower()]
+    title = os.path.splitext(os.path.basename(path))[0].replace("_", " ").replace("-", " ")
+    if kind == "html":
+        return _html_blocks(path, title, max_chars)
+    return _text_blocks(path, title, kind == "markdown", max_chars)
+
+
+def chunk_blocks(blocks: Iterator[Tuple[str, str]], max_words: int = 150, overlap_words: int = 25) -> Iterator[Tuple[str, str]]:
+    """Pack paragraphs into chunks of at most `max_words`, repeating the last
+    `overlap_words` of a chunk at the start of the next one in the same section.
+
+    Paragraphs longer than a chunk are split into overlapping word windows.
+    Deterministic, so a resumed run sees the same chunk numbers.
+    """
+    section = None
+    parts: List[str] = []
+    words = 0
+    step = max(1, max_words - overlap_words)
+    for title, text in blocks:
+        if title != section:
+            if parts:
+                yield section, "\n\n".join(parts)
+            section, parts, words = title, [], 0
+        tokens = text.split()
+        if len(tokens) > max_words:
+            if parts:
+                yield section, "\n\n".join(parts)
+                parts, words = [], 0
+            for start in range(0, len(tokens), step):
+                yield section, " ".join(tokens[start:start + max_words])
+                if start + max_words >= len(tokens):
+                    break
+            continue
+        if parts and words + len(tokens) > max_words:
+            yield section, "\n\n".join(parts)
+            tail = " ".join("\n\n".join(parts).split()[-overlap_words:]) if overlap_words else ""
+            parts, words = [], 0
+            if tail and len(tail.split()) + len(tokens) <= max_words:
+                parts, words = [tail], len(tail.split())
+        parts.append(text)
+        words += len(tokens)
+    if parts:
+        yield section, "\n\n".join(parts)
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(" ".join(text.lower().split()).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def source_id(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def discover(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """(source name, path) of every supported document under `paths`, in a stable order.
+
+    The source name is the path relative to the working directory (absolute
+    outside of it), so run ingestion from the same place every time.
+    """
+    for root in paths:
+        if os.path.isfile(root):
+            candidates = [root]
+        else:
+            candidates = []
+            for directory, dirs, files in os.walk(root):
+                dirs.sort()
+                candidates.extend(os.path.join(directory, name) for name in sorted(files))
+        for path in candidates:
+            if os.path.splitext(path)[1].lower() in EXTENSIONS:
+                source = os.path.relpath(path)
+                if source.startswith(os.pardir):
+                    source = os.path.abspath(path)
+                yield source.replace(os.sep, "/"), path
+
+
+# Embedding: one model per worker process
+
+_worker_embedder = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_embedder
+    from actions.utils.embedders import load_embedder
+
+    # Split the cores between workers instead of every worker using all of them
+    Config.EMBEDDING_THREADS = Config.EMBEDDING_THREADS or threads
+    _worker_embedder = load_embedder(model_name)
+    if _worker_embedder.backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def _embed(texts: List[str]) -> np.ndarray:
+    return _worker_embedder.encode(texts)
+
+
+class _EmbeddingPool:
+    def __init__(self, model_name: str, workers: int):
+        self.executor = None
+        self.embedder = None
+        if workers > 0:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn: workers must not inherit a half-initialized torch/OpenMP from the parent
+            self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=_init_worker, initargs=(model_name, threads))
+        else:
+            from actions.utils.embedders import load_embedder
+
+            self.embedder = load_embedder(model_name)
+
+    def submit(self, texts: List[str]) -> Future:
+        if self.executor is not None:
+            return self.executor.submit(_embed, texts)
+        future: Future = Future()
+        future.set_result(self.embedder.encode(texts))
+        return future
+
+    def shutdown(self, cancel: bool = False):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=cancel)
+
+
+class _Batch:
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self.progress: Dict[str, int] = {}  # source_id -> chunks consumed, duplicates included
+        self.done: List[str] = []
+
+
+def _live_hashes(store: DocumentStore) -> Dict[str, str]:
+    """Chunk digest -> source_id for the rows currently served"""
+    ranges = {sid: source.get("ranges", []) for sid, source in store.state["sources"].items()}
+    hashes = {}
+    for row, record in enumerate(store.iter_chunks()):
+        if any(start <= row < end for start, end in ranges.get(record["source_id"], ())):
+            hashes[record["hash"]] = record["source_id"]
+    return hashes
+
+
+def ingest(paths: List[str], store_dir: str, workers: int = 2, batch_size: int = 64, max_words: int = 150,
+           overlap_words: int = 25, prune: bool = False, model_name: Optional[str] = None) -> Dict[str, int]:
+    """Chunk, de-duplicate and embed the documents under `paths` into the store at `store_dir`"""
+    model_name = model_name or Config.EMBEDDING_MODEL
+    store = DocumentStore(store_dir)
+    store.open_for_append(model_name)
+    sources = store.state["sources"]
+    stats: Counter = Counter()
+    seen = _live_hashes(store)
+    found = list(dict(discover(paths)).items())  # A file named twice is ingested once
+    stamps = {}
+    for source, path in found:
+        stat = os.stat(path)
+        stamps[source] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    # Sources whose served chunks go away in this run
+    replaced = set()
+    for source, _ in found:
+        entry = sources.get(source_id(source))
+        if entry is not None and (entry["size"], entry["mtime_ns"]) != (stamps[source]["size"], stamps[source]["mtime_ns"]):
+            replaced.add(source_id(source))
+    if prune:
+        present = {source_id(source) for source, _ in found}
+        for sid in [sid for sid in sources if sid not in present]:
+            logger.info(f"Pruning {sources[sid]['source']}")
+            del sources[sid]
+            replaced.add(sid)
+            stats["pruned"] += 1
+    seen = {digest: owner for digest, owner in seen.items() if owner not in replaced}
+    for sid, entry in sources.items():
+        if sid not in replaced and replaced.intersection(entry.get("duplicates_of", ())):
+            # Chunks it skipped as copies of a replaced source are served by nobody now;
+            # scan it again (its own served chunks are skipped as duplicates)
+            entry.update(next_chunk=0, done=False, duplicates_of=[])
+            stats["rechecked"] += 1
+            if not any(source_id(source) == sid for source, _ in found):
+                logger.warning(f"{entry['source']} shared chunks with a replaced document; "
+                               f"include it in the next run to restore them")
+    if prune or replaced:
+        store.commit()
+
+    pool = _EmbeddingPool(model_name, workers)
+    pending: "deque[Tuple[Optional[Future], _Batch]]" = deque()
+    max_pending = max(2, 2 * workers)
+
+    def drain():
+        future, batch = pending.popleft()
+        if batch.records:
+            first = store.append(batch.records, future.result())
+            for i, record in enumerate(batch.records):
+                row = first + i
+                ranges = sources[record["source_id"]]["ranges"]
+                if ranges and ranges[-1][1] == row:
+                    ranges[-1][1] = row + 1
+                else:
+                    ranges.append([row, row + 1])
+        for sid, consumed in batch.progress.items():
+            sources[sid]["next_chunk"] = consumed
+        for sid in batch.done:
+            sources[sid]["done"] = True
+            logger.info(f"Ingested {sources[sid]['source']} ({sources[sid]['next_chunk']} chunks)")
+        store.commit()
+        stats["chunks"] += len(batch.records)
+        stats["batches"] += 1
+
+    def submit(batch: _Batch):
+        if not (batch.records or batch.progress or batch.done):
+            return
+        future = pool.submit([f"{r['title']}\n{r['text']}" for r in batch.records]) if batch.records else None
+        pending.append((future, batch))
+        while len(pending) > max_pending:
+            drain()
+
+    completed = False
+    try:
+        batch = _Batch()
+        for source, path in found:
+            sid = source_id(source)
+            stamp = stamps[source]
+            entry = sources.get(sid)
+            if sid not in replaced and entry is not None:
+                if entry["done"]:
+                    stats["unchanged"] += 1
+                    continue
+                stats["resumed"] += 1
+            else:
+                if entry is not None:
+                    # Its old chunks stop being served once this entry replaces it
+                    stats["changed"] += 1
+                sources[sid] = entry = {"source": source, **stamp, "next_chunk": 0, "done": False, "ranges": []}
+            stats["documents"] += 1
+            start = entry["next_chunk"]
+            for n, (title, text) in enumerate(chunk_blocks(read_blocks(path), max_words, overlap_words)):
+                if n < start:
+                    continue
+                batch.progress[sid] = n + 1
+                digest = _digest(text)
+                if digest in seen:
+                    stats["duplicates"] += 1
+                    owner = seen[digest]
+                    if owner != sid and owner not in entry.setdefault("duplicates_of", []):
+                        entry["duplicates_of"].append(owner)
+                    continue
+                seen[digest] = sid
+                batch.records.append({"id": f"doc:{sid}:{n}", "source_id": sid, "source": source, "chunk": n,
+                                      "title": title, "text": text, "hash": digest})
+                if len(batch.records) >= batch_size:
+                    submit(batch)
+                    batch = _Batch()
+            batch.done.append(sid)
+        submit(batch)
+        while pending:
+            drain()
+        completed = True
+    finally:
+        # Interrupted: whatever was committed stays, the rest is redone next run
+        pool.shutdown(cancel=not completed)
+        store.close()
+    stats["rows"] = store.rows
+    stats["live_rows"] = len(store.live_rows())
+    return dict(stats)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest text, Markdown and HTML documents into a document store")
+    parser.add_argument("paths", nargs="+", help="Files or directories (.txt, .md, .html)")
+    parser.add_argument("--store", default=os.getenv("DOCS_DIR") or "models/docs")
+    parser.add_argument("--workers", type=int, default=2, help="Embedding processes (0 = embed in this process)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-words", type=int, default=150)
+    parser.add_argument("--overlap-words", type=int, default=25)
+    parser.add_argument("--prune", action="store_true", help="Stop serving documents no longer under the given paths")
+    parser.add_argument("--model", default=None, help="Defaults to EMBEDDING_MODEL; must match what the bot serves")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        stats = ingest(args.paths, args.store, workers=args.workers, batch_size=args.batch_size, max_words=args.max_words,
+                       overlap_words=args.overlap_words, prune=args.prune, model_name=args.model)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(" ".join(f"{k}={v}" for k, v in sorted(stats.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
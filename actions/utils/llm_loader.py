@@ -0,0 +1,47 @@
+import os
+from typing import Any
+
+from llama_cpp import Llama
+
+from actions.utils.speculative import draft_from_env
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def worker_threads(n_threads: int) -> int:
+    """This process's share of `n_threads` when WEB_CONCURRENCY workers generate side by side"""
+    return max(1, n_threads // max(1, _env_int("WEB_CONCURRENCY", 1)))
+
+
+def load_llama(model_path: str, n_ctx: int = 1024, n_threads: int = 8, n_batch: int = 512, **kwargs: Any) -> Llama:
+    """Load a GGUF model on CPU.
+
+    The keyword defaults are the per-caller tuning; LLAMA_CONTEXT_SIZE,
+    LLAMA_N_THREADS and LLAMA_N_BATCH override them for the whole process so
+    settings picked with `python -m benchmarks.llm_bench` apply without code
+    changes. Without LLAMA_N_THREADS, `n_threads` is split between the
+    WEB_CONCURRENCY prefork workers. LLAMA_SPECULATIVE enables speculative decoding (see
+    actions/utils/speculative.py) unless the caller passes `draft_model`.
+    """
+    params = dict(
+        n_gpu_layers=0,    # CPU only
+        verbose=False,
+        use_mmap=True,     # Memory mapping, shared between forked workers
+        use_mlock=False,   # Don't lock memory
+        seed=42,           # Deterministic
+    )
+    params.update(kwargs)
+    n_ctx = _env_int("LLAMA_CONTEXT_SIZE", n_ctx)
+    n_threads = _env_int("LLAMA_N_THREADS", worker_threads(n_threads))
+    if "draft_model" not in params:
+        params["draft_model"] = draft_from_env(n_ctx, n_threads)
+    return Llama(
+        model_path=model_path,
+        n_ctx=n_ctx,
+        n_threads=n_threads,
+        n_batch=_env_int("LLAMA_N_BATCH", n_batch),
+        **params,
+    )
@@ -1,85 +1,121 @@
+import logging
 import os
-from typing import List, Dict, Any
-from llama_cpp import Llama
+import threading
+from typing import List, Dict, Any, Optional
+from actions.utils.generation_router import GenerationRouter, GroundingValidator
+from actions.utils.llm_loader import load_llama
+from actions.utils.metrics import timed_completion
+from actions.utils.prompt_builder import ListSlot, PromptBuilder, PromptTooLong, Slot
+from actions.utils.tenants import Tenant, registry_from_env
+from src.runtime_config import runtime_config
+
+logger = logging.getLogger(__name__)
 
 class LLMResponseGenerator:
-    def __init__(self, model_path: str = "models/llama-1b-indo.gguf"):
+    def __init__(self, model_path: str = "models/llama-1b-indo.gguf", default_tenant: Optional[Tenant] = None):
         self.model_path = model_path
+        self.default_tenant = default_tenant or registry_from_env().default
         self.llm = None
+        self.prompts = None
+        self.lock = threading.Lock()  # One llama.cpp context = one generation at a time
+        self.router = GenerationRouter()
+        self.validator = GroundingValidator()
+        self.runtime = runtime_config()  # Thresholds and the rephrase budget, tunable live
         self.load_llm()
 
     def load_llm(self):
         if self.llm is None and os.path.exists(self.model_path):
-            self.llm = Llama(
-                model_path=self.model_path,
-                n_ctx=1024,
-                n_threads=6,
-                n_batch=256,
-                n_gpu_layers=0,
-                verbose=False,
-                use_mmap=True,
-                use_mlock=False,
-                seed=42
-            )
+            self.llm = load_llama(self.model_path, n_ctx=1024, n_threads=6, n_batch=256)
+            self.prompts = PromptBuilder(self.llm)
+
+    def should_generate(self, user_message: str, faqs: List[Dict], confidence: float, intent: Optional[str] = None, multi_question: bool = False) -> bool:
+        """Whether a rephrase is likely to beat the verbatim answer (and the LLM is loaded)"""
+        if not self.llm:
+            return False
+        return self.router.should_generate(user_message, faqs, confidence, intent, multi_question)
 
-    def generate_response(self, user_message: str, faqs: List[Dict], context: Dict, confidence: float, multi_question: bool = False, timeout: int = 10) -> str:
+    def generate_response(self, user_message: str, faqs: List[Dict], context: Dict, confidence: float, multi_question: bool = False, timeout: int = 10,
+                          tenant: Optional[Tenant] = None) -> str:
         if not self.llm:
-            return faqs[0].get('answer', 'Maaf, saya tidak dapat membantu.')
+            return self.verbatim(faqs, multi_question)
         try:
+            tenant = tenant or self.default_tenant
+            settings = self.runtime.current()
+            budget = settings.generation("faq_rephrase")
             if multi_question:
-                prompt = self.multi_question_prompt(user_message, faqs, context)
-            elif confidence >= 0.8:
-                prompt = self.high_conf_prompt(user_message, faqs[0], context)
-            elif confidence >= 0.4:
-                prompt = self.medium_conf_prompt(user_message, faqs[0], context)
+                prompt = self.multi_question_prompt(user_message, faqs, context, tenant, budget["max_tokens"])
+            elif confidence >= settings.high_confidence:
+                prompt = self.high_conf_prompt(user_message, faqs[0], context, tenant, budget["max_tokens"])
+            elif confidence >= settings.medium_confidence:
+                prompt = self.medium_conf_prompt(user_message, faqs[0], context, tenant, budget["max_tokens"])
             else:
                 return self.low_conf_fallback(user_message, faqs, context)
-            response = self.llm(
-                prompt,
-                max_tokens=180,
-                temperature=0.2,
-                top_p=0.9,
-                top_k=40,
-                repeat_penalty=1.1,
-                stop=["\n\n", "User:", "FAQ:", "Context:"]
-            )
+            with self.lock:
+                response = timed_completion(
+                    self.llm,
+                    prompt,
+                    "faq_rephrase_multi" if multi_question else "faq_rephrase",
+                    max_tokens=budget["max_tokens"],
+                    temperature=budget["temperature"],
+                    top_p=0.9,
+                    top_k=40,
+                    repeat_penalty=1.1,
+                    stop=["\n\n", "User:", "FAQ:", "Context:"]
+                )
             text = response['choices'][0]['text'].strip()
-            if self.validate_response_quality(text, faqs, user_message):
+            accepted = self.validate_response_quality(text, faqs, user_message)
+            self.router.record(faqs, accepted)
+            if accepted:
                 return text
-            return faqs[0].get('answer', 'Maaf, saya tidak dapat membantu.')
+            return self.verbatim(faqs, multi_question)
+        except PromptTooLong as e:
+            # A long message must not crowd the facts out of the prompt; answer with them as they are
+            logger.info(f"Answering verbatim: {e}")
+            return self.verbatim(faqs, multi_question)
         except Exception as e:
-            return faqs[0].get('answer', 'Maaf, saya tidak dapat membantu.')
+            logger.error(f"FAQ response generation failed: {e}")
+            return self.verbatim(faqs, multi_question)
 
-    def high_conf_prompt(self, user_message, faq, context):
-        return f"""Anda adalah asisten RS Bhayangkara Brimob. Jawab pertanyaan berikut dengan sopan dan ringkas, berdasarkan FAQ:
-Pertanyaan: {faq.get('question')}
-Jawaban: {faq.get('answer')}
-User: {user_message}
-Jawaban:"""
+    @staticmethod
+    def verbatim(faqs: List[Dict], multi_question: bool = False) -> str:
+        if multi_question:
+            return "\n\n".join(f.get('answer', '') for f in faqs if f.get('answer'))
+        return faqs[0].get('answer', 'Maaf, saya tidak dapat membantu.')
 
-    def medium_conf_prompt(self, user_message, faq, context):
-        return f"""Anda adalah asisten RS Bhayangkara Brimob. Rephrase jawaban FAQ agar sesuai gaya pertanyaan user:
-Pertanyaan: {faq.get('question')}
-Jawaban: {faq.get('answer')}
-User: {user_message}
-Jawaban:"""
+    def faq_slots(self, user_message, faq, tenant):
+        # The answer carries the facts and is never cut; the stored question goes first, then the message
+        return dict(
+            hospital_name=Slot(tenant.name, cacheable=True),
+            user_message=Slot(user_message, priority=2, min_tokens=32),
+            answer=Slot(faq.get('answer', ''), cacheable=True, required=True),
+            question=Slot(faq.get('question', ''), priority=3, cacheable=True),
+        )
 
-    def multi_question_prompt(self, user_message, faqs, context):
-        faq_str = "\n".join([f"Q: {f.get('question')}\nA: {f.get('answer')}" for f in faqs])
-        return f"""User bertanya beberapa hal sekaligus. Gabungkan jawaban FAQ berikut secara natural:
-{faq_str}
-User: {user_message}
-Jawaban gabungan (maksimal 3 kalimat):"""
+    def max_tokens(self) -> int:
+        return self.runtime.current().generation("faq_rephrase")["max_tokens"]
+
+    def high_conf_prompt(self, user_message, faq, context, tenant=None, max_tokens=None):
+        tenant = tenant or self.default_tenant
+        return self.prompts.build(tenant.template("high_conf"), "faq_rephrase", max_tokens or self.max_tokens(), **self.faq_slots(user_message, faq, tenant))
+
+    def medium_conf_prompt(self, user_message, faq, context, tenant=None, max_tokens=None):
+        tenant = tenant or self.default_tenant
+        return self.prompts.build(tenant.template("medium_conf"), "faq_rephrase", max_tokens or self.max_tokens(), **self.faq_slots(user_message, faq, tenant))
+
+    def multi_question_prompt(self, user_message, faqs, context, tenant=None, max_tokens=None):
+        tenant = tenant or self.default_tenant
+        # Every FAQ answered is grounding; only the message may be cut
+        items = [f"Q: {f.get('question')}\nA: {f.get('answer')}" for f in faqs]
+        return self.prompts.build(tenant.template("multi_question"), "faq_rephrase_multi", max_tokens or self.max_tokens(),
+                                  hospital_name=Slot(tenant.name, cacheable=True),
+                                  faq_str=ListSlot(items, required=True),
+                                  user_message=Slot(user_message, priority=2, min_tokens=32))
 
     def low_conf_fallback(self, user_message, faqs, context):
         alt = "\n".join([f"- {f.get('question')}" for f in faqs])
         return f"Maaf, saya tidak yakin dengan jawaban. Mungkin Anda mencari informasi tentang:\n{alt}\nSilakan pilih atau tanyakan lebih spesifik."
 
     def validate_response_quality(self, response: str, faqs: List[Dict], user_message: str) -> bool:
-        if not response or len(response.strip()) < 10:
-            return False
-        # Anti-hallucination: must not add info outside FAQ
-        for faq in faqs:
-            if faq.get('answer') in response:
-                return True
-        return False 
\ No newline at end of file
+        # Anti-hallucination: facts preserved, nothing new added, wording still tied to the FAQ
+        ok, _ = self.validator.check(response, faqs, user_message)
+        return ok
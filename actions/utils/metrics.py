@@ -0,0 +1,269 @@
+"""
+In-process metrics and request tracing for the chatbot pipeline.
+
+Keeps per-stage latency histograms, counters and gauges in a small registry and
+renders them in the Prometheus text exposition format, so no extra client
+library is needed. Each process (or pre-forked worker) has its own registry.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond FAISS lookups to slow generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [(n, v) for n, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{n}="{_escape(v)}"' for n, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        return []
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(float(bound))))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram("chatbot_stage_latency_seconds", "Latency of each pipeline stage", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("chatbot_stage_errors_total", "Errors raised inside a pipeline stage", ("stage",))
+REQUESTS = REGISTRY.counter("chatbot_requests_total", "HTTP requests handled", ("endpoint", "status"))
+QUEUE_DEPTH = REGISTRY.gauge("chatbot_queue_depth", "Requests waiting or in progress", ("queue",))
+CACHE_REQUESTS = REGISTRY.counter("chatbot_cache_requests_total", "Cache lookups by result", ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge("chatbot_cache_hit_ratio", "Cumulative cache hit ratio", ("cache",))
+LLM_PROMPT_TOKENS = REGISTRY.histogram("chatbot_llm_prompt_tokens", "Prompt tokens per generation", ("stage",), TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = REGISTRY.histogram("chatbot_llm_completion_tokens", "Generated tokens per generation", ("stage",), TOKEN_BUCKETS)
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram("chatbot_llm_tokens_per_second", "Generation throughput", ("stage", "phase"), RATE_BUCKETS)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Time a pipeline stage and count it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    hits = CACHE_REQUESTS.get(cache=cache, result="hit")
+    total = hits + CACHE_REQUESTS.get(cache=cache, result="miss")
+    CACHE_HIT_RATIO.set(hits / total if total else 0.0, cache=cache)
+
+
+def _perf_snapshot(llm) -> Optional[Tuple[float, float, int, int]]:
+    """Read llama.cpp's cumulative prompt-eval/eval timings, if the binding exposes them"""
+    try:
+        import llama_cpp
+        data = llama_cpp.llama_perf_context(llm._ctx.ctx)
+        return data.t_p_eval_ms / 1000.0, data.t_eval_ms / 1000.0, int(data.n_p_eval), int(data.n_eval)
+    except Exception:
+        return None
+
+
+def timed_completion(llm, prompt: str, stage: str, **kwargs) -> Dict[str, Any]:
+    """Run a llama.cpp completion and record latency, token counts and tokens/sec.
+
+    Prompt evaluation and token generation are reported separately when
+    llama.cpp's perf counters are available.
+    """
+    before = _perf_snapshot(llm)
+    with track_stage(stage):
+        start = time.perf_counter()
+        response = llm(prompt, **kwargs)
+        elapsed = time.perf_counter() - start
+    after = _perf_snapshot(llm)
+    # Speculative drafts: count the last draft's accepted tokens
+    draft = getattr(llm, "draft_model", None)
+    if draft is not None:
+        # Imported here: speculative.py registers its metrics with this module
+        from actions.utils.speculative import settle_draft
+        settle_draft(llm)
+
+    usage = response.get("usage", {}) if isinstance(response, dict) else {}
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, stage=stage)
+    LLM_COMPLETION_TOKENS.observe(completion_tokens, stage=stage)
+
+    if before and after:
+        p_eval_s, eval_s = after[0] - before[0], after[1] - before[1]
+        n_p_eval, n_eval = after[2] - before[2], after[3] - before[3]
+        STAGE_LATENCY.observe(p_eval_s, stage=f"{stage}_prompt_eval")
+        STAGE_LATENCY.observe(eval_s, stage=f"{stage}_token_generation")
+        if p_eval_s > 0 and n_p_eval > 0:
+            LLM_TOKENS_PER_SECOND.observe(n_p_eval / p_eval_s, stage=stage, phase="prompt_eval")
+        if eval_s > 0 and n_eval > 0:
+            LLM_TOKENS_PER_SECOND.observe(n_eval / eval_s, stage=stage, phase="generation")
+    if (draft is not None or not (before and after)) and elapsed > 0 and completion_tokens:
+        # Verified draft batches count as prompt eval in llama.cpp, so also report wall-clock speed
+        LLM_TOKENS_PER_SECOND.observe(completion_tokens / elapsed, stage=stage, phase="end_to_end")
+    return response
+
+
+# Per-request trace ids -------------------------------------------------------
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("trace_id", default="-")
+
+
+def new_trace_id(trace_id: Optional[str] = None) -> str:
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def get_trace_id() -> str:
+    return _trace_id.get()
+
+
+class TraceIdFilter(logging.Filter):
+    """Attach the current request's trace id to every log record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = get_trace_id()
+        return True
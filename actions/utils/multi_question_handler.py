@@ -1,22 +1,131 @@
 import re
-from typing import List, Tuple
+from typing import List, Set, Tuple
+
+# Clause boundaries. Strong ones (sentence punctuation, a full stop followed by
+# a space so "Rp 50.000" stays whole) always end a clause. Weak ones (a comma,
+# the conjunctions patients chain questions with) only end one when the next
+# fragment starts a question of its own (see `_splits`). Every alternative is a
+# fixed token, so one finditer pass is linear in the message length with no
+# backtracking.
+_BOUNDARY = re.compile(
+    r"(?P<strong>[?!;\n]+|\.(?=\s|$))|,(?=\s|$)|\b(?:dan|serta|terus|lalu|kemudian)\b",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"\w+")
+
+# A clause asks something if it has a question word or a verb. Verbs are listed
+# rather than guessed from affixes: "di-"/"ber-"/"me-" also start nouns such as
+# "diabetes", "diare" and "bersalin".
+QUESTION_WORDS = frozenset({
+    "apa", "apakah", "berapa", "bagaimana", "gimana", "kapan", "dimana", "mana", "siapa",
+    "mengapa", "kenapa", "bisakah", "bolehkah", "adakah", "bisa", "boleh", "ada",
+})
+VERBS = frozenset({
+    "buka", "dibuka", "tutup", "ditutup", "daftar", "mendaftar", "didaftarkan", "bayar", "membayar", "dibayar",
+    "datang", "berkunjung", "mengunjungi", "terima", "menerima", "diterima", "praktek", "praktik", "berpraktik",
+    "pakai", "memakai", "dipakai", "menggunakan", "digunakan", "perlu", "harus", "urus", "mengurus", "diurus",
+    "ambil", "mengambil", "diambil", "cek", "periksa", "memeriksa", "diperiksa", "antri", "antre", "mengantre",
+    "konsultasi", "berkonsultasi", "jenguk", "menjenguk", "bawa", "membawa", "dibawa", "berobat", "dirawat",
+    "melayani", "dilayani", "cari", "mencari", "bertemu", "ketemu", "mendapat", "mendapatkan", "menginap",
+})
+# Answers to a tag question, not a topic: "Rp 50.000, apakah benar?"
+TAG_WORDS = frozenset({"benar", "betul", "bukan", "tidak", "kah", "iya"})
+
+# Words that carry no topic on their own ("halo kak, mau tanya, ...")
+FILLER_WORDS = frozenset({
+    "halo", "hallo", "hai", "hi", "pagi", "siang", "sore", "malam", "selamat",
+    "kak", "min", "admin", "sus", "dok", "pak", "bu", "mas", "mbak",
+    "mau", "ingin", "tanya", "bertanya", "nanya", "dong", "ya", "yah", "nih", "sih",
+    "saya", "aku", "boleh", "permisi", "maaf", "tolong", "info", "informasi",
+    "terima", "kasih", "makasih", "ok", "oke", "juga", "apakah", "gimana", "bagaimana",
+})
+_NOT_TOPIC = FILLER_WORDS | QUESTION_WORDS | TAG_WORDS
+
 
 class MultiQuestionHandler:
-    MULTI_QUESTION_PATTERNS = [
-        r"(.+?\?)\s*(.+?\?)",  # Two questions separated by '?'
-        r"(.+? dan .+?\?)",      # 'and' conjunction
-        r"(.+?\?.+?\?)",        # Two questions, no separator
-    ]
+    MAX_CLAUSES = 5
+
+    @staticmethod
+    def _has_topic(clause: str) -> bool:
+        return any(w not in FILLER_WORDS for w in _WORD.findall(clause.lower()))
+
+    @staticmethod
+    def _scan(fragment: str) -> Tuple[bool, Set[str]]:
+        """(asks something, topic words) of one fragment"""
+        words = _WORD.findall(fragment.lower())
+        return any(w in QUESTION_WORDS or w in VERBS for w in words), {w for w in words if w not in _NOT_TOPIC}
+
+    @staticmethod
+    def _splits(clause_asks: bool, clause_topics: Set[str], next_asks: bool, next_topics: Set[str]) -> bool:
+        """Whether a weak boundary ends the clause built so far"""
+        if not next_topics or not clause_asks:
+            # "..., apakah benar?" is about this clause; "poli gigi, buka jam berapa?" asks about its topic
+            return False
+        if next_asks:
+            return True
+        # A bare topic is a new question ("jam buka dan bpjs?") unless it continues
+        # a list ("biaya poli anak dan poli gigi")
+        return clause_topics.isdisjoint(next_topics)
+
+    @staticmethod
+    def segment(user_message: str) -> List[str]:
+        """Split a message into topical clauses in a single left-to-right pass.
+
+        Each fragment between boundaries is scanned once and the clause keeps
+        a running "asks" flag and topic set, so the cost stays linear however
+        many commas a message has. Filler-only fragments ("halo", "mau tanya")
+        are folded into the clause that follows them, so they never become
+        retrieval queries of their own.
+        """
+        # (text before the boundary, boundary is strong, boundary text)
+        pieces = []
+        start = 0
+        for match in _BOUNDARY.finditer(user_message):
+            pieces.append((user_message[start:match.start()], match.group("strong") is not None, match.group()))
+            start = match.end()
+        pieces.append((user_message[start:], True, ""))
+        scans = [MultiQuestionHandler._scan(fragment) for fragment, _, _ in pieces]
+
+        clauses: List[str] = []
+        carry = ""
+        parts: List[str] = []
+        clause_asks, clause_topics = False, set()
+        for i, (fragment, strong, separator) in enumerate(pieces):
+            parts.append(fragment)
+            clause_asks = clause_asks or scans[i][0]
+            clause_topics |= scans[i][1]
+            if not strong and not MultiQuestionHandler._splits(clause_asks, clause_topics, *scans[i + 1]):
+                parts.append(separator)
+                continue
+            carry = MultiQuestionHandler._push(clauses, carry, "".join(parts))
+            parts, clause_asks, clause_topics = [], False, set()
+        if carry:
+            if clauses:
+                clauses[-1] = f"{clauses[-1]} {carry}"
+            else:
+                clauses.append(carry)
+        if len(clauses) > MultiQuestionHandler.MAX_CLAUSES:
+            # Keep the first clauses separate and the tail together
+            head = clauses[:MultiQuestionHandler.MAX_CLAUSES - 1]
+            clauses = head + [" ".join(clauses[MultiQuestionHandler.MAX_CLAUSES - 1:])]
+        return clauses
+
+    @staticmethod
+    def _push(clauses: List[str], carry: str, fragment: str) -> str:
+        fragment = fragment.strip(" \t,.:-")
+        if not fragment:
+            return carry
+        if carry:
+            fragment = f"{carry} {fragment}"
+        if not MultiQuestionHandler._has_topic(fragment):
+            return fragment
+        clauses.append(fragment)
+        return ""
 
     @staticmethod
     def detect_multi_questions(user_message: str) -> bool:
-        for pattern in MultiQuestionHandler.MULTI_QUESTION_PATTERNS:
-            if re.search(pattern, user_message, re.IGNORECASE):
-                return True
-        return False
+        return len(MultiQuestionHandler.segment(user_message)) > 1
 
     @staticmethod
     def split_questions_with_context(user_message: str) -> List[str]:
-        # Split by '?', keep context
-        questions = [q.strip() + '?' for q in user_message.split('?') if q.strip()]
-        return questions 
\ No newline at end of file
+        return MultiQuestionHandler.segment(user_message)
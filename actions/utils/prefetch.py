@@ -0,0 +1,162 @@
+"""
+Background prefetch along the `related_faqs` graph.
+
+After a sender asks about one FAQ, the FAQs it lists as related are the most
+likely next questions. Their answers are prepared on a background thread while
+the model is idle, so the follow-up is served without waiting on generation.
+Each (asked, related) edge keeps a decayed hit rate - did the sender actually
+ask about the related FAQ next? - and edges that are rarely followed stop
+being prefetched, except for an `explore` fraction that keeps them measured.
+The exported hit rate is the share of FAQ turns actually answered from a
+prefetched answer (reported by the caller through `served`).
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from actions.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_JOBS = REGISTRY.counter("chatbot_prefetch_jobs_total", "Related-FAQ prefetch jobs by outcome", ("result",))
+PREFETCH_PREDICTIONS = REGISTRY.counter("chatbot_prefetch_predictions_total", "Prefetched FAQs the sender did / did not ask about next", ("result",))
+PREFETCH_HIT_RATE = REGISTRY.gauge("chatbot_prefetch_hit_rate", "Decayed share of FAQ turns answered from a prefetched answer")
+
+
+class RelatedFaqPrefetcher:
+    """Predict next FAQs from `related_faqs` and warm them in the background.
+
+    `warm(faq)` does the actual work and returns False when the model was
+    busy; the job is then retried after `idle_poll` seconds until `max_wait`.
+    """
+
+    def __init__(self, faqs: List[Dict], warm: Callable[[Dict], bool], max_per_turn: int = 2,
+                 min_hit_rate: float = 0.15, explore: float = 0.1, decay: float = 0.97,
+                 max_pending: int = 16, idle_poll: float = 0.25, max_wait: float = 30.0,
+                 prediction_ttl: float = 1800.0, max_users: int = 10_000):
+        self.faqs = {f['id']: f for f in faqs if f.get('id')}
+        self.warm = warm
+        self.max_per_turn = max_per_turn
+        self.min_hit_rate = min_hit_rate
+        self.explore = explore
+        self.decay = decay
+        self.idle_poll = idle_poll
+        self.max_wait = max_wait
+        self.prediction_ttl = prediction_ttl
+        self.max_users = max_users
+        self._edges: Dict[Tuple[str, str], List[float]] = {}  # (asked, related) -> [decayed tries, decayed hits]
+        self._turns = [0.0, 0.0]  # decayed [FAQ turns, turns answered from a prefetched answer]
+        self._predictions: "OrderedDict[str, Tuple[float, str, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._jobs: "queue.Queue[Tuple[float, Dict]]" = queue.Queue(maxsize=max_pending)
+        self._queued = set()  # guarded by _lock: touched by the event loop and the worker
+        self._worker = threading.Thread(target=self._run, name="faq-prefetch", daemon=True)
+        self._worker.start()
+
+    def edge_rate(self, asked: str, related: str) -> Tuple[float, float]:
+        """(hit rate, effective tries) with an optimistic prior so new edges get tried"""
+        tries, hits = self._edges.get((asked, related), (0.0, 0.0))
+        return (hits + 1.0) / (tries + 2.0), tries
+
+    def hit_rate(self) -> float:
+        turns, hits = self._turns
+        return hits / turns if turns else 0.0
+
+    def observe(self, user_id: str, faq_id: str) -> bool:
+        """Score the sender's previous prediction against `faq_id`, then prefetch its neighbours.
+
+        True if `faq_id` had been predicted for this sender, i.e. a prefetched
+        answer for it may be waiting.
+        """
+        now = time.monotonic()
+        predicted = False
+        with self._lock:
+            previous = self._predictions.pop(user_id, None)
+            if previous is not None and now - previous[0] <= self.prediction_ttl:
+                predicted = self._score(previous[1], previous[2], faq_id)
+            targets = self._choose(faq_id)
+            if targets:
+                self._predictions[user_id] = (now, faq_id, targets)
+                while len(self._predictions) > self.max_users:
+                    self._predictions.popitem(last=False)
+        for target in targets:
+            self._enqueue(self.faqs[target], now)
+        return predicted
+
+    def served(self, hit: bool):
+        """Record whether a FAQ turn was answered from a prefetched answer"""
+        with self._lock:
+            self._turns[0] = self._turns[0] * self.decay + 1.0
+            self._turns[1] = self._turns[1] * self.decay + (1.0 if hit else 0.0)
+            PREFETCH_HIT_RATE.set(self.hit_rate())
+
+    def _score(self, asked: str, predicted: List[str], actual: str) -> bool:
+        hit = actual in predicted
+        for related in predicted:
+            stats = self._edges.setdefault((asked, related), [0.0, 0.0])
+            stats[0] = stats[0] * self.decay + 1.0
+            stats[1] = stats[1] * self.decay + (1.0 if related == actual else 0.0)
+        PREFETCH_PREDICTIONS.inc(result="hit" if hit else "miss")
+        return hit
+
+    def _choose(self, faq_id: str) -> List[str]:
+        faq = self.faqs.get(faq_id)
+        if not faq:
+            return []
+        candidates = []
+        for related in faq.get('related_faqs', []):
+            if related not in self.faqs or related == faq_id:
+                continue
+            rate, _ = self.edge_rate(faq_id, related)
+            if rate >= self.min_hit_rate or random.random() < self.explore:
+                candidates.append((rate, related))
+            else:
+                PREFETCH_JOBS.inc(result="skipped_low_hit_rate")
+        candidates.sort(reverse=True)
+        return [related for _, related in candidates[:self.max_per_turn]]
+
+    def _enqueue(self, faq: Dict, now: float):
+        with self._lock:
+            if faq['id'] in self._queued:
+                return
+            try:
+                self._jobs.put_nowait((now, faq))
+                self._queued.add(faq['id'])
+            except queue.Full:
+                PREFETCH_JOBS.inc(result="dropped")
+
+    def _run(self):
+        while True:
+            queued_at, faq = self._jobs.get()
+            try:
+                while not self.warm(faq):
+                    if time.monotonic() - queued_at > self.max_wait:
+                        PREFETCH_JOBS.inc(result="expired")
+                        break
+                    time.sleep(self.idle_poll)
+                else:
+                    PREFETCH_JOBS.inc(result="done")
+            except Exception as e:
+                PREFETCH_JOBS.inc(result="failed")
+                logger.warning(f"Prefetch of {faq['id']} failed: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(faq['id'])
+
+
+def prefetcher_from_env(faqs: List[Dict], warm: Callable[[Dict], bool]) -> Optional[RelatedFaqPrefetcher]:
+    """PREFETCH_RELATED (default true), PREFETCH_MAX_PER_TURN, PREFETCH_MIN_HIT_RATE"""
+    if os.getenv("PREFETCH_RELATED", "true").lower() != "true":
+        return None
+    return RelatedFaqPrefetcher(
+        faqs,
+        warm,
+        max_per_turn=int(os.getenv("PREFETCH_MAX_PER_TURN", 2)),
+        min_hit_rate=float(os.getenv("PREFETCH_MIN_HIT_RATE", 0.15)),
+    )
@@ -0,0 +1,180 @@
+"""
+Token-aware prompt assembly.
+
+Templates from actions/utils/prompts.py are filled slot by slot while counting
+tokens with the model's own tokenizer. Token ids for template fragments and
+FAQ text are kept in an LRU keyed by the text itself (edited FAQs simply miss,
+so no tenant's corpus change invalidates another's), and only the user's
+message is tokenized per request. When the filled prompt would not leave room for the
+reply, the least important slots are cut first: extra FAQs are dropped from
+lists, then long text is truncated at a token boundary. Required slots (the
+FAQ answer a reply is grounded in) are never cut; if the prompt still does
+not fit, build() raises PromptTooLong and the caller answers verbatim.
+"""
+
+import logging
+import os
+import string
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from actions.utils.metrics import REGISTRY, TOKEN_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+PROMPT_PART_TOKENS = REGISTRY.histogram("chatbot_prompt_part_tokens", "Prompt tokens per part of the template", ("stage", "part"), TOKEN_BUCKETS)
+PROMPT_TRUNCATIONS = REGISTRY.counter("chatbot_prompt_truncations_total", "Prompt slots cut to fit the token budget", ("stage", "part"))
+
+SAFETY_MARGIN = 8  # Fragments tokenized separately can merge differently at the joins
+
+
+class PromptTooLong(ValueError):
+    """The prompt cannot fit without cutting a required slot"""
+
+
+def corpus_version(path: str = "data/faqs.json") -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of the FAQ file; changes whenever the corpus is edited"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Slot:
+    """Text for one template field. Lower `priority` is kept longer; `required` is never cut."""
+
+    def __init__(self, text: str, priority: int = 0, cacheable: bool = False, min_tokens: int = 0, required: bool = False):
+        self.text = text or ""
+        self.priority = priority
+        self.cacheable = cacheable
+        self.min_tokens = min_tokens
+        self.required = required
+
+
+class ListSlot:
+    """Several items joined by `sep`; the last items are dropped first"""
+
+    def __init__(self, items: Sequence[str], priority: int = 1, sep: str = "\n", cacheable: bool = True, min_items: int = 1,
+                 required: bool = False):
+        self.items = [i for i in items if i]
+        self.priority = priority
+        self.sep = sep
+        self.cacheable = cacheable
+        self.min_items = min_items
+        self.required = required
+
+
+class PromptBuilder:
+    def __init__(self, llm, budget: Optional[int] = None, max_cached: int = 4096):
+        self.llm = llm
+        env_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", 0))
+        self.budget = budget or env_budget or None  # None = whatever n_ctx leaves after the reply
+        self.max_cached = max_cached
+        self._tokens: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._templates: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        self._lock = threading.Lock()
+
+    def tokenize(self, text: str, cacheable: bool = False) -> List[int]:
+        if cacheable:
+            with self._lock:
+                tokens = self._tokens.get(text)
+                if tokens is not None:
+                    self._tokens.move_to_end(text)
+                    return tokens
+        tokens = self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+        if cacheable:
+            with self._lock:
+                self._tokens[text] = tokens
+                while len(self._tokens) > self.max_cached:
+                    self._tokens.popitem(last=False)
+        return tokens
+
+    def count(self, text: str, cacheable: bool = False) -> int:
+        return len(self.tokenize(text, cacheable))
+
+    def _truncate(self, text: str, tokens: List[int], keep: int) -> str:
+        if keep <= 0:
+            return ""
+        return self.llm.detokenize(tokens[:keep]).decode("utf-8", errors="ignore").rstrip() + "…"
+
+    def _parse(self, template: str) -> List[Tuple[str, Optional[str]]]:
+        parts = self._templates.get(template)
+        if parts is None:
+            parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(template)]
+            self._templates[template] = parts
+        return parts
+
+    def token_budget(self, max_tokens: int) -> int:
+        available = self.llm.n_ctx() - max_tokens - SAFETY_MARGIN
+        return min(self.budget, available) if self.budget else available
+
+    def build(self, template: str, stage: str, max_tokens: int, **slots: Any) -> str:
+        """Fill `template`, fitting it into the prompt budget for a `max_tokens` reply.
+
+        Plain strings become priority-0 slots. Token usage per part is
+        recorded under `chatbot_prompt_part_tokens{stage=..., part=...}`.
+        Raises PromptTooLong when only cutting a required slot would make it fit.
+        """
+        parts = self._parse(template)
+        # Slots the template doesn't use (e.g. a tenant override without {hospital_name}) cost nothing
+        fields = {field for _, field in parts if field}
+        slots = {name: value if isinstance(value, (Slot, ListSlot)) else Slot(value)
+                 for name, value in slots.items() if name in fields}
+        fixed = sum(self.count(literal, cacheable=True) for literal, _ in parts if literal)
+
+        # Token ids per slot; for lists, per item (+1 per separator as an estimate)
+        tokens: Dict[str, Any] = {}
+        for name, slot in slots.items():
+            if isinstance(slot, ListSlot):
+                tokens[name] = [self.tokenize(item, slot.cacheable) for item in slot.items]
+            else:
+                tokens[name] = self.tokenize(slot.text, slot.cacheable)
+
+        def size(name: str) -> int:
+            if isinstance(slots[name], ListSlot):
+                return sum(len(t) for t in tokens[name]) + max(0, len(tokens[name]) - 1)
+            return len(tokens[name])
+
+        budget = self.token_budget(max_tokens)
+        overflow = fixed + sum(size(n) for n in slots) - budget
+        # Least important first; within a priority, the biggest slot first
+        for name in sorted(slots, key=lambda n: (-slots[n].priority, -size(n))):
+            if overflow <= 0:
+                break
+            slot = slots[name]
+            if slot.required:
+                continue
+            if isinstance(slot, ListSlot):
+                while overflow > 0 and len(slot.items) > slot.min_items:
+                    before = size(name)
+                    slot.items.pop()
+                    tokens[name].pop()
+                    overflow -= before - size(name)
+                    PROMPT_TRUNCATIONS.inc(stage=stage, part=name)
+                if overflow > 0 and slot.items:
+                    last = tokens[name][-1]
+                    keep = max(0, len(last) - overflow)
+                    slot.items[-1] = self._truncate(slot.items[-1], last, keep)
+                    tokens[name][-1] = last[:keep]
+                    overflow -= len(last) - keep
+                    PROMPT_TRUNCATIONS.inc(stage=stage, part=name)
+            elif len(tokens[name]) > slot.min_tokens:
+                keep = max(slot.min_tokens, len(tokens[name]) - overflow)
+                slot.text = self._truncate(slot.text, tokens[name], keep)
+                overflow -= len(tokens[name]) - keep
+                tokens[name] = tokens[name][:keep]
+                PROMPT_TRUNCATIONS.inc(stage=stage, part=name)
+        if overflow > 0:
+            required = [name for name, slot in slots.items() if slot.required]
+            if required:
+                PROMPT_TRUNCATIONS.inc(stage=stage, part="rejected")
+                raise PromptTooLong(f"Prompt for {stage} is {overflow} tokens over budget without cutting {required}")
+            logger.warning(f"Prompt for {stage} is {overflow} tokens over budget after truncation")
+
+        PROMPT_PART_TOKENS.observe(fixed, stage=stage, part="template")
+        for name in slots:
+            PROMPT_PART_TOKENS.observe(size(name), stage=stage, part=name)
+        values = {name: slot.sep.join(slot.items) if isinstance(slot, ListSlot) else slot.text for name, slot in slots.items()}
+        return template.format(**values)
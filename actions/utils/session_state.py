@@ -0,0 +1,203 @@
+"""
+Per-session llama.cpp state snapshots.
+
+After each turn the context's KV cache is saved under the session id. On the
+next turn it is restored before the completion, and llama.cpp's prefix
+matching then only evaluates the tokens after the shared transcript, i.e. the
+new user turn. Snapshots live in a byte-bounded LRU in RAM; the least
+recently used ones spill to disk (also byte-bounded) and are promoted back on
+their next use.
+"""
+
+import logging
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from actions.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SESSION_LOOKUPS = REGISTRY.counter("chatbot_session_state_lookups_total", "Session snapshot lookups by tier", ("result",))
+SESSION_BYTES = REGISTRY.gauge("chatbot_session_state_bytes", "Bytes of session snapshots held", ("tier",))
+
+
+class SessionSnapshot:
+    """Transcript turns plus the llama.cpp state that evaluated them"""
+
+    __slots__ = ("turns", "input_ids", "state", "seed")
+
+    def __init__(self, turns: List[Tuple[str, str]], input_ids: np.ndarray, state: bytes, seed: int):
+        self.turns = turns          # (prompt, raw completion) per turn, oldest first
+        self.input_ids = input_ids  # tokens in the KV cache
+        self.state = state          # llama_state_get_data() bytes
+        self.seed = seed
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.state) + self.input_ids.nbytes + sum(len(p) + len(r) for p, r in self.turns)
+
+    @classmethod
+    def capture(cls, llm, turns: List[Tuple[str, str]]) -> "SessionSnapshot":
+        state = llm.save_state()
+        return cls(turns, np.array(llm.input_ids[:llm.n_tokens], copy=True), state.llama_state, state.seed)
+
+    def restore(self, llm):
+        from llama_cpp.llama import LlamaState
+
+        input_ids = np.zeros(llm.n_ctx(), dtype=np.intc)
+        input_ids[:len(self.input_ids)] = self.input_ids
+        # Logits aren't needed: the new turn is evaluated before anything is sampled
+        llm.load_state(LlamaState(
+            input_ids=input_ids,
+            scores=np.zeros((1, llm.n_vocab()), dtype=np.single),
+            n_tokens=len(self.input_ids),
+            llama_state=self.state,
+            llama_state_size=len(self.state),
+            seed=self.seed,
+        ))
+
+
+def transcript(turns: List[Tuple[str, str]], prompt: str) -> str:
+    """Llama-2 style multi-turn prompt: earlier turns, then the new one"""
+    return "".join(f"{p}{r}</s>" for p, r in turns) + prompt
+
+
+def history_turns(history: List[dict]) -> List[Tuple[str, str]]:
+    """Seed turns from tracker history when there is no snapshot (new worker, evicted)"""
+    turns = []
+    pending_user = None
+    for msg in history:
+        if msg.get('type') == 'user':
+            pending_user = msg.get('text', '')
+        elif pending_user is not None:
+            turns.append((f"<s>[INST] {pending_user} [/INST] ", msg.get('text', '')))
+            pending_user = None
+    return turns
+
+
+class SessionStateStore:
+    def __init__(self, max_ram_bytes: int, max_disk_bytes: int = 0, spill_dir: Optional[str] = None):
+        self.max_ram_bytes = max_ram_bytes
+        self.max_disk_bytes = max_disk_bytes if spill_dir else 0
+        self.spill_dir = spill_dir
+        self._ram: "OrderedDict[str, SessionSnapshot]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # session id -> file size
+        self._ram_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if self.max_disk_bytes:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Snapshots from an earlier process aren't indexed; start clean
+            for name in os.listdir(spill_dir):
+                if name.endswith(".state"):
+                    os.remove(os.path.join(spill_dir, name))
+
+    def __len__(self) -> int:
+        return len(self._ram) + len(self._disk)
+
+    def _path(self, session_id: str) -> str:
+        # Prefork workers share the directory but each keeps its own index
+        digest = hashlib.sha1(session_id.encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{os.getpid()}-{digest}.state")
+
+    def get(self, session_id: str) -> Optional[SessionSnapshot]:
+        with self._lock:
+            snapshot = self._ram.get(session_id)
+            if snapshot is not None:
+                self._ram.move_to_end(session_id)
+                SESSION_LOOKUPS.inc(result="ram")
+                return snapshot
+            if session_id not in self._disk:
+                SESSION_LOOKUPS.inc(result="miss")
+                return None
+            self._disk_bytes -= self._disk.pop(session_id)
+            path = self._path(session_id)
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+            os.remove(path)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Failed to load session state for {session_id}: {e}")
+            SESSION_LOOKUPS.inc(result="miss")
+            return None
+        SESSION_LOOKUPS.inc(result="disk")
+        self.put(session_id, snapshot)
+        return snapshot
+
+    def put(self, session_id: str, snapshot: SessionSnapshot):
+        spill = []
+        with self._lock:
+            old = self._ram.pop(session_id, None)
+            if old is not None:
+                self._ram_bytes -= old.nbytes
+            self._ram[session_id] = snapshot
+            self._ram_bytes += snapshot.nbytes
+            while self._ram_bytes > self.max_ram_bytes and len(self._ram) > 1:
+                victim_id, victim = self._ram.popitem(last=False)
+                self._ram_bytes -= victim.nbytes
+                spill.append((victim_id, victim))
+        for victim_id, victim in spill:
+            self._spill(victim_id, victim)
+        self._update_gauges()
+
+    def _spill(self, session_id: str, snapshot: SessionSnapshot):
+        if not self.max_disk_bytes or snapshot.nbytes > self.max_disk_bytes:
+            return
+        path = self._path(session_id)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning(f"Failed to spill session state for {session_id}: {e}")
+            return
+        size = os.path.getsize(path)
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(session_id, 0)
+            self._disk[session_id] = size
+            self._disk_bytes += size
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                victim_id, victim_size = self._disk.popitem(last=False)
+                self._disk_bytes -= victim_size
+                evicted.append(victim_id)
+        for victim_id in evicted:
+            try:
+                os.remove(self._path(victim_id))
+            except OSError:
+                pass
+
+    def drop(self, session_id: str):
+        with self._lock:
+            snapshot = self._ram.pop(session_id, None)
+            if snapshot is not None:
+                self._ram_bytes -= snapshot.nbytes
+            on_disk = self._disk.pop(session_id, None)
+            if on_disk is not None:
+                self._disk_bytes -= on_disk
+        if on_disk is not None:
+            try:
+                os.remove(self._path(session_id))
+            except OSError:
+                pass
+        self._update_gauges()
+
+    def _update_gauges(self):
+        SESSION_BYTES.set(self._ram_bytes, tier="ram")
+        SESSION_BYTES.set(self._disk_bytes, tier="disk")
+
+
+def store_from_env() -> Optional[SessionStateStore]:
+    """SESSION_STATE_RAM_MB (0 disables), SESSION_STATE_DISK_MB, SESSION_STATE_DIR"""
+    ram_mb = float(os.getenv("SESSION_STATE_RAM_MB", 256))
+    if ram_mb <= 0:
+        return None
+    disk_mb = float(os.getenv("SESSION_STATE_DISK_MB", 1024))
+    spill_dir = os.getenv("SESSION_STATE_DIR", "cache/session_state") if disk_mb > 0 else None
+    return SessionStateStore(int(ram_mb * 1024 * 1024), int(disk_mb * 1024 * 1024), spill_dir)
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from actions.utils.metrics import REGISTRY
+
+COALESCED = REGISTRY.counter("chatbot_singleflight_coalesced_total", "Requests that shared an in-flight result", ("group",))
+
+
+class _LeaderCancelled(Exception):
+    """The call followers were waiting on was cancelled; they retry instead"""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs `fn`; callers arriving while it is still
+    running await the same future and receive the same result (or exception).
+    If the leading caller is cancelled (e.g. its client disconnected), the
+    followers are not: the first of them to wake up runs its own `fn` as the
+    new leader and the rest wait on that. Nothing is remembered once the call
+    finishes - caching stays the caller's job.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        coalesced = False
+        while key in self._inflight:
+            if not coalesced:
+                COALESCED.inc(group=self.name)
+                coalesced = True
+            try:
+                # Shield so one impatient follower can't cancel the shared work
+                return await asyncio.shield(self._inflight[key])
+            except _LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark as retrieved so an unawaited follower-less future doesn't warn
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
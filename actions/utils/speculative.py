@@ -0,0 +1,125 @@
+"""
+Speculative decoding drafts for llama.cpp.
+
+FAQ-grounded answers mostly copy spans of the `answer` text in the prompt, so
+the next few tokens can often be guessed by finding the last generated n-gram
+in the prompt and proposing what followed it (prompt lookup). A tiny GGUF
+sharing the main model's vocabulary can draft instead. llama.cpp verifies all
+drafted tokens in one batch and keeps the prefix the main model would have
+sampled anyway, so outputs are unchanged - only fewer sequential decode steps
+are needed when drafts are accepted.
+
+Selected with LLAMA_SPECULATIVE=off|lookup|draft (see `draft_from_env`).
+"""
+
+import logging
+import os
+from typing import Any, Optional
+
+import numpy as np
+import numpy.typing as npt
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+from actions.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DRAFTED = REGISTRY.counter("chatbot_speculative_drafted_tokens_total", "Tokens proposed by the draft", ("mode",))
+ACCEPTED = REGISTRY.counter("chatbot_speculative_accepted_tokens_total", "Drafted tokens the main model kept", ("mode",))
+ACCEPTANCE_RATIO = REGISTRY.gauge("chatbot_speculative_acceptance_ratio", "Cumulative accepted / drafted tokens", ("mode",))
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """Greedy drafts from a small llama.cpp model with the same tokenizer"""
+
+    def __init__(self, llm, num_pred_tokens: int = 4):
+        self.llm = llm
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids: npt.NDArray[np.intc], /, **kwargs: Any) -> npt.NDArray[np.intc]:
+        draft = []
+        # generate() reuses the KV cache for the prefix shared with the previous call
+        for token in self.llm.generate(input_ids.tolist(), temp=0.0, top_k=1, repeat_penalty=1.0):
+            if token == self.llm.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= self.num_pred_tokens:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+class MeteredDraft(LlamaDraftModel):
+    """Wrap a draft model and count how many of its tokens the main model accepts.
+
+    A draft proposed at position p is settled on the next call (or by
+    `settle()` after the completion) by comparing it with the tokens that
+    actually ended up at p, p+1, ...
+    """
+
+    def __init__(self, inner: LlamaDraftModel, mode: str):
+        self.inner = inner
+        self.mode = mode
+        self._pending: Optional[tuple] = None
+
+    def __call__(self, input_ids: npt.NDArray[np.intc], /, **kwargs: Any) -> npt.NDArray[np.intc]:
+        self.settle(input_ids)
+        draft = self.inner(input_ids, **kwargs)
+        if len(draft):
+            self._pending = (len(input_ids), np.array(draft, copy=True))
+            DRAFTED.inc(len(draft), mode=self.mode)
+        return draft
+
+    def settle(self, input_ids: Optional[npt.NDArray[np.intc]] = None):
+        """Count the pending draft against `input_ids`; with no ids, drop it"""
+        pending, self._pending = self._pending, None
+        if pending is None or input_ids is None:
+            return
+        start, draft = pending
+        if start > len(input_ids):
+            return  # A new completion started; the old draft can't be matched
+        actual = np.asarray(input_ids[start:start + len(draft)])
+        matches = actual == draft[:len(actual)]
+        accepted = len(actual) if matches.all() else int(np.argmin(matches))
+        if accepted:
+            ACCEPTED.inc(accepted, mode=self.mode)
+        drafted = DRAFTED.get(mode=self.mode)
+        ACCEPTANCE_RATIO.set(ACCEPTED.get(mode=self.mode) / drafted if drafted else 0.0, mode=self.mode)
+
+
+def settle_draft(llm):
+    """Close out a completion's last draft; call after every generation on `llm`"""
+    draft = getattr(llm, "draft_model", None)
+    if isinstance(draft, MeteredDraft):
+        draft.settle(llm.input_ids[:llm.n_tokens])
+
+
+def draft_from_env(n_ctx: int, n_threads: int) -> Optional[MeteredDraft]:
+    """Draft model for load_llama from LLAMA_SPECULATIVE and friends (None = off).
+
+    - LLAMA_SPECULATIVE: off (default), lookup or draft
+    - LLAMA_DRAFT_TOKENS: tokens drafted per step (default 4; CPU verification
+      cost grows with it, so keep it small)
+    - LLAMA_DRAFT_NGRAM: longest n-gram matched for prompt lookup (default 3)
+    - LLAMA_DRAFT_MODEL_PATH: GGUF for "draft" mode; falls back to lookup
+    """
+    mode = os.getenv("LLAMA_SPECULATIVE", "off").lower()
+    if mode in ("", "off", "false", "0"):
+        return None
+    num_pred_tokens = int(os.getenv("LLAMA_DRAFT_TOKENS", 4))
+
+    if mode == "draft":
+        path = os.getenv("LLAMA_DRAFT_MODEL_PATH", "")
+        if path and os.path.exists(path):
+            from llama_cpp import Llama
+
+            draft_llm = Llama(model_path=path, n_ctx=n_ctx, n_threads=n_threads, n_batch=min(512, n_ctx),
+                              n_gpu_layers=0, verbose=False, use_mmap=True)
+            logger.info(f"Speculative decoding with draft model {path}")
+            return MeteredDraft(GGUFDraftModel(draft_llm, num_pred_tokens), "draft")
+        logger.warning(f"LLAMA_DRAFT_MODEL_PATH {path!r} not found, using prompt lookup drafts")
+        mode = "lookup"
+
+    if mode == "lookup":
+        max_ngram = int(os.getenv("LLAMA_DRAFT_NGRAM", 3))
+        return MeteredDraft(LlamaPromptLookupDecoding(max_ngram_size=max_ngram, num_pred_tokens=num_pred_tokens), "lookup")
+    raise ValueError(f"Unknown LLAMA_SPECULATIVE mode {mode!r}, expected off, lookup or draft")
@@ -0,0 +1,273 @@
+"""
+Tenant-scoped FAQ corpora, indexes and prompts.
+
+One deployment can answer for several hospitals and clinics. Each tenant has
+its own faqs.json, FAISS index files, hospital name and optional prompt
+template overrides. A message is routed to a tenant by the WhatsApp business
+number that received it (webhook `metadata.phone_number_id` or
+`display_phone_number`) or by the API key sent to /chat. Tenants are listed in
+TENANTS_FILE; without one there is a single default tenant that behaves like
+the original single-hospital setup (data/faqs.json, models/faq_faiss.index).
+
+TENANTS_FILE format:
+
+    {
+      "default": "brimob",
+      "tenants": [
+        {"id": "brimob", "name": "RS Bhayangkara Brimob", "faqs": "data/faqs.json",
+         "index_dir": "models", "phone_numbers": ["1098765432"], "api_keys": ["..."]},
+        {"id": "klinik-x", "name": "Klinik X", "faqs": "data/tenants/klinik-x/faqs.json",
+         "phone_numbers": ["1234567890"], "dialog360_api_key": "...", "nlu": "local",
+         "docs_dir": "models/tenants/klinik-x/docs",
+         "prompts": {"faq": "<s>[INST] ... {hospital_name} ... {user_message} ... {answer} [/INST]"}}
+      ]
+    }
+
+Corpora are small and read on first use. Indexes are the expensive part: they
+are loaded (or built) on first use and kept in an LRU bounded by
+TENANT_INDEX_BUDGET_MB, all sharing one embedding model. A tenant's
+`docs_dir` is a document store filled by actions/utils/ingest.py whose chunks
+are searched next to its FAQs by the FAQ action.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from actions.utils.embedders import Embedder, load_embedder
+from actions.utils.metrics import REGISTRY
+from actions.utils.prompts import DEFAULT_HOSPITAL_NAME, PROMPT_TEMPLATES
+from actions.utils.vector_search import VectorSearchManager
+
+logger = logging.getLogger(__name__)
+
+TENANT_INDEX_EVENTS = REGISTRY.counter("chatbot_tenant_index_events_total", "Per-tenant index loads, hits and evictions", ("event",))
+TENANT_INDEX_BYTES = REGISTRY.gauge("chatbot_tenant_index_bytes", "Bytes held by loaded per-tenant indexes")
+TENANT_INDEXES_LOADED = REGISTRY.gauge("chatbot_tenant_indexes_loaded", "Per-tenant indexes currently in memory")
+
+
+class Tenant:
+    def __init__(self, id: str, name: str, faqs: str, index_dir: str, phone_numbers: Optional[List[str]] = None,
+                 api_keys: Optional[List[str]] = None, dialog360_api_key: Optional[str] = None,
+                 nlu: str = "rasa", prompts: Optional[Dict[str, str]] = None, docs_dir: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.faqs_path = faqs
+        self.index_dir = index_dir
+        self.phone_numbers = [str(p) for p in phone_numbers or []]
+        self.api_keys = list(api_keys or [])
+        self.dialog360_api_key = dialog360_api_key
+        self.nlu = nlu  # "rasa", or "local" for corpora the Rasa model wasn't trained on
+        self.prompts = prompts or {}
+        self.docs_dir = docs_dir
+        self.is_default = False
+        self._faqs: List[Dict] = []
+        self._faqs_mtime = None
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.index_dir, "faq_faiss.index")
+
+    @property
+    def emb_path(self) -> str:
+        return os.path.join(self.index_dir, "faq_embeddings.npy")
+
+    def faqs(self) -> List[Dict]:
+        """The tenant's FAQ list, re-read when the file changes"""
+        try:
+            mtime = os.path.getmtime(self.faqs_path)
+        except OSError:
+            return self._faqs
+        if mtime != self._faqs_mtime:
+            with self._lock:
+                if mtime != self._faqs_mtime:
+                    try:
+                        with open(self.faqs_path, "r", encoding="utf-8") as f:
+                            self._faqs = json.load(f)
+                        self._faqs_mtime = mtime
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Failed to load FAQ data for tenant {self.id}: {e}")
+        return self._faqs
+
+    def faq(self, faq_id: str) -> Dict:
+        for faq in self.faqs():
+            if faq.get('id') == faq_id:
+                return faq
+        return {}
+
+    def template(self, name: str) -> str:
+        """Prompt template `name` ("faq", "greeting", ...), overridden per tenant if configured"""
+        return self.prompts.get(name) or PROMPT_TEMPLATES[name]
+
+    def session_key(self, sender: str) -> str:
+        """Sender id scoped to this tenant; the default tenant keeps plain ids"""
+        return sender if self.is_default else f"{self.id}:{sender}"
+
+
+class TenantRegistry:
+    def __init__(self, tenants: List[Tenant], default: Optional[str] = None):
+        if not tenants:
+            raise ValueError("At least one tenant is required")
+        self.tenants = {t.id: t for t in tenants}
+        self.default = self.tenants.get(default) or tenants[0]
+        self.default.is_default = True
+        self._by_phone = {p: t for t in tenants for p in t.phone_numbers}
+        self._by_key = {k: t for t in tenants for k in t.api_keys}
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+    def get(self, tenant_id: Optional[str]) -> Tenant:
+        return self.tenants.get(tenant_id) or self.default
+
+    def by_phone_number(self, *numbers: Optional[str]) -> Tenant:
+        """Tenant owning the first known business number (phone_number_id or display number)"""
+        for number in numbers:
+            if number and number in self._by_phone:
+                return self._by_phone[number]
+        return self.default
+
+    def by_api_key(self, api_key: str) -> Optional[Tenant]:
+        return self._by_key.get(api_key)
+
+
+def load_registry(path: str) -> TenantRegistry:
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    tenants = []
+    for item in spec.get("tenants", []):
+        tenant_id = item["id"]
+        tenants.append(Tenant(
+            tenant_id,
+            item.get("name", tenant_id),
+            item.get("faqs", os.path.join("data", "tenants", tenant_id, "faqs.json")),
+            item.get("index_dir", os.path.join("models", "tenants", tenant_id)),
+            phone_numbers=item.get("phone_numbers"),
+            api_keys=item.get("api_keys"),
+            dialog360_api_key=item.get("dialog360_api_key"),
+            nlu=item.get("nlu", "rasa"),
+            prompts=item.get("prompts"),
+            docs_dir=item.get("docs_dir"),
+        ))
+    return TenantRegistry(tenants, spec.get("default"))
+
+
+def registry_from_env() -> TenantRegistry:
+    """TENANTS_FILE if set, otherwise one default tenant (HOSPITAL_NAME, data/faqs.json, DOCS_DIR)"""
+    path = os.getenv("TENANTS_FILE", "")
+    if path:
+        return load_registry(path)
+    return TenantRegistry([Tenant("default", os.getenv("HOSPITAL_NAME", DEFAULT_HOSPITAL_NAME), "data/faqs.json", "models",
+                                  docs_dir=os.getenv("DOCS_DIR") or None)])
+
+
+def tenant_id(tracker) -> Optional[str]:
+    """Tenant id carried in the message metadata (set by main.py / the channel)"""
+    return (tracker.latest_message.get('metadata') or {}).get('tenant')
+
+
+class TenantIndexes:
+    """Per-tenant VectorSearchManagers, loaded on first use and evicted LRU.
+
+    The embedding model is loaded once and shared. When the loaded indexes
+    exceed `budget_bytes`, the least recently used ones are dropped (at least
+    one always stays); searches already holding an evicted index finish on it.
+    With `documents`, each index also serves the tenant's ingested document
+    chunks; callers that need FAQ-only results (intent lookup) leave it off.
+    """
+
+    def __init__(self, budget_bytes: int, embedder: Optional[Embedder] = None, documents: bool = False):
+        self.budget_bytes = budget_bytes
+        self.documents = documents
+        self._embedder = embedder
+        self._indexes: "OrderedDict[str, VectorSearchManager]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._background = set()
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = load_embedder()
+        return self._embedder
+
+    def loaded_embedder(self) -> Optional[Embedder]:
+        return self._embedder
+
+    def loaded(self) -> List[VectorSearchManager]:
+        with self._lock:
+            return list(self._indexes.values())
+
+    def nbytes(self) -> int:
+        return sum(index.nbytes() for index in self.loaded())
+
+    def peek(self, tenant: Tenant) -> Optional[VectorSearchManager]:
+        """The tenant's index if it is loaded, without loading it"""
+        with self._lock:
+            index = self._indexes.get(tenant.id)
+            if index is not None:
+                self._indexes.move_to_end(tenant.id)
+                TENANT_INDEX_EVENTS.inc(event="hit")
+            return index
+
+    def get(self, tenant: Tenant, wait: bool = True) -> Optional[VectorSearchManager]:
+        """The tenant's index; loads (or builds) it first, blocking unless `wait` is False.
+
+        With `wait=False` a missing index is loaded on a background thread and
+        None is returned until it is ready.
+        """
+        index = self.peek(tenant)
+        if index is not None:
+            return index
+        with self._lock:
+            if not wait:
+                if tenant.id not in self._background:
+                    self._background.add(tenant.id)
+                    threading.Thread(target=self._load_in_background, args=(tenant,),
+                                     name=f"tenant-index-{tenant.id}", daemon=True).start()
+                return None
+            loading = self._loading.setdefault(tenant.id, threading.Lock())
+        with loading:
+            # Whoever held the lock before us may have loaded it already
+            with self._lock:
+                index = self._indexes.get(tenant.id)
+            if index is None:
+                index = self._load(tenant)
+        return index
+
+    def _load_in_background(self, tenant: Tenant):
+        try:
+            self.get(tenant)
+        except Exception as e:
+            logger.error(f"Loading the index for tenant {tenant.id} failed: {e}")
+        finally:
+            with self._lock:
+                self._background.discard(tenant.id)
+
+    def _load(self, tenant: Tenant) -> VectorSearchManager:
+        index = VectorSearchManager(tenant.faqs_path, tenant.index_path, tenant.emb_path, embedding_model=self.embedder,
+                                    docs_dir=tenant.docs_dir if self.documents else None)
+        TENANT_INDEX_EVENTS.inc(event="load")
+        logger.info(f"Loaded index for tenant {tenant.id} ({index.nbytes() / 1024 / 1024:.1f} MB)")
+        with self._lock:
+            self._indexes[tenant.id] = index
+            total = sum(i.nbytes() for i in self._indexes.values())
+            while total > self.budget_bytes and len(self._indexes) > 1:
+                evicted_id, evicted = self._indexes.popitem(last=False)
+                total -= evicted.nbytes()
+                TENANT_INDEX_EVENTS.inc(event="evict")
+                logger.info(f"Evicted index for tenant {evicted_id} to stay within the index budget")
+            TENANT_INDEX_BYTES.set(total)
+            TENANT_INDEXES_LOADED.set(len(self._indexes))
+        return index
+
+
+def indexes_from_env(embedder: Optional[Embedder] = None, documents: bool = False) -> TenantIndexes:
+    """TENANT_INDEX_BUDGET_MB (default 512) of FAISS vectors and embeddings kept loaded"""
+    return TenantIndexes(int(float(os.getenv("TENANT_INDEX_BUDGET_MB", 512)) * 1024 * 1024), embedder, documents)
@@ -1,26 +1,54 @@
+import logging
 import os
 import json
+import threading
+import time
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from actions.utils.document_store import DocumentStore
+from actions.utils.embedders import Embedder, load_embedder
+from actions.utils.metrics import track_stage
+
+logger = logging.getLogger(__name__)
+
+def faq_text(faq: Dict[str, Any]) -> str:
+    """Text embedded for an FAQ in the index"""
+    return f"{faq.get('question', '')} {' '.join(faq.get('keywords', []))}"
+
 
 class VectorSearchManager:
-    def __init__(self, faq_json_path: str = "data/faqs.json", index_path: str = "models/faq_faiss.index", emb_path: str = "models/faq_embeddings.npy"):
+    # An ingest run commits every batch; pick its progress up at most this often
+    DOCS_RELOAD_SECONDS = 30.0
+
+    def __init__(self, faq_json_path: str = "data/faqs.json", index_path: str = "models/faq_faiss.index", emb_path: str = "models/faq_embeddings.npy",
+                 embedding_model: Optional[Embedder] = None, docs_dir: Optional[str] = None):
         self.faq_json_path = faq_json_path
         self.index_path = index_path
         self.emb_path = emb_path
-        self.embedding_model = None
+        # Records which model built the stored embeddings
+        self.meta_path = os.path.splitext(emb_path)[0] + ".meta.json"
+        self.embedding_model = embedding_model  # Shared between managers when passed in
         self.faiss_index = None
         self.faq_data = []
         self.faq_embeddings = None
         self.last_faq_mtime = None
+        # Document chunks written by actions/utils/ingest.py, searched next to the FAQs
+        self.docs_dir = docs_dir
+        # (store, FAISS index, index position -> store row), swapped as one on reload
+        self.documents: Optional[Tuple[DocumentStore, Any, np.ndarray]] = None
+        self.docs_version = None
+        self._docs_checked = 0.0
+        self._docs_loading = False  # A background reload is running (guarded by _rebuild_lock)
+        # Searches run on a thread pool; only one of them may reload/rebuild at a time
+        self._rebuild_lock = threading.Lock()
         self._init_all()
 
     def _init_all(self):
         self.load_faq_data()
         self.load_embedding_model()
         self.load_or_build_index()
+        self.load_documents()
 
     def load_faq_data(self):
         if not os.path.exists(self.faq_json_path):
@@ -35,19 +63,29 @@ class VectorSearchManager:
 
     def load_embedding_model(self):
         if self.embedding_model is None:
-            self.embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+            self.embedding_model = load_embedder()
+
+    def _index_matches_model(self) -> bool:
+        if self.faiss_index.d != self.embedding_model.dimension:
+            return False
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("model") == self.embedding_model.name
+        return True
 
     def load_or_build_index(self):
         if os.path.exists(self.index_path) and os.path.exists(self.emb_path):
             self.faiss_index = faiss.read_index(self.index_path)
             self.faq_embeddings = np.load(self.emb_path)
-        else:
-            self.build_index()
+            if self._index_matches_model():
+                return
+            logger.info(f"Stored FAQ index was built with another embedding model, rebuilding for {self.embedding_model.name}")
+        self.build_index()
 
     def build_index(self):
         if not self.faq_data:
             return
-        texts = [f"{faq.get('question', '')} {' '.join(faq.get('keywords', []))}" for faq in self.faq_data]
+        texts = [faq_text(faq) for faq in self.faq_data]
         embeddings = self.embedding_model.encode(texts, convert_to_tensor=False)
         self.faq_embeddings = np.array(embeddings).astype('float32')
         dim = self.faq_embeddings.shape[1]
@@ -56,30 +94,120 @@ class VectorSearchManager:
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
         faiss.write_index(self.faiss_index, self.index_path)
         np.save(self.emb_path, self.faq_embeddings)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.embedding_model.name, "dimension": dim}, f)
+
+    def load_documents(self):
+        """(Re)load the document index when the store has new commits"""
+        self._docs_checked = time.monotonic()
+        if not DocumentStore.exists(self.docs_dir):
+            return
+        store = DocumentStore(self.docs_dir)
+        version = store.version()
+        if version == self.docs_version:
+            return
+        if store.state.get("model") != self.embedding_model.name or store.dimension != self.embedding_model.dimension:
+            self.docs_version = version
+            logger.warning(f"Document store {self.docs_dir} holds {store.state.get('model')} vectors, "
+                           f"not {self.embedding_model.name}; re-ingest to serve it")
+            return
+        rows = store.live_rows()
+        index = faiss.IndexFlatL2(store.dimension)
+        # Added block by block from a memmap, so loading never holds two copies of the vectors
+        for vectors in store.iter_vectors(rows):
+            index.add(vectors)
+        # Searches keep using the previous tuple until this one is complete
+        self.documents = (store, index, rows)
+        self.docs_version = version
+        logger.info(f"Loaded {len(rows)} document chunks from {self.docs_dir}")
+
+    def nbytes(self) -> int:
+        """Memory held by the index: IndexFlatL2 stores raw float32 vectors, plus the embeddings copy"""
+        size = self.faiss_index.ntotal * self.faiss_index.d * 4 if self.faiss_index is not None else 0
+        if self.documents is not None:
+            _, index, rows = self.documents
+            size += index.ntotal * index.d * 4 + rows.nbytes
+        return size + (self.faq_embeddings.nbytes if self.faq_embeddings is not None else 0)
 
     def check_and_rebuild(self):
-        old_mtime = self.last_faq_mtime
-        self.load_faq_data()
-        if self.last_faq_mtime != old_mtime:
-            self.build_index()
+        with self._rebuild_lock:
+            old_mtime = self.last_faq_mtime
+            self.load_faq_data()
+            if self.last_faq_mtime != old_mtime:
+                self.build_index()
+            if self.docs_dir and not self._docs_loading and time.monotonic() - self._docs_checked >= self.DOCS_RELOAD_SECONDS:
+                # Rebuilding a large document index takes seconds; never on a search's thread
+                self._docs_checked = time.monotonic()
+                self._docs_loading = True
+                threading.Thread(target=self._reload_documents, name="docs-reload", daemon=True).start()
+
+    def _reload_documents(self):
+        try:
+            self.load_documents()
+        except Exception as e:
+            logger.error(f"Reloading documents from {self.docs_dir} failed: {e}")
+        finally:
+            with self._rebuild_lock:
+                self._docs_loading = False
 
     def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        return self.search_batch([query], top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Vector search for several queries with one encode and one FAISS call"""
         self.check_and_rebuild()
-        if not self.faiss_index or not self.embedding_model:
-            return []
-        query_emb = self.embedding_model.encode([query], convert_to_tensor=False)
+        documents = self.documents
+        if not queries or not self.embedding_model or (not self.faiss_index and documents is None):
+            return [[] for _ in queries]
+        with track_stage("embedding_encode"):
+            query_emb = self.embedding_model.encode(queries, convert_to_tensor=False)
         query_vec = np.array(query_emb).astype('float32')
-        distances, indices = self.faiss_index.search(query_vec, top_k)
-        results = []
-        for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx < len(self.faq_data):
-                faq = self.faq_data[idx].copy()
-                faq['similarity_score'] = 1.0 / (1.0 + dist)
-                faq['search_method'] = 'vector'
-                results.append(faq)
-        return results
+        batch = [[] for _ in queries]
+        if self.faiss_index:
+            with track_stage("faiss_search"):
+                distances, indices = self.faiss_index.search(query_vec, top_k)
+            self._collect_faqs(batch, distances, indices)
+        if documents is not None and documents[1].ntotal:
+            self._merge_documents(documents, query_vec, batch, top_k)
+        return batch
+
+    def _collect_faqs(self, batch: List[List[Dict[str, Any]]], distances: np.ndarray, indices: np.ndarray):
+        for results, row_dist, row_idx in zip(batch, distances, indices):
+            for dist, idx in zip(row_dist, row_idx):
+                if 0 <= idx < len(self.faq_data):
+                    faq = self.faq_data[idx].copy()
+                    faq['similarity_score'] = 1.0 / (1.0 + dist)
+                    faq['search_method'] = 'vector'
+                    results.append(faq)
+
+    def _merge_documents(self, documents, query_vec: np.ndarray, batch: List[List[Dict[str, Any]]], top_k: int):
+        """Add the nearest document chunks, shaped like FAQs, and keep the best `top_k` overall"""
+        store, index, rows = documents
+        with track_stage("faiss_search"):
+            distances, indices = index.search(query_vec, top_k)
+        for results, row_dist, row_idx in zip(batch, distances, indices):
+            for dist, idx in zip(row_dist, row_idx):
+                if 0 <= idx < len(rows):
+                    chunk = store.chunk(int(rows[idx]))
+                    results.append({
+                        'id': chunk['id'],
+                        'question': chunk['title'],
+                        'answer': chunk['text'],
+                        'keywords': [],
+                        'source': chunk['source'],
+                        'source_id': chunk['source_id'],
+                        'chunk': chunk['chunk'],
+                        'similarity_score': 1.0 / (1.0 + dist),
+                        'search_method': 'document',
+                    })
+            results.sort(key=lambda r: r['similarity_score'], reverse=True)
+            del results[top_k:]
 
     def keyword_fallback(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        with track_stage("keyword_fallback"):
+            return self._keyword_fallback(query, top_k)
+
+    def _keyword_fallback(self, query: str, top_k: int) -> List[Dict[str, Any]]:
         self.load_faq_data()
         query_lower = query.lower()
         scored = []
@@ -94,12 +222,25 @@ class VectorSearchManager:
         return scored[:top_k]
 
     def hybrid_search(self, query: str, context: Optional[Dict] = None, top_k: int = 3) -> List[Dict[str, Any]]:
-        vector_results = self.search(query, top_k)
-        if len(vector_results) < top_k:
-            keyword_results = self.keyword_fallback(query, top_k)
-            ids = {f['id'] for f in vector_results}
-            for f in keyword_results:
-                if f['id'] not in ids:
-                    vector_results.append(f)
-        # Optionally, context-aware reranking can be added here
-        return vector_results[:top_k] 
\ No newline at end of file
+        with track_stage("hybrid_search"):
+            return self._hybrid_search(query, context, top_k)
+
+    def _hybrid_search(self, query: str, context: Optional[Dict], top_k: int) -> List[Dict[str, Any]]:
+        return self._hybrid_search_batch([query], context, top_k)[0]
+
+    def hybrid_search_batch(self, queries: List[str], context: Optional[Dict] = None, top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        with track_stage("hybrid_search"):
+            return self._hybrid_search_batch(queries, context, top_k)
+
+    def _hybrid_search_batch(self, queries: List[str], context: Optional[Dict], top_k: int) -> List[List[Dict[str, Any]]]:
+        batch = self.search_batch(queries, top_k)
+        for query, vector_results in zip(queries, batch):
+            if len(vector_results) < top_k:
+                keyword_results = self.keyword_fallback(query, top_k)
+                ids = {f['id'] for f in vector_results}
+                for f in keyword_results:
+                    if f['id'] not in ids:
+                        vector_results.append(f)
+            # Optionally, context-aware reranking can be added here
+            del vector_results[top_k:]
+        return batch
@@ -0,0 +1 @@
+# Benchmark and load-testing harnesses for the Hospital FAQ Chatbot
@@ -0,0 +1,58 @@
+"""
+Shared helpers for the benchmark harnesses: labelled datasets and latency stats.
+"""
+
+import csv
+import json
+import math
+from typing import Dict, Iterable, List, Tuple
+
+# data/*_dataset.csv labels -> FAQ ids in data/faqs.json
+LABEL_TO_FAQ_ID = {
+    "operating_hours": "faq_operating_hours",
+    "bpjs_acceptance": "faq_bpjs",
+    "online_registration": "faq_online_registration",
+    "registration_location": "faq_registration_location",
+    "emergency_services": "faq_emergency",
+    "dental_clinic": "faq_dental",
+    "pediatric_clinic": "faq_pediatric",
+    "registration_fees": "faq_fees",
+}
+
+
+def load_labelled_dataset(path: str = "data/test_dataset.csv") -> List[Tuple[str, str]]:
+    """Return (text, faq_id) pairs from a text,label CSV"""
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = (row.get("text") or "").strip()
+            label = (row.get("label") or "").strip()
+            if text and label:
+                rows.append((text, LABEL_TO_FAQ_ID.get(label, f"faq_{label}")))
+    return rows
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(values: Iterable[float]) -> Dict[str, float]:
+    values = list(values)
+    return {
+        "count": len(values),
+        "mean_ms": (sum(values) / len(values) * 1000.0) if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000.0,
+        "p95_ms": percentile(values, 95) * 1000.0,
+        "p99_ms": percentile(values, 99) * 1000.0,
+    }
+
+
+def write_json(path: str, data: Dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
@@ -0,0 +1,152 @@
+"""
+Embedding backend export, parity and speed check.
+
+Exports Config.EMBEDDING_MODEL (or --model) to ONNX fp32 + dynamically
+quantized int8, then compares every backend against the torch reference on
+data/faqs.json and the labelled questions:
+
+- cosine similarity to the torch vectors (FAQ texts and queries)
+- top-1 FAQ agreement with torch and top-1 accuracy against the labels
+- load time, single-query encode latency and peak RSS
+
+Each backend runs in a fresh process so RSS reflects only what it imports.
+
+Usage:
+    python -m benchmarks.embedder_parity --export
+    python -m benchmarks.embedder_parity --backends torch,onnx,onnx-int8 --output embedder_parity.json
+
+Exits 1 if a backend's minimum cosine to torch falls below --min-cosine.
+Serve with EMBEDDING_BACKEND=onnx or onnx-int8.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.common import latency_summary, load_labelled_dataset, write_json
+from benchmarks.llm_bench import peak_rss_mb
+
+
+def run_backend(job: Dict[str, Any]) -> Dict[str, Any]:
+    from actions.utils.embedders import load_embedder
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    embedder = load_embedder(job["model"], job["backend"], job["onnx_dir"])
+    load_s = time.perf_counter() - start
+    if embedder.backend != job["backend"]:
+        return {"backend": job["backend"], "error": f"loaded {embedder.backend} instead"}
+
+    faq_vectors = embedder.encode(job["faq_texts"])
+    timings, query_vectors = [], []
+    for _ in range(job["repeats"]):
+        query_vectors = []
+        for query in job["queries"]:
+            t0 = time.perf_counter()
+            query_vectors.append(embedder.encode([query])[0])
+            timings.append(time.perf_counter() - t0)
+    return {
+        "backend": job["backend"],
+        "load_s": load_s,
+        "encode": latency_summary(timings),
+        "rss_import_and_load_mb": peak_rss_mb() - rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "faq_vectors": faq_vectors.tolist(),
+        "query_vectors": np.asarray(query_vectors).tolist(),
+    }
+
+
+def _top1(queries: np.ndarray, faqs: np.ndarray) -> np.ndarray:
+    # Same ranking as the L2 FAISS index for normalized vectors
+    d = ((queries[:, None, :] - faqs[None, :, :]) ** 2).sum(axis=2)
+    return d.argmin(axis=1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from actions.utils.embedders import BACKENDS, cosine_rows, default_onnx_dir, export_onnx, verify_export
+    from actions.utils.vector_search import faq_text
+    from src.config import Config
+
+    parser = argparse.ArgumentParser(description="Embedding backend export and parity check")
+    parser.add_argument("--model", default=Config.EMBEDDING_MODEL)
+    parser.add_argument("--onnx-dir", default=None, help="Defaults to EMBEDDING_ONNX_DIR or models/onnx/<model>")
+    parser.add_argument("--export", action="store_true", help="Export (and verify) the ONNX models first")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 export")
+    parser.add_argument("--faqs", default="data/faqs.json")
+    parser.add_argument("--dataset", default="data/test_dataset.csv")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    onnx_dir = args.onnx_dir or Config.EMBEDDING_ONNX_DIR or default_onnx_dir(args.model)
+    with open(args.faqs, "r", encoding="utf-8") as f:
+        faqs = json.load(f)
+    faq_texts = [faq_text(faq) for faq in faqs]
+    dataset = load_labelled_dataset(args.dataset)
+    queries = [text for text, _ in dataset]
+
+    if args.export:
+        print(f"📦 Exporting {args.model} to {onnx_dir}...")
+        export_onnx(args.model, onnx_dir, quantize=not args.no_quantize)
+        for backend, row in verify_export(args.model, onnx_dir, faq_texts + queries, args.min_cosine).items():
+            status = "✅" if row["ok"] else "❌"
+            print(f"{status} {backend}: min cosine {row['min_cosine']:.5f}, max abs diff {row['max_abs_diff']:.5f}")
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" not in backends:
+        backends.insert(0, "torch")
+    results: Dict[str, Dict[str, Any]] = {}
+    ctx = multiprocessing.get_context("spawn")
+    for backend in backends:
+        print(f"⏱️  {backend}...")
+        job = {"model": args.model, "backend": backend, "onnx_dir": onnx_dir, "faq_texts": faq_texts,
+               "queries": queries, "repeats": args.repeats}
+        with ctx.Pool(1) as pool:
+            results[backend] = pool.apply(run_backend, (job,))
+
+    reference = results["torch"]
+    ref_faqs = np.asarray(reference["faq_vectors"], dtype="float32")
+    ref_queries = np.asarray(reference["query_vectors"], dtype="float32")
+    ref_top1 = _top1(ref_queries, ref_faqs)
+    faq_ids = [faq.get("id") for faq in faqs]
+    labels = [faq_id for _, faq_id in dataset]
+
+    failed = False
+    report = {"meta": {"model": args.model, "onnx_dir": onnx_dir, "faqs": len(faqs), "queries": len(queries),
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}, "results": {}}
+    header = f"{'backend':<10} {'load s':>7} {'enc p50':>8} {'enc p95':>8} {'rss MB':>7} {'min cos':>8} {'top1=torch':>10} {'top1 acc':>9}"
+    print(header)
+    print("-" * len(header))
+    for backend, row in results.items():
+        if "error" in row:
+            print(f"{backend:<10} ❌ {row['error']}")
+            failed = True
+            continue
+        faq_vecs = np.asarray(row.pop("faq_vectors"), dtype="float32")
+        query_vecs = np.asarray(row.pop("query_vectors"), dtype="float32")
+        cosines = np.concatenate([cosine_rows(ref_faqs, faq_vecs), cosine_rows(ref_queries, query_vecs)])
+        top1 = _top1(query_vecs, faq_vecs)
+        row["min_cosine"] = float(cosines.min())
+        row["mean_cosine"] = float(cosines.mean())
+        row["top1_agreement"] = float((top1 == ref_top1).mean()) if len(top1) else 1.0
+        row["top1_accuracy"] = float(np.mean([faq_ids[i] == label for i, label in zip(top1, labels)])) if labels else 0.0
+        failed = failed or row["min_cosine"] < args.min_cosine
+        report["results"][backend] = row
+        print(f"{backend:<10} {row['load_s']:>7.2f} {row['encode']['p50_ms']:>7.2f}ms {row['encode']['p95_ms']:>7.2f}ms "
+              f"{row['rss_import_and_load_mb']:>7.0f} {row['min_cosine']:>8.4f} {row['top1_agreement']:>10.3f} {row['top1_accuracy']:>9.3f}")
+
+    if args.output:
+        write_json(args.output, report)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
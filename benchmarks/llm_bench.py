@@ -0,0 +1,311 @@
+"""
+llama.cpp generation benchmark.
+
+Sweeps n_threads, n_batch, n_ctx and max_tokens over the production prompt
+templates (actions/utils/prompts.py) and measures, per combination:
+
+- prompt-eval tokens/sec and generation tokens/sec (separately)
+- time to first token and total latency
+- peak RSS of the process holding the model
+- with --speculative, the draft acceptance rate per decoding mode
+
+Each (n_threads, n_batch, n_ctx) combination runs in a fresh process so peak
+RSS and the page cache state are not polluted by earlier loads.
+
+Usage:
+    python -m benchmarks.llm_bench --model models/llama-1b-indo.gguf \
+        --threads 2,4,8 --batches 128,256,512 --ctx 1024,2048 \
+        --max-tokens 60,180 --templates faq,high_conf,multi_question --output llm_bench.json
+    python -m benchmarks.llm_bench --speculative off,lookup --temperature 0 --check-outputs
+
+Apply the winner with LLAMA_N_THREADS / LLAMA_N_BATCH / LLAMA_CONTEXT_SIZE /
+LLAMA_SPECULATIVE. --check-outputs fails if a speculative mode changes any
+greedy output compared with "off".
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import latency_summary, write_json
+
+# Formerly IndonesianHospitalBot.test_hospital_queries
+HOSPITAL_QUERIES = [
+    "Jam buka rumah sakit?",
+    "Apakah RS menerima BPJS?",
+    "Bagaimana cara mendaftar online?",
+    "Berapa biaya konsultasi dokter umum?",
+    "Apakah ada dokter spesialis jantung?",
+    "Bagaimana prosedur rawat inap?",
+    "Apakah ada layanan gawat darurat 24 jam?",
+    "Bagaimana cara membuat janji dengan dokter?",
+]
+
+STOP = ["</s>", "\n\n", "[INST]", "User:", "FAQ:", "Context:"]
+
+
+def load_templates(extra_template_path: Optional[str] = "models/indonesian-prompt-template.txt") -> Dict[str, str]:
+    from actions.utils.prompts import PROMPT_TEMPLATES
+
+    templates = dict(PROMPT_TEMPLATES)
+    if extra_template_path and os.path.exists(extra_template_path):
+        with open(extra_template_path, "r", encoding="utf-8") as f:
+            templates["indonesian_bot"] = f.read()
+    return templates
+
+
+def match_faqs(query: str, faqs: List[Dict[str, Any]], top_k: int = 2) -> List[Dict[str, Any]]:
+    """Cheap keyword match so FAQ-grounded templates get realistic context"""
+    words = query.lower()
+    scored = sorted(faqs, key=lambda faq: -sum(1 for kw in faq.get("keywords", []) if kw.lower() in words))
+    return scored[:top_k] or [{"question": "", "answer": ""}]
+
+
+def build_prompt(template: str, query: str, faqs: List[Dict[str, Any]]) -> str:
+    from actions.utils.prompts import DEFAULT_HOSPITAL_NAME
+
+    faq = faqs[0]
+    faq_str = "\n".join(f"Q: {f.get('question')}\nA: {f.get('answer')}" for f in faqs)
+    # The standalone bot template only has {question}, meaning the user's question
+    question = faq.get("question") if "{user_message}" in template else query
+    return template.format(
+        hospital_name=DEFAULT_HOSPITAL_NAME,
+        user_message=query,
+        question=question,
+        answer=faq.get("answer", ""),
+        faq_str=faq_str,
+        context="\n".join(f"- {f.get('answer')}" for f in faqs),
+    )
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_generation(llm, prompt: str, max_tokens: int, temperature: float = 0.0) -> Dict[str, float]:
+    """Stream one completion from a cold KV cache and time its phases"""
+    from actions.utils.metrics import _perf_snapshot
+    from actions.utils.speculative import settle_draft
+
+    llm.reset()
+    n_prompt = len(llm.tokenize(prompt.encode("utf-8")))
+    before = _perf_snapshot(llm)
+    start = time.perf_counter()
+    first = None
+    n_chunks = 0
+    text = []
+    for chunk in llm(prompt, max_tokens=max_tokens, temperature=temperature, top_p=0.9, top_k=40,
+                     repeat_penalty=1.1, stop=STOP, stream=True):
+        if first is None:
+            first = time.perf_counter()
+        n_chunks += 1
+        text.append(chunk["choices"][0]["text"])
+    end = time.perf_counter()
+    after = _perf_snapshot(llm)
+    settle_draft(llm)
+
+    ttft = (first or end) - start
+    if before and after and after[1] > before[1] and llm.draft_model is None:
+        p_eval_s, eval_s = after[0] - before[0], after[1] - before[1]
+        n_p_eval, n_eval = after[2] - before[2], after[3] - before[3]
+        prompt_tps = n_p_eval / p_eval_s if p_eval_s > 0 else 0.0
+        gen_tps = n_eval / eval_s if eval_s > 0 else 0.0
+        n_generated = n_eval
+    else:
+        # Fall back to wall-clock: the first token's latency is dominated by prompt eval
+        prompt_tps = n_prompt / ttft if ttft > 0 else 0.0
+        gen_tps = (n_chunks - 1) / (end - first) if first and n_chunks > 1 and end > first else 0.0
+        n_generated = n_chunks
+    return {
+        "prompt_tokens": n_prompt,
+        "generated_tokens": n_generated,
+        "ttft_s": ttft,
+        "total_s": end - start,
+        "prompt_tps": prompt_tps,
+        "gen_tps": gen_tps,
+        "text": "".join(text).strip(),
+    }
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def run_config(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Load the model with one (threads, batch, ctx) setting and run every workload on it"""
+    # The sweep owns these settings; don't let process-wide overrides leak in
+    for name in ("LLAMA_CONTEXT_SIZE", "LLAMA_N_THREADS", "LLAMA_N_BATCH"):
+        os.environ.pop(name, None)
+    os.environ["LLAMA_SPECULATIVE"] = job["speculative"]
+    from actions.utils.llm_loader import load_llama
+    from actions.utils.speculative import ACCEPTED, DRAFTED
+
+    load_start = time.perf_counter()
+    llm = load_llama(job["model"], n_ctx=job["n_ctx"], n_threads=job["n_threads"], n_batch=job["n_batch"])
+    load_s = time.perf_counter() - load_start
+    rss_after_load = peak_rss_mb()
+
+    rows = []
+    for template_name, max_tokens in itertools.product(job["templates"], job["max_tokens"]):
+        template = job["template_text"][template_name]
+        runs = []
+        mode = getattr(llm.draft_model, "mode", "off")
+        drafted_before, accepted_before = DRAFTED.get(mode=mode), ACCEPTED.get(mode=mode)
+        for query in job["queries"] * job["repeats"]:
+            prompt = build_prompt(template, query, match_faqs(query, job["faqs"]))
+            if len(llm.tokenize(prompt.encode("utf-8"))) + max_tokens > job["n_ctx"]:
+                continue
+            runs.append(measure_generation(llm, prompt, max_tokens, job["temperature"]))
+        if not runs:
+            continue
+        drafted = DRAFTED.get(mode=mode) - drafted_before
+        rows.append({
+            "speculative": job["speculative"],
+            "draft_acceptance": (ACCEPTED.get(mode=mode) - accepted_before) / drafted if drafted else None,
+            "outputs": [r["text"] for r in runs],
+            "n_threads": job["n_threads"],
+            "n_batch": job["n_batch"],
+            "n_ctx": job["n_ctx"],
+            "template": template_name,
+            "max_tokens": max_tokens,
+            "runs": len(runs),
+            "load_s": load_s,
+            "prompt_tokens_mean": _mean([r["prompt_tokens"] for r in runs]),
+            "generated_tokens_mean": _mean([r["generated_tokens"] for r in runs]),
+            "prompt_tps": _mean([r["prompt_tps"] for r in runs]),
+            "gen_tps": _mean([r["gen_tps"] for r in runs]),
+            "ttft": latency_summary(r["ttft_s"] for r in runs),
+            "total": latency_summary(r["total_s"] for r in runs),
+            "rss_after_load_mb": rss_after_load,
+            "peak_rss_mb": peak_rss_mb(),
+            "sample_output": runs[0]["text"][:200],
+        })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    header = (f"{'spec':<7} {'thr':>4} {'batch':>6} {'ctx':>6} {'template':<15} {'max':>5} {'p_tok':>6} {'g_tok':>6} "
+              f"{'pp tok/s':>9} {'tg tok/s':>9} {'ttft p50':>9} {'tot p50':>9} {'tot p95':>9} {'rss MB':>8} {'accept':>7}")
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        accept = "-" if r["draft_acceptance"] is None else f"{r['draft_acceptance']:.0%}"
+        print(f"{r['speculative']:<7} {r['n_threads']:>4} {r['n_batch']:>6} {r['n_ctx']:>6} {r['template']:<15} {r['max_tokens']:>5} "
+              f"{r['prompt_tokens_mean']:>6.0f} {r['generated_tokens_mean']:>6.1f} {r['prompt_tps']:>9.1f} "
+              f"{r['gen_tps']:>9.1f} {r['ttft']['p50_ms']:>8.0f}ms {r['total']['p50_ms']:>7.0f}ms "
+              f"{r['total']['p95_ms']:>7.0f}ms {r['peak_rss_mb']:>8.0f} {accept:>7}")
+
+
+def check_outputs(rows: List[Dict[str, Any]]) -> List[str]:
+    """Speculative rows whose outputs differ from the matching non-speculative row"""
+    key = lambda r: (r["n_threads"], r["n_batch"], r["n_ctx"], r["template"], r["max_tokens"])
+    reference = {key(r): r["outputs"] for r in rows if r["speculative"] == "off"}
+    mismatches = []
+    for r in rows:
+        expected = reference.get(key(r))
+        if r["speculative"] != "off" and expected is not None and r["outputs"] != expected:
+            changed = sum(1 for a, b in zip(r["outputs"], expected) if a != b)
+            mismatches.append(f"{r['speculative']} changed {changed}/{len(expected)} outputs for {key(r)}")
+    return mismatches
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="llama.cpp generation benchmark")
+    parser.add_argument("--model", default="models/llama-1b-indo.gguf")
+    parser.add_argument("--faqs", default="data/faqs.json")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 4))
+    parser.add_argument("--batches", default="256,512")
+    parser.add_argument("--ctx", default="1024")
+    parser.add_argument("--max-tokens", default="60,180")
+    parser.add_argument("--templates", default="faq,high_conf,medium_conf,multi_question",
+                        help="Comma-separated template names, or 'all'")
+    parser.add_argument("--queries", default=None, help="Text file with one question per line")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--speculative", default="off", help="Comma-separated LLAMA_SPECULATIVE modes, e.g. off,lookup,draft")
+    parser.add_argument("--check-outputs", action="store_true",
+                        help="Fail if a speculative mode's outputs differ from 'off' (use with --temperature 0)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        print(f"❌ Model not found: {args.model}")
+        return 1
+
+    templates = load_templates()
+    names = list(templates) if args.templates == "all" else [t.strip() for t in args.templates.split(",") if t.strip()]
+    unknown = [n for n in names if n not in templates]
+    if unknown:
+        print(f"❌ Unknown templates: {unknown}. Available: {sorted(templates)}")
+        return 1
+
+    queries = HOSPITAL_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    with open(args.faqs, "r", encoding="utf-8") as f:
+        faqs = json.load(f)
+
+    jobs = []
+    modes = [m.strip() for m in args.speculative.split(",") if m.strip()]
+    for speculative, n_threads, n_batch, n_ctx in itertools.product(modes, _int_list(args.threads), _int_list(args.batches), _int_list(args.ctx)):
+        if n_batch > n_ctx:
+            continue
+        jobs.append({
+            "speculative": speculative,
+            "model": args.model,
+            "n_threads": n_threads,
+            "n_batch": n_batch,
+            "n_ctx": n_ctx,
+            "max_tokens": _int_list(args.max_tokens),
+            "templates": names,
+            "template_text": {n: templates[n] for n in names},
+            "queries": queries,
+            "faqs": faqs,
+            "repeats": args.repeats,
+            "temperature": args.temperature,
+        })
+
+    rows: List[Dict[str, Any]] = []
+    ctx = multiprocessing.get_context("spawn")
+    for job in jobs:
+        print(f"⏱️  speculative={job['speculative']} n_threads={job['n_threads']} n_batch={job['n_batch']} n_ctx={job['n_ctx']}...")
+        with ctx.Pool(1) as pool:
+            rows.extend(pool.apply(run_config, (job,)))
+
+    print_table(rows)
+    mismatches = check_outputs(rows) if args.check_outputs else []
+    for line in mismatches:
+        print(f"❌ {line}")
+    if args.output:
+        write_json(args.output, {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "model": args.model,
+                "model_size_mb": os.path.getsize(args.model) / (1024 * 1024),
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+                "queries": len(queries),
+                "repeats": args.repeats,
+            },
+            "results": rows,
+        })
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
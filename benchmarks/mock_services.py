@@ -0,0 +1,111 @@
+"""
+Local stand-ins for the external services on the webhook path.
+
+- POST /v1/messages   mimics the 360Dialog messages API
+- POST /model/parse   mimics the Rasa NLU parse endpoint
+
+Both add a configurable artificial latency so load tests can model the real
+network round trips without touching production services.
+
+Usage:
+    python -m benchmarks.mock_services --port 9000 --nlu-latency-ms 20 --send-latency-ms 80
+
+Then start the bot against them:
+    RASA_NLU_URL=http://localhost:9000/model/parse \
+    DIALOG360_API_URL=http://localhost:9000/v1/messages python main.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+GREET_WORDS = {"halo", "hai", "hi", "hello", "pagi", "siang", "sore", "malam", "assalamualaikum"}
+GOODBYE_WORDS = {"bye", "dadah", "sampai", "jumpa", "makasih", "terima"}
+
+
+class MockState:
+    def __init__(self):
+        self.nlu_latency = 0.0
+        self.send_latency = 0.0
+        self.send_error_rate = 0.0
+        self.faqs: List[Dict[str, Any]] = []
+        self.sent = 0
+        self.parsed = 0
+
+
+state = MockState()
+app = FastAPI()
+
+
+def classify(text: str) -> Dict[str, Any]:
+    """Keyword-overlap intent classifier, good enough to exercise every branch"""
+    words = set(text.lower().replace("?", " ").split())
+    best_id, best_score = None, 0
+    for faq in state.faqs:
+        score = sum(1 for kw in faq.get("keywords", []) if kw.lower() in words)
+        if score > best_score:
+            best_id, best_score = faq["id"], score
+    if best_id:
+        return {"name": best_id, "confidence": min(0.99, 0.5 + 0.15 * best_score)}
+    if words & GREET_WORDS:
+        return {"name": "greet", "confidence": 0.9}
+    if words & GOODBYE_WORDS:
+        return {"name": "goodbye", "confidence": 0.9}
+    return {"name": "faq_general", "confidence": 0.3}
+
+
+@app.post("/model/parse")
+async def parse(request: Request):
+    data = await request.json()
+    if state.nlu_latency:
+        await asyncio.sleep(state.nlu_latency)
+    state.parsed += 1
+    text = data.get("text", "")
+    intent = classify(text)
+    return {"text": text, "intent": intent, "intent_ranking": [intent], "entities": []}
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    data = await request.json()
+    if state.send_latency:
+        await asyncio.sleep(state.send_latency)
+    if state.send_error_rate and random.random() < state.send_error_rate:
+        return JSONResponse({"errors": [{"code": 500, "title": "mock failure"}]}, status_code=500)
+    state.sent += 1
+    return {"messages": [{"id": f"wamid.{uuid.uuid4().hex}"}], "contacts": [{"input": data.get("to"), "wa_id": data.get("to")}]}
+
+
+@app.get("/stats")
+def stats():
+    return {"parsed": state.parsed, "sent": state.sent}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock 360Dialog + Rasa NLU services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--faqs", default="data/faqs.json")
+    parser.add_argument("--nlu-latency-ms", type=float, default=0.0)
+    parser.add_argument("--send-latency-ms", type=float, default=0.0)
+    parser.add_argument("--send-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with open(args.faqs, "r", encoding="utf-8") as f:
+        state.faqs = json.load(f)
+    state.nlu_latency = args.nlu_latency_ms / 1000.0
+    state.send_latency = args.send_latency_ms / 1000.0
+    state.send_error_rate = args.send_error_rate
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Replay captured traffic (CAPTURE_DIR JSONL files) against a running bot.
+
+Messages are sent in capture order at their original offsets, divided by
+`--speed` (2 = twice as fast, 0 = back to back), each to the endpoint it
+arrived on. Hashed senders are mapped to stable fake wa_ids, so per-sender
+behaviour (debounce, rate limits, sessions, fair scheduling) is reproduced.
+The report compares client latency with the latency recorded at capture time
+and includes per-stage deltas from /metrics.
+
+Usage:
+    python -m benchmarks.replay captures/ --target http://localhost:8000 \
+        --speed 4 --output replay_output.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from benchmarks.common import latency_summary, write_json
+from benchmarks.webhook_load import build_payload, scrape_metrics, stage_deltas
+
+
+def load_captures(paths: List[str]) -> List[Dict]:
+    """Records from capture files and/or directories, ordered by arrival"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path])
+    records = []
+    for name in files:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("text") and record.get("endpoint") in ("/chat", "/webhook"):
+                    records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def fake_wa_id(user_hash: str) -> str:
+    return "62" + str(int(user_hash, 16) % 10**10).zfill(10)
+
+
+class Replayer:
+    def __init__(self, target: str, records: List[Dict], speed: float, timeout: float = 60.0):
+        self.target = target.rstrip("/")
+        self.records = records
+        self.speed = speed
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.lag: List[float] = []
+        self.errors: Counter = Counter()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def send(self, record: Dict):
+        wa_id = fake_wa_id(record["user"])
+        if record["endpoint"] == "/chat":
+            payload = {"user_id": wa_id, "message": record["text"]}
+        else:
+            payload = build_payload(wa_id, [record["text"]])
+        start = time.perf_counter()
+        error = None
+        try:
+            resp = self._session().post(f"{self.target}{record['endpoint']}", json=payload, timeout=self.timeout)
+            if resp.status_code != 200:
+                error = f"http_{resp.status_code}"
+            elif resp.json().get("status") == "error":
+                error = "app_error"
+        except requests.Timeout:
+            error = "timeout"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        except ValueError:
+            error = "bad_response"
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[record["endpoint"]].append(elapsed)
+            if error:
+                self.errors[error] += 1
+
+    def run(self, max_concurrency: int) -> float:
+        """Send every record at its scheduled offset; returns wall seconds"""
+        t0 = self.records[0]["ts"]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            for record in self.records:
+                due = (record["ts"] - t0) / self.speed if self.speed > 0 else 0.0
+                delay = due - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.lag.append(-delay)
+                pool.submit(self.send, record)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /chat and /webhook traffic")
+    parser.add_argument("captures", nargs="+", help="Capture files or directories")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pace multiplier (1 = original, 0 = no pauses)")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N messages")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="Requests in flight at most")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    records = load_captures(args.captures)[:args.limit]
+    if not records:
+        raise SystemExit("No captured messages found")
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"Replaying {len(records)} messages captured over {span:.0f}s at {args.speed:g}x")
+
+    replayer = Replayer(args.target, records, args.speed, args.timeout)
+    before = scrape_metrics(replayer.target)
+    wall = replayer.run(args.max_concurrency)
+    after = scrape_metrics(replayer.target)
+
+    captured = defaultdict(list)
+    for record in records:
+        captured[record["endpoint"]].append(record.get("latency_ms", 0.0) / 1000.0)
+    sent = sum(len(v) for v in replayer.latencies.values())
+    report = {
+        "target": replayer.target,
+        "speed": args.speed,
+        "messages": sent,
+        "captured_span_seconds": span,
+        "wall_seconds": wall,
+        "rps": sent / wall if wall else 0.0,
+        "latency": {endpoint: latency_summary(values) for endpoint, values in replayer.latencies.items()},
+        "captured_latency": {endpoint: latency_summary(values) for endpoint, values in captured.items()},
+        "schedule_lag": latency_summary(replayer.lag),
+        "intents": dict(Counter(r.get("intent") or "none" for r in records)),
+        "errors": dict(replayer.errors),
+        "error_rate": (sum(replayer.errors.values()) / sent) if sent else 0.0,
+        "stages": stage_deltas(before, after) if before is not None and after is not None else {},
+    }
+
+    print(f"Messages: {sent}  RPS: {report['rps']:.1f}  errors: {report['error_rate']:.2%} {report['errors']}")
+    for endpoint, lat in report["latency"].items():
+        was = report["captured_latency"].get(endpoint, {})
+        print(f"{endpoint:<9} p50 {lat['p50_ms']:.1f} ms  p95 {lat['p95_ms']:.1f} ms  "
+              f"(captured p50 {was.get('p50_ms', 0.0):.1f} ms  p95 {was.get('p95_ms', 0.0):.1f} ms)")
+    if replayer.lag:
+        print(f"Sent late: {len(replayer.lag)} messages, p95 {report['schedule_lag']['p95_ms']:.1f} ms behind schedule")
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == "__main__":
+    main()
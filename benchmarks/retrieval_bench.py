@@ -0,0 +1,234 @@
+"""
+Retrieval micro-benchmark and accuracy/latency regression suite for VectorSearchManager.
+
+For each corpus size the real FAQs from data/faqs.json are padded with synthetic
+distractor FAQs, indexed, and the labelled questions from data/test_dataset.csv
+are run through the retrieval stages. The report covers:
+
+- encode time (one query per call, as in production)
+- raw FAISS search time
+- hybrid_search and keyword_fallback end-to-end time
+- top-1 / top-3 accuracy against the FAQ ids
+
+Usage:
+    python -m benchmarks.retrieval_bench --sizes 10,100,1000,10000,100000 --output retrieval.json
+    python -m benchmarks.retrieval_bench --baseline benchmarks/baselines/retrieval.json
+    python -m benchmarks.retrieval_bench --baseline benchmarks/baselines/retrieval.json --update-baseline
+
+Synthetic distractors get random unit embeddings unless --encode-corpus is given,
+which keeps large corpora cheap to build while still exercising FAISS at scale.
+The process exits with status 1 when --baseline finds a regression.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.common import latency_summary, load_labelled_dataset, write_json
+
+FILLER_WORDS = [
+    "layanan", "pasien", "dokter", "poli", "kamar", "obat", "apotek", "ruang", "informasi", "jadwal",
+    "rujukan", "kontrol", "laboratorium", "radiologi", "farmasi", "parkir", "kantin", "gedung", "lantai", "antrian",
+]
+
+# Relative latency growth and absolute accuracy drop tolerated before flagging a regression
+DEFAULT_LATENCY_TOLERANCE = 0.20
+DEFAULT_ACCURACY_TOLERANCE = 0.02
+
+
+def synthetic_faqs(base: List[Dict[str, Any]], size: int, seed: int = 13) -> List[Dict[str, Any]]:
+    """Real FAQs first, then synthetic distractors up to `size` entries"""
+    rng = random.Random(seed)
+    vocab = sorted({kw for faq in base for kw in faq.get("keywords", [])}) + FILLER_WORDS
+    corpus = list(base[:size])
+    for i in range(size - len(corpus)):
+        words = rng.sample(vocab, 4)
+        corpus.append({
+            "id": f"syn_{i}",
+            "category": "synthetic",
+            "priority": "low",
+            "question": f"Bagaimana {words[0]} {words[1]} di RS?",
+            "answer": f"Informasi {words[0]} {words[1]} {words[2]} tersedia di bagian {words[3]}.",
+            "keywords": words,
+            "related_faqs": [],
+        })
+    return corpus
+
+
+def _random_unit_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build_corpus_files(workdir: str, corpus: List[Dict[str, Any]], embedder, encode_corpus: bool, n_real: int) -> Tuple[str, str, str]:
+    """Write faqs.json, the FAISS index and the embeddings where VectorSearchManager expects them"""
+    import faiss
+
+    faq_path = os.path.join(workdir, "faqs.json")
+    index_path = os.path.join(workdir, "faq_faiss.index")
+    emb_path = os.path.join(workdir, "faq_embeddings.npy")
+    with open(faq_path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False)
+
+    texts = [f"{faq.get('question', '')} {' '.join(faq.get('keywords', []))}" for faq in corpus]
+    n_encode = len(texts) if encode_corpus else n_real
+    real = np.array(embedder.encode(texts[:n_encode], convert_to_tensor=False, batch_size=64)).astype("float32")
+    if n_encode < len(texts):
+        real = np.vstack([real, _random_unit_vectors(len(texts) - n_encode, real.shape[1], seed=len(texts))])
+    index = faiss.IndexFlatL2(real.shape[1])
+    index.add(real)
+    faiss.write_index(index, index_path)
+    np.save(emb_path, real)
+    return faq_path, index_path, emb_path
+
+
+def _time_calls(fn, items) -> Tuple[List[float], List[Any]]:
+    timings, outputs = [], []
+    for item in items:
+        start = time.perf_counter()
+        outputs.append(fn(item))
+        timings.append(time.perf_counter() - start)
+    return timings, outputs
+
+
+def bench_size(size: int, base: List[Dict[str, Any]], dataset: List[Tuple[str, str]], embedder, encode_corpus: bool, repeats: int) -> Dict[str, Any]:
+    from actions.utils.vector_search import VectorSearchManager
+
+    corpus = synthetic_faqs(base, size)
+    with tempfile.TemporaryDirectory(prefix="retrieval_bench_") as workdir:
+        build_start = time.perf_counter()
+        paths = build_corpus_files(workdir, corpus, embedder, encode_corpus, min(len(base), size))
+        build_seconds = time.perf_counter() - build_start
+
+        manager = VectorSearchManager(*paths)
+        queries = [text for text, _ in dataset] * repeats
+
+        encode_t, vectors = _time_calls(
+            lambda q: np.array(manager.embedding_model.encode([q], convert_to_tensor=False)).astype("float32"), queries)
+        search_t, _ = _time_calls(lambda v: manager.faiss_index.search(v, 3), vectors)
+        hybrid_t, _ = _time_calls(lambda q: manager.hybrid_search(q, top_k=3), queries)
+        keyword_t, _ = _time_calls(lambda q: manager.keyword_fallback(q, top_k=3), queries)
+
+        top1 = top3 = 0
+        for text, faq_id in dataset:
+            ids = [faq.get("id") for faq in manager.hybrid_search(text, top_k=3)]
+            top1 += int(bool(ids) and ids[0] == faq_id)
+            top3 += int(faq_id in ids)
+
+    n = len(dataset) or 1
+    return {
+        "corpus_size": size,
+        "index_build_seconds": build_seconds,
+        "encode": latency_summary(encode_t),
+        "faiss_search": latency_summary(search_t),
+        "hybrid_search": latency_summary(hybrid_t),
+        "keyword_fallback": latency_summary(keyword_t),
+        "accuracy": {"top1": top1 / n, "top3": top3 / n, "questions": len(dataset)},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], latency_tol: float, accuracy_tol: float) -> List[str]:
+    """Return human-readable regressions of `current` against `baseline`"""
+    regressions = []
+    for size, base_row in baseline.get("results", {}).items():
+        row = current.get("results", {}).get(size)
+        if row is None:
+            continue
+        for stage in ("encode", "faiss_search", "hybrid_search", "keyword_fallback"):
+            for stat in ("p50_ms", "p95_ms"):
+                old, new = base_row[stage][stat], row[stage][stat]
+                # Ignore sub-50µs jitter on very small corpora
+                if old > 0 and new > old * (1 + latency_tol) and new - old > 0.05:
+                    regressions.append(f"[{size}] {stage} {stat}: {old:.3f} -> {new:.3f} ms (+{(new / old - 1):.0%})")
+        for stat in ("top1", "top3"):
+            old, new = base_row["accuracy"][stat], row["accuracy"][stat]
+            if new < old - accuracy_tol:
+                regressions.append(f"[{size}] accuracy {stat}: {old:.3f} -> {new:.3f}")
+    return regressions
+
+
+def print_table(report: Dict[str, Any]):
+    header = f"{'size':>8} {'encode p50':>11} {'faiss p50':>10} {'hybrid p50':>11} {'hybrid p95':>11} {'keyword p50':>12} {'top1':>6} {'top3':>6}"
+    print(header)
+    print("-" * len(header))
+    for size, row in sorted(report["results"].items(), key=lambda item: int(item[0])):
+        print(f"{size:>8} {row['encode']['p50_ms']:>11.2f} {row['faiss_search']['p50_ms']:>10.3f} "
+              f"{row['hybrid_search']['p50_ms']:>11.2f} {row['hybrid_search']['p95_ms']:>11.2f} "
+              f"{row['keyword_fallback']['p50_ms']:>12.3f} {row['accuracy']['top1']:>6.3f} {row['accuracy']['top3']:>6.3f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="VectorSearchManager speed/accuracy benchmark")
+    parser.add_argument("--faqs", default="data/faqs.json")
+    parser.add_argument("--dataset", default="data/test_dataset.csv")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    parser.add_argument("--repeats", type=int, default=1, help="Times to run each query for timing")
+    parser.add_argument("--encode-corpus", action="store_true", help="Embed synthetic FAQs with the model instead of random vectors")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="Compare against this stored report")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite --baseline with this run")
+    parser.add_argument("--latency-tolerance", type=float, default=DEFAULT_LATENCY_TOLERANCE)
+    parser.add_argument("--accuracy-tolerance", type=float, default=DEFAULT_ACCURACY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    from actions.utils.vector_search import VectorSearchManager
+
+    with open(args.faqs, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    dataset = load_labelled_dataset(args.dataset)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    # Borrow the embedding model from a throwaway manager over the real FAQs
+    with tempfile.TemporaryDirectory(prefix="retrieval_probe_") as workdir:
+        embedder = VectorSearchManager(args.faqs, os.path.join(workdir, "i"), os.path.join(workdir, "e.npy")).embedding_model
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "encode_corpus": args.encode_corpus,
+            "questions": len(dataset),
+        },
+        "results": {},
+    }
+    for size in sizes:
+        print(f"⏱️  Benchmarking corpus size {size}...")
+        report["results"][str(size)] = bench_size(size, base, dataset, embedder, args.encode_corpus, args.repeats)
+
+    print_table(report)
+    if args.output:
+        write_json(args.output, report)
+
+    if args.baseline:
+        if args.update_baseline or not os.path.exists(args.baseline):
+            os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+            write_json(args.baseline, report)
+            print(f"📌 Baseline written to {args.baseline}")
+            return 0
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.latency_tolerance, args.accuracy_tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+End-to-end load generator for the /webhook path.
+
+Replays questions from data/test_dataset.csv as 360Dialog WhatsApp deliveries
+(the nested entry/changes/value format `webhook` parses) at a fixed
+concurrency, then reports throughput, client-side latency percentiles and
+errors, plus per-stage latency/error deltas scraped from the bot's /metrics.
+
+Usage (with benchmarks.mock_services running and the bot pointed at it):
+    python -m benchmarks.webhook_load --target http://localhost:8000 \
+        --concurrency 8 --requests 400 --output bench_output.json
+"""
+
+import argparse
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.common import latency_summary, load_labelled_dataset, write_json
+
+_SAMPLE_RE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})?\s+(?P<value>\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def build_payload(wa_id: str, texts: List[str], phone_number_id: str = "bench-phone") -> Dict[str, Any]:
+    """One WhatsApp delivery carrying `texts` from `wa_id`"""
+    now = str(int(time.time()))
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench-waba",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "620000000000", "phone_number_id": phone_number_id},
+                    "contacts": [{"profile": {"name": f"Bench {wa_id[-4:]}"}, "wa_id": wa_id}],
+                    "messages": [
+                        {
+                            "from": wa_id,
+                            "id": f"wamid.{uuid.uuid4().hex}",
+                            "timestamp": now,
+                            "type": "text",
+                            "text": {"body": text},
+                        }
+                        for text in texts
+                    ],
+                },
+            }],
+        }],
+    }
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line.strip())
+        if not match:
+            continue
+        labels = tuple(sorted(_LABEL_RE.findall(match.group("labels") or "")))
+        try:
+            samples[(match.group("name"), labels)] = float(match.group("value"))
+        except ValueError:
+            continue
+    return samples
+
+
+def scrape_metrics(target: str) -> Optional[Dict]:
+    try:
+        resp = requests.get(f"{target}/metrics", timeout=5)
+        if resp.status_code == 200:
+            return parse_metrics(resp.text)
+    except requests.RequestException:
+        pass
+    return None
+
+
+def _bucket_quantile(buckets: List[Tuple[float, float]], q: float) -> float:
+    """Prometheus-style histogram_quantile over cumulative (upper_bound, count) pairs"""
+    if not buckets or buckets[-1][1] <= 0:
+        return 0.0
+    rank = q * buckets[-1][1]
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def stage_deltas(before: Dict, after: Dict) -> Dict[str, Dict[str, float]]:
+    """Per-stage count/mean/p50/p95/p99 and error counts between two scrapes"""
+    buckets: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+    sums: Dict[str, float] = {}
+    counts: Dict[str, float] = {}
+    errors: Dict[str, float] = {}
+    for (name, labels), value in after.items():
+        delta = value - before.get((name, labels), 0.0)
+        label_map = dict(labels)
+        stage = label_map.get("stage")
+        if stage is None:
+            continue
+        if name == "chatbot_stage_latency_seconds_bucket":
+            le = label_map.get("le", "+Inf")
+            buckets[stage].append((float("inf") if le == "+Inf" else float(le), delta))
+        elif name == "chatbot_stage_latency_seconds_sum":
+            sums[stage] = delta
+        elif name == "chatbot_stage_latency_seconds_count":
+            counts[stage] = delta
+        elif name == "chatbot_stage_errors_total":
+            errors[stage] = delta
+
+    report = {}
+    for stage, count in counts.items():
+        if count <= 0 and not errors.get(stage):
+            continue
+        ordered = sorted(buckets[stage])
+        report[stage] = {
+            "count": count,
+            "mean_ms": (sums.get(stage, 0.0) / count * 1000.0) if count else 0.0,
+            "p50_ms": _bucket_quantile(ordered, 0.50) * 1000.0,
+            "p95_ms": _bucket_quantile(ordered, 0.95) * 1000.0,
+            "p99_ms": _bucket_quantile(ordered, 0.99) * 1000.0,
+            "errors": errors.get(stage, 0.0),
+        }
+    return report
+
+
+class LoadGenerator:
+    def __init__(self, target: str, texts: List[str], users: int, batch_size: int = 1, timeout: float = 60.0, seed: int = 42):
+        self.target = target.rstrip("/")
+        self.texts = texts
+        self.wa_ids = [f"62812{i:07d}" for i in range(users)]
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.errors: Counter = Counter()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _next_payload(self) -> Dict[str, Any]:
+        with self._lock:
+            wa_id = self.rng.choice(self.wa_ids)
+            texts = [self.rng.choice(self.texts) for _ in range(self.batch_size)]
+        return build_payload(wa_id, texts)
+
+    def fire(self, _=None):
+        payload = self._next_payload()
+        start = time.perf_counter()
+        error = None
+        try:
+            resp = self._session().post(f"{self.target}/webhook", json=payload, timeout=self.timeout)
+            if resp.status_code != 200:
+                error = f"http_{resp.status_code}"
+            elif resp.json().get("status") == "error":
+                error = "app_error"
+        except requests.Timeout:
+            error = "timeout"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        except ValueError:
+            error = "bad_response"
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(elapsed)
+            if error:
+                self.errors[error] += 1
+
+    def run(self, concurrency: int, total: Optional[int], duration: Optional[float]) -> float:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            if total is not None:
+                list(pool.map(self.fire, range(total)))
+            else:
+                deadline = start + duration
+
+                def loop(_):
+                    while time.perf_counter() < deadline:
+                        self.fire()
+
+                list(pool.map(loop, range(concurrency)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the /webhook path")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--dataset", default="data/test_dataset.csv")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=None, help="Total deliveries to send")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run when --requests is not set")
+    parser.add_argument("--users", type=int, default=50, help="Distinct wa_ids to spread traffic over")
+    parser.add_argument("--batch-size", type=int, default=1, help="Messages per webhook delivery")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--warmup", type=int, default=0, help="Deliveries to send before measuring")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    texts = [text for text, _ in load_labelled_dataset(args.dataset)]
+    if not texts:
+        raise SystemExit(f"No questions found in {args.dataset}")
+
+    generator = LoadGenerator(args.target, texts, args.users, args.batch_size, args.timeout)
+    if args.warmup:
+        generator.run(args.concurrency, args.warmup, None)
+        generator.latencies.clear()
+        generator.errors.clear()
+
+    before = scrape_metrics(generator.target)
+    wall = generator.run(args.concurrency, args.requests, None if args.requests else args.duration)
+    after = scrape_metrics(generator.target)
+
+    sent = len(generator.latencies)
+    report = {
+        "target": generator.target,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "requests": sent,
+        "wall_seconds": wall,
+        "rps": sent / wall if wall else 0.0,
+        "latency": latency_summary(generator.latencies),
+        "errors": dict(generator.errors),
+        "error_rate": (sum(generator.errors.values()) / sent) if sent else 0.0,
+        "stages": stage_deltas(before, after) if before is not None and after is not None else {},
+    }
+
+    lat = report["latency"]
+    print(f"Requests: {sent}  RPS: {report['rps']:.1f}  errors: {report['error_rate']:.2%} {report['errors']}")
+    print(f"Latency  p50 {lat['p50_ms']:.1f} ms  p95 {lat['p95_ms']:.1f} ms  p99 {lat['p99_ms']:.1f} ms")
+    if report["stages"]:
+        print(f"\n{'stage':<36}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'err':>6}")
+        for stage, row in sorted(report["stages"].items(), key=lambda item: -item[1]["mean_ms"]):
+            print(f"{stage:<36}{row['count']:>8.0f}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+                  f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['errors']:>6.0f}")
+    else:
+        print("(per-stage metrics unavailable: /metrics not reachable)")
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -59,32 +59,33 @@ class IndonesianHospitalBot:
             "tokens_used": response["usage"]["total_tokens"]
         }
     
-    def test_hospital_queries(self):
-        """Test with hospital-specific queries"""
+    def test_hospital_queries(self, max_tokens=150):
+        """Benchmark the hospital queries: prompt-eval vs generation speed, TTFT and RSS.
+
+        For sweeps over n_threads/n_batch/n_ctx and the production prompt
+        templates use `python -m benchmarks.llm_bench`.
+        """
+        from benchmarks.llm_bench import HOSPITAL_QUERIES, build_prompt, match_faqs, measure_generation, peak_rss_mb
         
-        test_queries = [
-            "Jam buka rumah sakit?",
-            "Apakah RS menerima BPJS?",
-            "Bagaimana cara mendaftar online?",
-            "Berapa biaya konsultasi dokter umum?",
-            "Apakah ada dokter spesialis jantung?",
-            "Bagaimana prosedur rawat inap?",
-            "Apakah ada layanan gawat darurat 24 jam?",
-            "Bagaimana cara membuat janji dengan dokter?"
-        ]
+        with open("data/faqs.json", "r", encoding="utf-8") as f:
+            faqs = json.load(f)
         
-        print("\n🧪 Testing Indonesian hospital chatbot...")
+        print("\n🧪 Benchmarking Indonesian hospital chatbot...")
         print("=" * 60)
+        print(f"{'#':>2} {'p_tok':>6} {'g_tok':>6} {'pp tok/s':>9} {'tg tok/s':>9} {'ttft':>8} {'total':>8}  query")
         
-        for i, query in enumerate(test_queries, 1):
-            print(f"\n📝 Test {i}: {query}")
-            
-            result = self.generate_response(query)
-            
-            print(f"🤖 Response: {result['response']}")
-            print(f"⏱️  Time: {result['response_time']:.2f}s")
-            print(f"🔢 Tokens: {result['tokens_used']}")
-            print("-" * 40)
+        results = []
+        for i, query in enumerate(HOSPITAL_QUERIES, 1):
+            prompt = build_prompt(self.prompt_template, query, match_faqs(query, faqs))
+            result = measure_generation(self.llm, prompt, max_tokens, self.config["temperature"])
+            results.append(result)
+            print(f"{i:>2} {result['prompt_tokens']:>6} {result['generated_tokens']:>6} {result['prompt_tps']:>9.1f} "
+                  f"{result['gen_tps']:>9.1f} {result['ttft_s']:>7.2f}s {result['total_s']:>7.2f}s  {query}")
+        
+        print("-" * 60)
+        print(f"📊 Mean generation: {sum(r['gen_tps'] for r in results) / len(results):.1f} tok/s, "
+              f"peak RSS: {peak_rss_mb():.0f} MB")
+        return results
 
 def main():
     """Main function"""
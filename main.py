@@ -1,43 +1,135 @@
+import asyncio
 import os
+import time
 import uuid
 import requests
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
-from typing import Dict, Any
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, Optional
 from actions.optimized_conversational_action import OptimizedConversationalAction
+from actions.utils.metrics import (
+    QUEUE_DEPTH,
+    REGISTRY,
+    REQUESTS,
+    STAGE_LATENCY,
+    new_trace_id,
+    track_stage,
+)
+from actions.utils.tenants import Tenant, indexes_from_env
+from src.capture import capture_from_env
+from src.circuit_breaker import CircuitBreaker
+from src.debounce import Debouncer
+from src.logging_setup import setup_logging
+from src.profiling import admin_router
+from src.runtime_config import Settings, runtime_config
+from src.scheduler import RATE_LIMITED, FairScheduler, RateLimiter
+from src.warmup import run_warmup, warmup_questions_from_env
+from src.whatsapp import iter_messages, parse_payload
 import logging
 
 app = FastAPI()
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Setup logging (queued JSON records, level/file from LOG_LEVEL / LOG_FILE)
+setup_logging()
 logger = logging.getLogger("webhook-debug")
 
-# In-memory context per user (mimics Rasa shell)
+# In-memory context per user (mimics Rasa shell), keyed by Tenant.session_key
 user_contexts: Dict[str, Dict[str, Any]] = {}
 
 # Instantiate the conversational engine
 engine = OptimizedConversationalAction()
 
+# Hospitals/clinics served by this deployment (TENANTS_FILE), picked per message
+# by the receiving WhatsApp business number or the /chat API key
+tenants = engine.tenants
+
+# Thresholds, budgets and limits from RUNTIME_CONFIG_FILE, re-read when it changes
+runtime = runtime_config()
+
+# Per-sender budget and fair-share admission in front of inference
+rate_limiter = RateLimiter()
+scheduler = FairScheduler()
+
+def apply_limits(settings: Settings):
+    rate_limiter.configure(settings.rate_limit_burst, settings.rate_limit_per_minute)
+    scheduler.resize(settings.inference_concurrency, settings.max_pending_per_user)
+
+runtime.subscribe(apply_limits)
+
+# Merge bursts like "halo" / "mau tanya" / "jam buka poli gigi?" into one turn
+debouncer = Debouncer(
+    window=float(os.getenv("DEBOUNCE_SECONDS", 1.5)),
+    max_wait=float(os.getenv("DEBOUNCE_MAX_WAIT", 5)),
+    max_messages=int(os.getenv("DEBOUNCE_MAX_MESSAGES", 5)),
+)
+
+# Sampled traffic to rotating JSONL for benchmarks.replay (CAPTURE_DIR enables it)
+capture = capture_from_env()
+
 RASA_NLU_URL = os.getenv("RASA_NLU_URL", "http://localhost:5005/model/parse")
+RASA_NLU_TIMEOUT = float(os.getenv("RASA_NLU_TIMEOUT", 2))
+DIALOG360_API_URL = os.getenv("DIALOG360_API_URL", "https://waba-sandbox.360dialog.io/v1/messages")
+
+NLU_FALLBACK = REGISTRY.counter("chatbot_nlu_fallback_total", "Intents picked locally instead of by Rasa NLU", ("reason",))
+
+# Stop waiting on Rasa NLU while it is down; FAQ ids double as intent names,
+# so the local index can pick the intent meanwhile
+nlu_breaker = CircuitBreaker(
+    "rasa_nlu",
+    failure_rate=float(os.getenv("NLU_BREAKER_FAILURE_RATE", 0.5)),
+    min_calls=int(os.getenv("NLU_BREAKER_MIN_CALLS", 5)),
+    window=float(os.getenv("NLU_BREAKER_WINDOW", 30)),
+    open_seconds=float(os.getenv("NLU_BREAKER_OPEN_SECONDS", 15)),
+)
+# Per-tenant FAQ indexes, loaded on a tenant's first local intent and evicted LRU
+# under TENANT_INDEX_BUDGET_MB
+tenant_indexes = indexes_from_env()
+
+def local_intent(tenant: Tenant, user_message: str, reason: Optional[str] = None) -> str:
+    """Intent from the tenant's local FAQ index (keyword match while it is still loading)"""
+    if reason:
+        NLU_FALLBACK.inc(reason=reason)
+    index = tenant_indexes.get(tenant, wait=False)
+    if index is None:
+        return engine.match_faq_by_keywords(user_message, tenant).get("id", "faq_general")
+    with track_stage("local_nlu"):
+        results = index.hybrid_search(user_message, top_k=1)
+    if results and results[0].get("similarity_score", 0.0) >= runtime.current().local_nlu_min_score:
+        return results[0]["id"]
+    return "faq_general"
 
-def get_intent_from_rasa(user_message: str) -> str:
+def get_intent_from_rasa(user_message: str, tenant: Optional[Tenant] = None, use_breaker: bool = True) -> str:
+    """Intent from Rasa NLU; `use_breaker=False` for background calls that must not trip or probe the breaker"""
+    tenant = tenant or tenants.default
+    if tenant.nlu == "local":
+        # The Rasa model only knows the FAQ ids it was trained on
+        return local_intent(tenant, user_message)
+    if use_breaker and not nlu_breaker.allow():
+        return local_intent(tenant, user_message, "circuit_open")
+    ok = False
     try:
-        resp = requests.post(RASA_NLU_URL, json={"text": user_message}, timeout=2)
+        with track_stage("rasa_nlu"):
+            resp = requests.post(RASA_NLU_URL, json={"text": user_message}, timeout=RASA_NLU_TIMEOUT)
         if resp.status_code == 200:
-            data = resp.json()
-            intent = data.get("intent", {}).get("name", "faq_general")
+            intent = resp.json().get("intent", {}).get("name", "faq_general")
+            ok = True
             logger.info(f"[Intent] Rasa NLU returned intent: {intent} for message: {user_message}")
             return intent
         else:
             logger.warning(f"[Intent] Rasa NLU returned status {resp.status_code}: {resp.text}")
     except Exception as e:
         logger.error(f"[Intent] Rasa NLU call failed: {e}")
-    return "faq_general"
+    finally:
+        # Whatever happens to the call, a half-open probe must report back
+        if use_breaker:
+            nlu_breaker.record(ok)
+    return local_intent(tenant, user_message, "error")
 
-def send_whatsapp_message(to: str, body: str) -> bool:
-    api_key = os.getenv("DIALOG360_API_KEY", "1Qy85e_sandbox")
-    url = "https://waba-sandbox.360dialog.io/v1/messages"
+def send_whatsapp_message(to: str, body: str, api_key: Optional[str] = None) -> bool:
+    api_key = api_key or os.getenv("DIALOG360_API_KEY", "1Qy85e_sandbox")
+    url = DIALOG360_API_URL
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
@@ -49,7 +141,8 @@ def send_whatsapp_message(to: str, body: str) -> bool:
         "Content-Type": "application/json"
     }
     try:
-        resp = requests.post(url, json=payload, headers=headers, timeout=30)
+        with track_stage("whatsapp_send"):
+            resp = requests.post(url, json=payload, headers=headers, timeout=30)
         logger.info(f"[360Dialog] Sent to {to}: {body}")
         logger.info(f"[360Dialog] Status: {resp.status_code}, Response: {resp.text}")
         if resp.status_code in (200, 202):
@@ -64,101 +157,218 @@ class ChatRequest(BaseModel):
     user_id: str
     message: str
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_id = new_trace_id(request.headers.get("x-request-id"))
+    # Only label known routes so random paths can't blow up metric cardinality
+    path = request.url.path
+    endpoint = path if any(getattr(route, "path", None) == path for route in app.routes) else "other"
+    QUEUE_DEPTH.inc(queue="http_inflight")
+    status = 500
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = trace_id
+        return response
+    finally:
+        QUEUE_DEPTH.dec(queue="http_inflight")
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=f"http{endpoint.replace('/', '_')}")
+        REQUESTS.inc(endpoint=endpoint, status=status)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-@app.post("/chat")
-def chat(req: ChatRequest):
-    user_id = req.user_id or str(uuid.uuid4())
-    user_message = req.message
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# CPU / tracemalloc / RSS profiling of this worker, only when ADMIN_TOKEN is set
+admin = admin_router(lambda: {"engine": engine, "indexes": tenant_indexes})
+if admin is not None:
+    app.include_router(admin)
+
+class DummyDispatcher:
+    def __init__(self):
+        self.messages = []
+    def utter_message(self, text=None, **kwargs):
+        self.messages.append(text)
+
+def make_tracker(user_id: str, user_message: str, intent: str, events: list, tenant: Optional[Tenant] = None):
+    """Minimal stand-in for a Rasa tracker"""
+    tracker = type("Tracker", (), {})()
+    tracker.sender_id = user_id
+    tracker.latest_message = {"text": user_message, "intent": {"name": intent},
+                              "metadata": {"tenant": (tenant or tenants.default).id}}
+    tracker.events = events + [{"event": "user", "text": user_message, "parse_data": {"intent": {"name": intent}}}]
+    return tracker
+
+async def run_engine(tenant: Tenant, user_id: str, user_message: str) -> str:
+    """NLU + response generation for one user turn, mimicking a Rasa tracker"""
     # Build a fake tracker/events for context
-    context = user_contexts.setdefault(user_id, {"events": []})
+    session_key = tenant.session_key(user_id)
+    context = user_contexts.setdefault(session_key, {"events": []})
     # Get intent from Rasa NLU
-    intent = get_intent_from_rasa(user_message)
-    # Build a fake tracker
-    tracker = type("Tracker", (), {})()
-    tracker.latest_message = {"text": user_message, "intent": {"name": intent}}
-    tracker.events = context["events"] + [{"event": "user", "text": user_message, "parse_data": {"intent": {"name": intent}}}]
+    intent = await run_in_threadpool(get_intent_from_rasa, user_message, tenant)
+    logger.info(f"[Engine] Detected intent: {intent}")
+    tracker = make_tracker(session_key, user_message, intent, context["events"], tenant)
     # Run the engine
-    class DummyDispatcher:
-        def __init__(self):
-            self.messages = []
-        def utter_message(self, text=None, **kwargs):
-            self.messages.append(text)
     dispatcher = DummyDispatcher()
-    engine.run(dispatcher, tracker, domain={})
+    with track_stage("engine"):
+        await engine.run(dispatcher, tracker, domain={})
     # Update context
     context["events"] = tracker.events + [{"event": "bot", "text": dispatcher.messages[-1]}]
-    user_contexts[user_id] = context
-    return {"response": dispatcher.messages[-1], "user_id": user_id}
+    user_contexts[session_key] = context
+    return dispatcher.messages[-1]
+
+async def warm_question(i: int, user_message: str):
+    """Answer a replayed question as a fresh sender, leaving no conversation behind"""
+    sender = f"__warmup__{i}"
+    # Warm-up failures must not open the breaker on real traffic, nor use up its half-open probe
+    intent = await run_in_threadpool(get_intent_from_rasa, user_message, None, False)
+    with track_stage("warmup"):
+        await engine.run(DummyDispatcher(), make_tracker(sender, user_message, intent, []), domain={})
+    if engine.sessions is not None:
+        engine.sessions.drop(sender)
+
+@app.on_event("startup")
+async def start_warmup():
+    # Replay frequent questions once the server is accepting connections, so the
+    # first patients after a deploy hit warm caches; real traffic always goes first
+    questions = warmup_questions_from_env()
+    if questions:
+        app.state.warmup = asyncio.create_task(run_warmup(
+            questions,
+            warm_question,
+            is_idle=lambda: scheduler.idle() and chat_in_flight == 0 and not engine.llm_lock.locked(),
+            per_second=float(os.getenv("WARMUP_RATE", 0.5)),
+        ))
+
+@app.on_event("shutdown")
+def flush_capture():
+    if capture is not None:
+        capture.close()
+
+async def answer_message(tenant: Tenant, user_id: str, user_message: str) -> str:
+    """Answer a WhatsApp message, sharing inference fairly between senders.
+
+    Senders over their token-bucket budget, or with too many messages already
+    queued, get the verbatim FAQ answer without NLU or LLM work.
+    """
+    session_key = tenant.session_key(user_id)
+    runtime.current()  # Applies edited limits to the rate limiter and scheduler below
+    reason = None
+    # Capacity first: a message turned away for a full queue must not also spend a rate token
+    if not scheduler.has_capacity(session_key):
+        reason = "queue"
+    elif not rate_limiter.allow(session_key):
+        reason = "rate"
+    if reason:
+        RATE_LIMITED.inc(reason=reason)
+        logger.warning(f"[Scheduler] Degraded reply for {session_key} ({reason} limit)")
+        response = engine.degraded_response(user_message, tenant)
+        context = user_contexts.setdefault(session_key, {"events": []})
+        context["events"] = context["events"] + [{"event": "user", "text": user_message}, {"event": "bot", "text": response}]
+        return response
+    return await scheduler.submit(session_key, lambda: run_engine(tenant, user_id, user_message))
+
+def last_intent(user_id: str):
+    """Intent of the sender's latest turn (None for degraded replies, which skip NLU)"""
+    for event in reversed(user_contexts.get(user_id, {}).get("events", [])):
+        if event.get("event") == "user":
+            return event.get("parse_data", {}).get("intent", {}).get("name")
+    return None
+
+def capture_message(endpoint: str, user_id: str, text: str, arrived: float, started: float, outcome: str):
+    if capture is not None:
+        intent = last_intent(user_id) if outcome == "ok" else None
+        capture.record(endpoint, user_id, text, arrived, time.perf_counter() - started, intent, outcome)
+
+# /chat answers directly instead of through the scheduler; warm-up must still yield to it
+chat_in_flight = 0
+
+@app.post("/chat")
+async def chat(req: ChatRequest, x_api_key: Optional[str] = Header(None)):
+    global chat_in_flight
+    # Without a key the default tenant answers, as before multi-tenancy
+    tenant = tenants.by_api_key(x_api_key) if x_api_key else tenants.default
+    if tenant is None:
+        raise HTTPException(status_code=401, detail="unknown API key")
+    user_id = req.user_id or str(uuid.uuid4())
+    arrived, started, outcome = time.time(), time.perf_counter(), "error"
+    chat_in_flight += 1
+    try:
+        response = await run_engine(tenant, user_id, req.message)
+        outcome = "ok"
+    finally:
+        chat_in_flight -= 1
+        capture_message("/chat", tenant.session_key(user_id), req.message, arrived, started, outcome)
+    return {"response": response, "user_id": user_id}
+
+async def handle_message(tenant: Tenant, user_id: str, user_message: str) -> str:
+    """Debounce, answer and reply to one inbound WhatsApp message"""
+    arrived, started, outcome = time.time(), time.perf_counter(), "error"
+    original = user_message
+    try:
+        user_message = await debouncer.collect(tenant.session_key(user_id), user_message)
+        if user_message is None:
+            # Merged into the turn an earlier message from this sender is answering
+            outcome = "merged"
+            return outcome
+        reply = await answer_message(tenant, user_id, user_message)
+        # Send WhatsApp reply via 360Dialog API, from the tenant's number
+        await run_in_threadpool(send_whatsapp_message, user_id, reply, tenant.dialog360_api_key)
+        logger.info(f"[Webhook] Sent WhatsApp reply to {user_id}")
+        outcome = "ok"
+        return outcome
+    finally:
+        capture_message("/webhook", tenant.session_key(user_id), original, arrived, started, outcome)
+
+def message_tenant(metadata) -> Tenant:
+    """Tenant owning the business number a message was sent to"""
+    if metadata is None:
+        return tenants.default
+    return tenants.by_phone_number(metadata.phone_number_id, metadata.display_phone_number)
 
 @app.post("/webhook")
 async def webhook(request: Request):
     try:
-        data = await request.json()
-        headers = dict(request.headers)
-        logger.info(f"[Webhook] Incoming data: {data}")
-        logger.info(f"[Webhook] Incoming headers: {headers}")
-        user_id = None
-        user_message = None
-        # WhatsApp/360Dialog nested payload
-        if (
-            isinstance(data, dict)
-            and "entry" in data
-            and data["entry"]
-            and "changes" in data["entry"][0]
-            and data["entry"][0]["changes"]
-        ):
-            value = data["entry"][0]["changes"][0].get("value", {})
-            # Extract user_id
-            if value.get("contacts") and value["contacts"][0].get("wa_id"):
-                user_id = value["contacts"][0]["wa_id"]
-            # Extract user_message
-            if (
-                value.get("messages")
-                and value["messages"][0].get("text")
-                and value["messages"][0]["text"].get("body")
-            ):
-                user_message = value["messages"][0]["text"]["body"]
-            logger.info(f"[Webhook] (WhatsApp) user_id: {user_id}, user_message: {user_message}")
-        # Fallback: flat payload (for testing)
-        if not user_message:
-            user_id = data.get("wa_id") or data.get("user_id") or str(uuid.uuid4())
-            user_message = data.get("text") or data.get("message")
-            logger.info(f"[Webhook] (Fallback) user_id: {user_id}, user_message: {user_message}")
-        if not user_message:
-            logger.warning("[Webhook] No user_message found in payload.")
+        payload = parse_payload(await request.body())
+        # Every entry/change/message, not just the first; status callbacks carry no messages
+        messages = [(message_tenant(metadata), user_id or str(uuid.uuid4()), text)
+                    for user_id, text, metadata in iter_messages(payload)]
+        if not messages:
+            logger.debug("[Webhook] No user messages in payload")
             return {"status": "ignored"}
-        # Build a fake tracker/events for context
-        context = user_contexts.setdefault(user_id, {"events": []})
-        # Get intent from Rasa NLU
-        intent = get_intent_from_rasa(user_message)
-        logger.info(f"[Webhook] Detected intent: {intent}")
-        # Build a fake tracker
-        tracker = type("Tracker", (), {})()
-        tracker.latest_message = {"text": user_message, "intent": {"name": intent}}
-        tracker.events = context["events"] + [{"event": "user", "text": user_message, "parse_data": {"intent": {"name": intent}}}]
-        # Run the engine
-        class DummyDispatcher:
-            def __init__(self):
-                self.messages = []
-            def utter_message(self, text=None, **kwargs):
-                self.messages.append(text)
-        dispatcher = DummyDispatcher()
-        engine.run(dispatcher, tracker, domain={})
-        # Update context
-        context["events"] = tracker.events + [{"event": "bot", "text": dispatcher.messages[-1]}]
-        user_contexts[user_id] = context
-        # Send WhatsApp reply via 360Dialog API
-        send_whatsapp_message(user_id, dispatcher.messages[-1])
-        logger.info(f"[Webhook] Sent WhatsApp reply to {user_id}")
-        return {"status": "ok"}
+        logger.info(f"[Webhook] {len(messages)} message(s) from {len({u for _, u, _ in messages})} sender(s)")
+        results = await asyncio.gather(*(handle_message(tn, u, t) for tn, u, t in messages), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        for e in errors:
+            logger.error(f"[Webhook] Message failed: {e}")
+        if len(errors) == len(results):
+            return {"status": "error", "error": str(errors[0])}
+        return {
+            "status": "ok",
+            "messages": len(results),
+            "merged": sum(1 for r in results if r == "merged"),
+            "failed": len(errors),
+        }
+    except ValidationError as e:
+        logger.warning(f"[Webhook] Malformed payload: {e.error_count()} error(s)")
+        return {"status": "error", "error": "invalid payload"}
     except Exception as e:
         logger.error(f"[Webhook] Exception: {e}")
         return {"status": "error", "error": str(e)}
 
 if __name__ == "__main__":
-    import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True) 
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        # Models are already loaded in this process; fork workers that share them
+        # and warm llama.cpp up in each worker, never in the parent
+        from src.prefork import serve
+        serve(app, host="0.0.0.0", port=port, workers=workers, post_fork=engine.warm_up_model)
+    else:
+        import uvicorn
+        uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
@@ -0,0 +1,161 @@
+"""
+Opt-in capture of incoming traffic to rotating JSONL files.
+
+Each answered message becomes one line: arrival time, endpoint, a salted hash
+of the sender id, the text (with phone numbers and secrets masked like the
+logs), the detected intent, the outcome and the server latency. Senders are
+sampled by their hash, so a sampled conversation is captured whole. Lines are
+queued and written by a background thread, started on the first record in
+each process so forked workers get their own; when the queue is full they are
+dropped rather than slowing a request down.
+`benchmarks.replay` feeds the files back through a running bot.
+"""
+
+import logging
+import glob
+import hashlib
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+from actions.utils.metrics import REGISTRY
+from src.logging_setup import redact
+
+logger = logging.getLogger(__name__)
+
+CAPTURED = REGISTRY.counter("chatbot_capture_records_total", "Traffic capture records by outcome", ("result",))
+
+
+class TrafficCapture:
+    def __init__(self, directory: str, sample_rate: float = 1.0, salt: Optional[str] = None, max_bytes: int = 50 * 1024 * 1024,
+                 max_files: int = 10, max_pending: int = 10_000):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        # Unsalted hashes of phone numbers are reversible by brute force
+        self.salt = salt or secrets.token_hex(16)
+        self.max_bytes = max_bytes
+        self.max_files = max(1, max_files)
+        self.max_pending = max_pending
+        os.makedirs(directory, exist_ok=True)
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_pending)
+        self._file = None
+        self._size = 0
+        self._seq = 0
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid = None
+        self._start_lock = threading.Lock()
+        # Forked prefork workers inherit this object but not the writer thread or its locks
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._start_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._file = None
+        self._size = 0
+        self._seq = 0
+        self._writer = None
+        self._writer_pid = None
+
+    def _ensure_writer(self):
+        if self._writer_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._writer_pid != os.getpid():
+                self._writer = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                self._writer.start()
+                self._writer_pid = os.getpid()
+
+    def hash_id(self, user_id: str) -> str:
+        """Stable pseudonym for a sender (WhatsApp wa_id is a phone number)"""
+        return hashlib.sha256(f"{self.salt}:{user_id}".encode("utf-8")).hexdigest()[:16]
+
+    def sampled(self, user_id: str) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        return int(self.hash_id(user_id)[:8], 16) / 0xFFFFFFFF < self.sample_rate
+
+    def record(self, endpoint: str, user_id: str, text: str, arrived: float, latency: float,
+               intent: Optional[str] = None, outcome: str = "ok"):
+        """Queue one message for writing (never blocks)"""
+        if not self.sampled(user_id):
+            return
+        self._ensure_writer()
+        line = {
+            "ts": round(arrived, 3),
+            "endpoint": endpoint,
+            "user": self.hash_id(user_id),
+            "text": redact(text),
+            "intent": intent,
+            "outcome": outcome,
+            "latency_ms": round(latency * 1000.0, 1),
+        }
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            CAPTURED.inc(result="dropped")
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued lines and stop the writer"""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        self._seq += 1
+        name = time.strftime("capture-%Y%m%d-%H%M%S", time.gmtime())
+        path = os.path.join(self.directory, f"{name}-{os.getpid()}-{self._seq:04d}.jsonl")
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        # Keep the newest `max_files` captures of this process
+        files = sorted(glob.glob(os.path.join(self.directory, f"capture-*-{os.getpid()}-*.jsonl")),
+                       key=os.path.getmtime)
+        for old in files[:-self.max_files]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _run(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                break
+            try:
+                if self._file is None or self._size >= self.max_bytes:
+                    self._open()
+                data = json.dumps(line, ensure_ascii=False) + "\n"
+                self._file.write(data)
+                self._size += len(data.encode("utf-8"))
+                # Flush when the queue drains so captures survive a crash
+                if self._queue.empty():
+                    self._file.flush()
+                CAPTURED.inc(result="written")
+            except OSError as e:
+                CAPTURED.inc(result="failed")
+                logger.warning(f"Traffic capture write failed: {e}")
+        if self._file is not None:
+            self._file.close()
+
+
+def capture_from_env() -> Optional[TrafficCapture]:
+    """CAPTURE_DIR enables capture; CAPTURE_SAMPLE_RATE, CAPTURE_SALT, CAPTURE_MAX_MB, CAPTURE_MAX_FILES"""
+    directory = os.getenv("CAPTURE_DIR", "")
+    if not directory:
+        return None
+    salt = os.getenv("CAPTURE_SALT", "")
+    if not salt:
+        logger.warning("CAPTURE_SALT is not set; using a random salt, so sender hashes change on every restart")
+    return TrafficCapture(
+        directory,
+        sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", 1.0)),
+        salt=salt or None,
+        max_bytes=int(float(os.getenv("CAPTURE_MAX_MB", 50)) * 1024 * 1024),
+        max_files=int(os.getenv("CAPTURE_MAX_FILES", 10)),
+    )
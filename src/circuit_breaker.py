@@ -0,0 +1,95 @@
+"""
+Circuit breaker for remote dependencies (Rasa NLU)
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from actions.utils.metrics import REGISTRY
+
+CIRCUIT_STATE = REGISTRY.gauge("chatbot_circuit_state", "Circuit state (0 closed, 1 half-open, 2 open)", ("name",))
+CIRCUIT_TRANSITIONS = REGISTRY.counter("chatbot_circuit_transitions_total", "Circuit state changes", ("name", "state"))
+CIRCUIT_REJECTED = REGISTRY.counter("chatbot_circuit_rejected_total", "Calls failed fast while the circuit was open", ("name",))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Stop calling a dependency whose recent calls mostly fail.
+
+    Outcomes of the last `window` seconds are kept; once at least `min_calls`
+    were made and the failure rate reaches `failure_rate`, the circuit opens
+    and `allow()` returns False without touching the dependency. After
+    `open_seconds` up to `half_open_probes` calls are let through: a success
+    closes the circuit, a failure opens it again. Probes that haven't
+    reported back within another `open_seconds` are written off, so a caller
+    that never calls `record()` can't hold the circuit half-open.
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 5, window: float = 30.0,
+                 open_seconds: float = 15.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.state = CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, name=name)
+
+    def _transition(self, state: str, now: float):
+        self.state = state
+        self._outcomes.clear()
+        self._failures = 0
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = now
+        CIRCUIT_STATE.set(_STATE_VALUES[state], name=self.name)
+        CIRCUIT_TRANSITIONS.inc(name=self.name, state=state)
+
+    def _expire(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN, now)
+            if self.state == HALF_OPEN and self._probes and now - self._probed_at >= self.open_seconds:
+                self._probes = 0
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                self._probed_at = now
+                return True
+            if self.state == CLOSED:
+                return True
+        CIRCUIT_REJECTED.inc(name=self.name)
+        return False
+
+    def record(self, success: bool, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED if success else OPEN, now)
+                return
+            if self.state == OPEN:
+                return  # A call that started before the circuit opened
+            self._outcomes.append((now, success))
+            if not success:
+                self._failures += 1
+            self._expire(now)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+                self._transition(OPEN, now)
@@ -23,6 +23,9 @@ class Config:
     # Vector Search Configuration
     FAISS_INDEX_PATH: str = os.getenv("FAISS_INDEX_PATH", "./models/faiss_index")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx | onnx-int8
+    EMBEDDING_ONNX_DIR: Optional[str] = os.getenv("EMBEDDING_ONNX_DIR")
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", 0))  # 0 = ONNX Runtime default
     SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", 0.65))
     TOP_K_RESULTS: int = int(os.getenv("TOP_K_RESULTS", 5))
     
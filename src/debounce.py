@@ -0,0 +1,79 @@
+"""
+Per-user debounce that merges rapid-fire messages into one turn
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from actions.utils.metrics import REGISTRY
+
+DEBOUNCED = REGISTRY.counter("chatbot_debounced_messages_total", "Messages merged into an earlier message's turn", ("group",))
+
+
+class _Turn:
+    __slots__ = ("texts", "arrived")
+
+    def __init__(self, text: str):
+        self.texts: List[str] = [text]
+        self.arrived = asyncio.Event()
+
+
+def merge_texts(texts: List[str]) -> str:
+    """Join message fragments into one utterance, ending each with punctuation"""
+    parts = []
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if text[-1] not in ".?!,;:":
+            text += "."
+        parts.append(text)
+    return " ".join(parts)
+
+
+class Debouncer:
+    """Collect messages per key until the sender pauses for `window` seconds.
+
+    The first message of a turn waits; messages arriving while it waits are
+    appended to the same turn and their callers get None back. The waiting
+    caller then receives the merged text, so one NLU + generation pass and one
+    reply cover the whole burst. `max_wait` and `max_messages` bound how long
+    a chatty sender can hold a turn open.
+    """
+
+    def __init__(self, window: float = 1.5, max_wait: float = 5.0, max_messages: int = 5, name: str = "webhook"):
+        self.window = window
+        self.max_wait = max(window, max_wait)
+        self.max_messages = max(1, max_messages)
+        self.name = name
+        self._turns: Dict[str, _Turn] = {}
+
+    async def collect(self, key: str, text: str) -> Optional[str]:
+        if self.window <= 0:
+            return text
+
+        turn = self._turns.get(key)
+        if turn is not None:
+            turn.texts.append(text)
+            turn.arrived.set()
+            DEBOUNCED.inc(group=self.name)
+            return None
+
+        turn = _Turn(text)
+        self._turns[key] = turn
+        deadline = time.monotonic() + self.max_wait
+        try:
+            while len(turn.texts) < self.max_messages:
+                timeout = min(self.window, deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+                turn.arrived.clear()
+                try:
+                    await asyncio.wait_for(turn.arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            # No await between here and the return, so no message can slip in unseen
+            self._turns.pop(key, None)
+        return merge_texts(turn.texts)
@@ -0,0 +1,198 @@
+"""
+Non-blocking structured logging.
+
+Request-path code only puts records on a queue (`QueueHandler`); a listener
+thread formats them as JSON lines, redacts phone numbers and secrets, truncates
+long values and writes to stdout and `Config.LOG_FILE`. INFO/DEBUG records can
+be sampled per logger (`LOG_SAMPLING=webhook-debug=0.1,actions=0.5`);
+warnings and errors are always kept. If the queue is full, records are dropped
+and counted instead of blocking the request.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+from actions.utils.metrics import REGISTRY, TraceIdFilter
+from src.config import Config
+
+LOG_DROPPED = REGISTRY.counter("chatbot_log_records_dropped_total", "Log records not written", ("reason",))
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+_PHONE = re.compile(r"(?<!\d)(?:\+?62|0)8?\d{6,12}(\d{3})(?!\d)")
+_SECRET = re.compile(r"(?i)((?:api[-_]?key|token|authorization|password|secret)[\"']?\s*[:=]\s*[\"']?)[^\s\"',}]+")
+
+
+def redact(text: str) -> str:
+    """Mask phone numbers (wa_id) down to their last 3 digits, and key=value secrets"""
+    text = _PHONE.sub(lambda m: "***" + m.group(1), text)
+    return _SECRET.sub(lambda m: m.group(1) + "***", text)
+
+
+def truncate(text: str, limit: int) -> str:
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit} chars)"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, trace_id, msg and any `extra` fields"""
+
+    def __init__(self, max_chars: int = 1000):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def _clean(self, value):
+        if isinstance(value, str):
+            return truncate(redact(value), self.max_chars)
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return truncate(redact(repr(value)), self.max_chars)
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "msg": self._clean(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = self._clean(value)
+        if record.exc_info:
+            entry["exc"] = truncate(redact(self.formatException(record.exc_info)), self.max_chars * 4)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RedactingFormatter(logging.Formatter):
+    """Plain-text format for local development, with the same redaction"""
+
+    def __init__(self, fmt: str, max_chars: int = 1000):
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        return truncate(redact(super().format(record)), self.max_chars)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep INFO/DEBUG records of a logger (or its children) with the configured probability"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest prefix wins: "actions.utils" overrides "actions"
+        self.rates = sorted(rates.items(), key=lambda kv: -len(kv[0]))
+
+    def rate(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        LOG_DROPPED.inc(reason="sampled")
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments here; JSON formatting happens on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(reason="queue_full")
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """"webhook-debug=0.1,actions=0.5" -> {"webhook-debug": 0.1, "actions": 0.5}"""
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handlers: List[logging.Handler] = []
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def _start_listener():
+    global _listener
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10_000)))
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def setup_logging(level: Optional[str] = None, log_file: Optional[str] = None):
+    """Route all logging through a queue to JSON (LOG_FORMAT=json) or text handlers.
+
+    `level` and `log_file` default to Config.LOG_LEVEL / Config.LOG_FILE
+    (an empty LOG_FILE logs to stdout only). Safe to call more than once.
+    """
+    global _queue_handler, _handlers
+    level = (level or Config.LOG_LEVEL).upper()
+    log_file = Config.LOG_FILE if log_file is None else log_file
+    max_chars = int(os.getenv("LOG_MAX_CHARS", 1000))
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        formatter = JsonFormatter(max_chars)
+    else:
+        formatter = RedactingFormatter("%(levelname)s:%(name)s:[%(trace_id)s] %(message)s", max_chars)
+
+    _stop_listener()
+    _handlers = [logging.StreamHandler()]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        _handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(float(os.getenv("LOG_FILE_MAX_MB", 20)) * 1024 * 1024),
+            backupCount=int(os.getenv("LOG_FILE_BACKUPS", 5)),
+            encoding="utf-8",
+        ))
+    for handler in _handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = NonBlockingQueueHandler(None)
+    # Both run on the calling thread: the trace id lives in a contextvar there
+    _queue_handler.addFilter(TraceIdFilter())
+    _queue_handler.addFilter(SamplingFilter(parse_sampling(os.getenv("LOG_SAMPLING", ""))))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _start_listener()
+
+
+# Forked prefork workers inherit the queue handler but not the listener thread
+os.register_at_fork(after_in_child=lambda: _queue_handler is not None and _start_listener())
+atexit.register(_stop_listener)
@@ -0,0 +1,127 @@
+"""
+Pre-fork multi-worker server for the Hospital FAQ Chatbot
+
+The parent process imports the application (which loads llama.cpp, MiniLM and
+the FAISS index once), binds the listening socket and then forks the HTTP
+workers. Workers inherit the loaded models copy-on-write, and the GGUF weights
+stay in the shared page cache because the model is opened with use_mmap=True,
+so adding workers adds HTTP/session capacity without multiplying model RAM.
+
+Nothing may run inference in the parent: llama.cpp's OpenMP thread pool does
+not survive fork(), so a worker forked after it started can hang on its first
+generation. Per-worker warm-up goes in `post_fork`, which runs in each child.
+"""
+
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("prefork")
+
+# Minimum seconds between respawns of a crashing worker
+RESPAWN_BACKOFF = 1.0
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Bind the listening socket once in the parent so all workers share it"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app: Any, sock: socket.socket, worker_id: int, log_level: str = "info",
+               post_fork: Optional[Callable[[], None]] = None):
+    """Run a single uvicorn server on the inherited socket (child process only)"""
+    import uvicorn
+
+    # Let uvicorn install its own graceful shutdown handlers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.environ["WORKER_ID"] = str(worker_id)
+    if post_fork is not None:
+        post_fork()
+
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    server = uvicorn.Server(config)
+    logger.info(f"[Prefork] Worker {worker_id} started (pid {os.getpid()})")
+    server.run(sockets=[sock])
+
+
+def _spawn(app: Any, sock: socket.socket, worker_id: int, log_level: str,
+           post_fork: Optional[Callable[[], None]] = None) -> int:
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            run_worker(app, sock, worker_id, log_level, post_fork)
+        except Exception as e:
+            logger.error(f"[Prefork] Worker {worker_id} crashed: {e}")
+            exit_code = 1
+        finally:
+            # Never fall back into the parent's supervisor loop
+            os._exit(exit_code)
+    return pid
+
+
+def serve(app: Any, host: str = "0.0.0.0", port: int = 8000, workers: int = 2, log_level: str = "info",
+          post_fork: Optional[Callable[[], None]] = None):
+    """Serve an already-imported app with `workers` forked processes.
+
+    `app` must be fully initialised before calling this, so every heavy model
+    is loaded exactly once in the parent. `post_fork` runs in every worker
+    (and respawned worker) before it starts serving.
+    """
+    sock = bind_socket(host, port)
+
+    # Move everything allocated so far (models, FAQ data, indexes) out of the
+    # GC's reach so refcount/GC passes in workers don't dirty shared pages.
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    last_spawn: Dict[int, float] = {}
+    for worker_id in range(workers):
+        children[_spawn(app, sock, worker_id, log_level, post_fork)] = worker_id
+        last_spawn[worker_id] = time.monotonic()
+    logger.info(f"[Prefork] Serving on {host}:{port} with {workers} workers (parent pid {os.getpid()})")
+
+    shutting_down = False
+
+    def _shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        worker_id = children.pop(pid, None)
+        if worker_id is None or shutting_down:
+            continue
+        logger.warning(f"[Prefork] Worker {worker_id} (pid {pid}) exited with status {status}, respawning")
+        wait = RESPAWN_BACKOFF - (time.monotonic() - last_spawn[worker_id])
+        if wait > 0:
+            time.sleep(wait)
+        children[_spawn(app, sock, worker_id, log_level, post_fork)] = worker_id
+        last_spawn[worker_id] = time.monotonic()
+
+    sock.close()
+    logger.info("[Prefork] All workers stopped")
@@ -0,0 +1,252 @@
+"""
+On-demand profiling for a live worker: sampling CPU profiles, tracemalloc
+top/diff, and an RSS breakdown by component.
+
+The endpoints are mounted under /admin only when ADMIN_TOKEN is set, and every
+request must send it in the X-Admin-Token header. All of it runs in-process
+and is bounded (profile duration, result sizes), so it can be triggered on a
+serving worker without a restart. With WEB_CONCURRENCY > 1 each request
+profiles whichever worker accepted it; the reply includes its pid.
+"""
+
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+MAX_PROFILE_SECONDS = 60.0
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_cpu(seconds: float, interval: float = 0.005, include_idle: bool = False) -> Counter:
+    """Sample every thread's Python stack for `seconds`; returns collapsed stack -> samples.
+
+    Time spent inside C extensions (llama.cpp, FAISS, ONNX Runtime) is
+    attributed to the Python frame that called them. Threads parked in a
+    wait (idle pool workers, the event loop selector) are skipped unless
+    `include_idle` is set.
+    """
+    me = threading.get_ident()
+    idle_leaves = {"wait", "select", "poll", "_worker", "get", "acquire", "sleep", "epoll", "_recv_bytes"}
+    stacks: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if not include_idle and frame.f_code.co_name in idle_leaves:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's folded format, ready for flamegraph.pl or speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _smaps() -> List[Dict[str, Any]]:
+    """Mappings of this process with their resident kB (Linux only)"""
+    mappings = []
+    current = None
+    try:
+        with open("/proc/self/smaps", "r") as f:
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if "-" in parts[0] and not parts[0].endswith(":"):
+                    current = {"path": parts[5] if len(parts) > 5 else "[anon]", "rss_kb": 0}
+                    mappings.append(current)
+                elif parts[0] == "Rss:" and current is not None:
+                    current["rss_kb"] = int(parts[1])
+    except OSError:
+        return []
+    return mappings
+
+
+def _status_kb(field: str) -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def rss_breakdown(engine=None, indexes=None) -> Dict[str, Any]:
+    """RSS of the process and the bytes attributable to each loaded component.
+
+    Mapped files (GGUF weights, shared libraries) are measured from smaps;
+    heap-resident parts (KV cache, MiniLM weights, per-tenant FAISS vectors, session
+    snapshots) are sized from the objects themselves. "unattributed" is the
+    rest: interpreter, allocator slack and everything else.
+    """
+    mb = 1024 * 1024
+    mappings = _smaps()
+    by_path: Counter = Counter()
+    for m in mappings:
+        by_path[m["path"]] += m["rss_kb"] * 1024
+    components: Dict[str, float] = {}
+
+    llm = getattr(engine, "llm", None)
+    if llm is not None:
+        import llama_cpp
+
+        components["llama_weights_resident"] = sum(v for p, v in by_path.items() if p.endswith(".gguf"))
+        # Sizing the KV cache walks the context; don't race a generation for it
+        if engine.llm_lock.acquire(timeout=2.0):
+            try:
+                components["llama_context_state"] = llama_cpp.llama_state_get_size(llm.ctx)
+            finally:
+                engine.llm_lock.release()
+        components["llama_libraries"] = sum(v for p, v in by_path.items() if "llama" in os.path.basename(p) and ".so" in p)
+    if indexes is not None:
+        embedder = indexes.loaded_embedder()  # Don't load it just to measure it
+        if embedder is not None:
+            components[f"embedder_{embedder.backend}"] = embedder.model_bytes()
+        components["faiss_indexes"] = indexes.nbytes()
+    sessions = getattr(engine, "sessions", None)
+    if sessions is not None:
+        components["session_snapshots_ram"] = sessions._ram_bytes
+    if engine is not None:
+        components["response_cache"] = sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in list(engine.cache.items()))
+        components["prefetched_answers"] = sum(sys.getsizeof(v[2]) for v in list(getattr(engine, "prefetched", {}).values()))
+
+    rss = _status_kb("VmRSS") * 1024
+    # Weights mapped from disk are already counted in RSS; in-heap estimates are too
+    attributed = sum(components.values())
+    return {
+        "pid": os.getpid(),
+        "rss_mb": round(rss / mb, 1),
+        "peak_rss_mb": round(_status_kb("VmHWM") * 1024 / mb, 1),
+        "components_mb": {k: round(v / mb, 2) for k, v in sorted(components.items(), key=lambda kv: -kv[1])},
+        "unattributed_mb": round(max(0, rss - attributed) / mb, 1),
+        "largest_mappings_mb": {p: round(v / mb, 1) for p, v in by_path.most_common(10)},
+    }
+
+
+def _stat_rows(stats, limit: int) -> List[Dict[str, Any]]:
+    rows = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        row = {"where": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        if hasattr(stat, "size_diff"):
+            row["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+            row["count_diff"] = stat.count_diff
+        rows.append(row)
+    return rows
+
+
+def admin_router(components: Callable[[], Dict[str, Any]]) -> Optional[APIRouter]:
+    """/admin profiling routes guarded by ADMIN_TOKEN (None when it is unset).
+
+    `components()` returns the objects to size: {"engine": ..., "indexes": TenantIndexes}.
+    """
+    token = os.getenv("ADMIN_TOKEN", "")
+    if not token:
+        return None
+
+    def check(x_admin_token: str):
+        if not hmac.compare_digest(x_admin_token or "", token):
+            raise HTTPException(status_code=403, detail="forbidden")
+
+    router = APIRouter(prefix="/admin")
+    profile_lock = threading.Lock()
+    baseline: Dict[str, Any] = {}
+
+    @router.get("/profile/cpu", response_class=PlainTextResponse)
+    async def cpu_profile(seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS),
+                          interval_ms: float = Query(5.0, ge=1.0, le=100.0),
+                          include_idle: bool = False,
+                          x_admin_token: str = Header("")):
+        check(x_admin_token)
+        if not profile_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="a profile is already running")
+        try:
+            stacks = await run_in_threadpool(sample_cpu, seconds, interval_ms / 1000.0, include_idle)
+        finally:
+            profile_lock.release()
+        return PlainTextResponse(collapsed(stacks), headers={"X-Profile-Pid": str(os.getpid())})
+
+    @router.post("/tracemalloc/start")
+    def tracemalloc_start(frames: int = Query(1, ge=1, le=25), x_admin_token: str = Header("")):
+        check(x_admin_token)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        baseline.clear()
+        return {"pid": os.getpid(), "tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+    @router.post("/tracemalloc/stop")
+    def tracemalloc_stop(x_admin_token: str = Header("")):
+        check(x_admin_token)
+        tracemalloc.stop()
+        baseline.clear()
+        return {"pid": os.getpid(), "tracing": False}
+
+    def snapshot():
+        if not tracemalloc.is_tracing():
+            raise HTTPException(status_code=409, detail="tracemalloc is not running; POST /admin/tracemalloc/start")
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    @router.get("/tracemalloc/top")
+    def tracemalloc_top(limit: int = Query(25, ge=1, le=200), x_admin_token: str = Header("")):
+        check(x_admin_token)
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "pid": os.getpid(),
+            "traced_mb": round(current / 1024 / 1024, 2),
+            "peak_mb": round(peak / 1024 / 1024, 2),
+            "top": _stat_rows(snapshot().statistics("lineno"), limit),
+        }
+
+    @router.post("/tracemalloc/snapshot")
+    def tracemalloc_snapshot(x_admin_token: str = Header("")):
+        """Remember the current allocations as the baseline for /diff"""
+        check(x_admin_token)
+        baseline["snapshot"] = snapshot()
+        baseline["taken"] = time.time()
+        return {"pid": os.getpid(), "baseline": baseline["taken"]}
+
+    @router.get("/tracemalloc/diff")
+    def tracemalloc_diff(limit: int = Query(25, ge=1, le=200), x_admin_token: str = Header("")):
+        check(x_admin_token)
+        if "snapshot" not in baseline:
+            raise HTTPException(status_code=409, detail="no baseline; POST /admin/tracemalloc/snapshot first")
+        stats = snapshot().compare_to(baseline["snapshot"], "lineno")
+        return {
+            "pid": os.getpid(),
+            "since_seconds": round(time.time() - baseline["taken"], 1),
+            "diff": _stat_rows(stats, limit),
+        }
+
+    @router.get("/memory")
+    def memory(x_admin_token: str = Header("")):
+        check(x_admin_token)
+        return rss_breakdown(**components())
+
+    return router
@@ -0,0 +1,259 @@
+"""
+Runtime-tunable settings, reloaded from a watched file without a restart.
+
+Confidence thresholds, generation budgets, the response cache size and the
+concurrency / rate limits can be changed on a live worker by editing
+RUNTIME_CONFIG_FILE: nothing is reloaded but the settings themselves, so the
+GGUF model and the embedder stay warm. Every key is optional; missing ones
+keep their defaults (the environment variables they replace, or the values
+that used to be hard-coded):
+
+    {
+      "use_llm": true,
+      "high_confidence": 0.8,
+      "medium_confidence": 0.4,
+      "low_similarity": 0.4,
+      "local_nlu_min_score": 0.4,
+      "generation": {
+        "faq_rephrase": {"max_tokens": 180, "temperature": 0.2},
+        "greeting": {"max_tokens": 60, "temperature": 0.7}
+      },
+      "response_cache_size": 100,
+      "inference_concurrency": 2,
+      "max_pending_per_user": 2,
+      "rate_limit_burst": 5,
+      "rate_limit_per_minute": 12
+    }
+
+The file's mtime is checked at most every RUNTIME_CONFIG_POLL_SECONDS when
+settings are read. A changed file is parsed and validated as a whole, then
+swapped in as one immutable snapshot, so a request never sees half an
+update. An invalid file is logged and counted, and the previous settings
+stay in force.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from actions.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_CONFIG_RELOADS = REGISTRY.counter("chatbot_runtime_config_reloads_total", "Runtime config file reloads", ("result",))
+RUNTIME_CONFIG_VERSION = REGISTRY.gauge("chatbot_runtime_config_version", "Runtime config snapshots applied since start")
+
+# name -> (type, minimum, maximum)
+FIELDS = {
+    "use_llm": (bool, None, None),
+    "high_confidence": (float, 0.0, 1.0),
+    "medium_confidence": (float, 0.0, 1.0),
+    "low_similarity": (float, 0.0, 1.0),
+    "local_nlu_min_score": (float, 0.0, 1.0),
+    "response_cache_size": (int, 0, 1_000_000),
+    "inference_concurrency": (int, 1, 64),
+    "max_pending_per_user": (int, 1, 100),
+    "rate_limit_burst": (float, 1.0, 10_000.0),
+    "rate_limit_per_minute": (float, 0.1, 100_000.0),
+}
+GENERATION_FIELDS = {
+    "max_tokens": (int, 1, 1024),
+    "temperature": (float, 0.0, 2.0),
+}
+
+
+def default_values() -> Dict[str, Any]:
+    """Settings with no file: the environment variables they replace, else the old constants"""
+    return {
+        "use_llm": os.getenv("USE_LLM", "true").lower() == "true",
+        "high_confidence": 0.8,
+        "medium_confidence": 0.4,
+        "low_similarity": 0.4,
+        "local_nlu_min_score": float(os.getenv("LOCAL_NLU_MIN_SCORE", 0.4)),
+        "generation": {
+            "faq_rephrase": {"max_tokens": 180, "temperature": 0.2},
+            "faq": {"max_tokens": 100, "temperature": 0.6},
+            "greeting": {"max_tokens": 60, "temperature": 0.7},
+            "goodbye": {"max_tokens": 50, "temperature": 0.7},
+            "casual": {"max_tokens": 80, "temperature": 0.7},
+        },
+        "response_cache_size": 100,
+        "inference_concurrency": int(os.getenv("INFERENCE_CONCURRENCY", 2)),
+        "max_pending_per_user": int(os.getenv("MAX_PENDING_PER_USER", 2)),
+        "rate_limit_burst": float(os.getenv("RATE_LIMIT_BURST", 5)),
+        "rate_limit_per_minute": float(os.getenv("RATE_LIMIT_PER_MINUTE", 12)),
+    }
+
+
+def _check(name: str, value: Any, kind: type, low, high) -> Any:
+    # bool is an int subclass; "true" or 1 for a flag is almost certainly a typo
+    if kind is bool:
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} must be true or false")
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and not isinstance(value, int)):
+        raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return kind(value)
+
+
+def validate(overrides: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """`defaults` with `overrides` applied; raises ValueError naming the first bad key"""
+    if not isinstance(overrides, dict):
+        raise ValueError("the runtime config must be a JSON object")
+    values = dict(defaults)
+    for name, value in overrides.items():
+        if name == "generation":
+            values["generation"] = _validate_generation(value, defaults["generation"])
+        elif name in FIELDS:
+            values[name] = _check(name, value, *FIELDS[name])
+        else:
+            raise ValueError(f"unknown setting {name!r}")
+    if values["medium_confidence"] > values["high_confidence"]:
+        raise ValueError("medium_confidence must not exceed high_confidence")
+    return values
+
+
+def _validate_generation(overrides: Any, defaults: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    if not isinstance(overrides, dict):
+        raise ValueError("generation must map stage names to budgets")
+    stages = {stage: dict(budget) for stage, budget in defaults.items()}
+    for stage, budget in overrides.items():
+        if stage not in stages:
+            raise ValueError(f"unknown generation stage {stage!r}, expected one of {sorted(stages)}")
+        if not isinstance(budget, dict):
+            raise ValueError(f"generation.{stage} must be an object")
+        for name, value in budget.items():
+            if name not in GENERATION_FIELDS:
+                raise ValueError(f"unknown generation setting {stage}.{name}")
+            stages[stage][name] = _check(f"generation.{stage}.{name}", value, *GENERATION_FIELDS[name])
+    return stages
+
+
+class Settings:
+    """One validated snapshot; never mutated once built"""
+
+    __slots__ = tuple(FIELDS) + ("_generation", "version")
+
+    def __init__(self, values: Dict[str, Any], version: int = 0):
+        for name in FIELDS:
+            object.__setattr__(self, name, values[name])
+        object.__setattr__(self, "_generation", MappingProxyType(
+            {stage: MappingProxyType(dict(budget)) for stage, budget in values["generation"].items()}))
+        object.__setattr__(self, "version", version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are immutable; edit RUNTIME_CONFIG_FILE instead")
+
+    def generation(self, stage: str) -> Mapping[str, Any]:
+        """{"max_tokens": ..., "temperature": ...} for a generation stage"""
+        return self._generation[stage]
+
+    def as_dict(self) -> Dict[str, Any]:
+        values = {name: getattr(self, name) for name in FIELDS}
+        values["generation"] = {stage: dict(budget) for stage, budget in self._generation.items()}
+        return values
+
+
+class RuntimeConfig:
+    """The current Settings, swapped when the watched file changes.
+
+    `subscribe` registers callbacks for components that hold a setting in
+    their own state (scheduler concurrency, rate-limit buckets); they run
+    with each new snapshot on the thread that noticed the change.
+    """
+
+    def __init__(self, path: Optional[str] = None, poll_seconds: float = 2.0):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._defaults = default_values()
+        self._settings = Settings(validate({}, self._defaults))
+        self._stamp = None
+        self._checked = 0.0
+        self._reload_lock = threading.Lock()
+        self._listeners: List[Callable[[Settings], None]] = []
+        if path:
+            self.reload()
+
+    def current(self) -> Settings:
+        """The settings to use for this request (read once, use throughout)"""
+        if self.path and time.monotonic() - self._checked >= self.poll_seconds:
+            self.check()
+        return self._settings
+
+    def subscribe(self, callback: Callable[[Settings], None]):
+        """Call `callback` with the current settings now and with every later snapshot"""
+        self._listeners.append(callback)
+        callback(self._settings)
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last look; True if new settings were applied"""
+        # Whoever is already reloading covers this look too
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked = time.monotonic()
+            if self._file_stamp() == self._stamp:
+                return False
+            return self._reload()
+        finally:
+            self._reload_lock.release()
+
+    def reload(self) -> bool:
+        with self._reload_lock:
+            return self._reload()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self) -> bool:
+        stamp = self._file_stamp()
+        self._stamp = stamp
+        if stamp is None:
+            logger.error(f"Runtime config {self.path} not found; keeping the current settings")
+            RUNTIME_CONFIG_RELOADS.inc(result="missing")
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                values = validate(json.load(f), self._defaults)
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid runtime config {self.path}, keeping version {self._settings.version}: {e}")
+            RUNTIME_CONFIG_RELOADS.inc(result="invalid")
+            return False
+        previous = self._settings.as_dict()
+        settings = Settings(values, self._settings.version + 1)
+        changed = [k for k, v in values.items() if previous.get(k) != v]
+        self._settings = settings
+        RUNTIME_CONFIG_RELOADS.inc(result="ok")
+        RUNTIME_CONFIG_VERSION.set(settings.version)
+        logger.info(f"Runtime config version {settings.version} applied, changed: {changed}")
+        for callback in self._listeners:
+            try:
+                callback(settings)
+            except Exception as e:
+                logger.error(f"Applying runtime config to {callback} failed: {e}")
+        return True
+
+
+_runtime: Optional[RuntimeConfig] = None
+_runtime_lock = threading.Lock()
+
+
+def runtime_config() -> RuntimeConfig:
+    """The process-wide RuntimeConfig for RUNTIME_CONFIG_FILE (RUNTIME_CONFIG_POLL_SECONDS, default 2)"""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = RuntimeConfig(os.getenv("RUNTIME_CONFIG_FILE", "") or None,
+                                         float(os.getenv("RUNTIME_CONFIG_POLL_SECONDS", 2)))
+    return _runtime
@@ -0,0 +1,166 @@
+"""
+Per-user rate limiting and fair scheduling for the webhook path
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from actions.utils.metrics import QUEUE_DEPTH, REGISTRY
+
+RATE_LIMITED = REGISTRY.counter("chatbot_rate_limited_total", "Messages answered in degraded mode", ("reason",))
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` burst, refilled at `rate` tokens per second"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float, now: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def allow(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+
+class RateLimiter:
+    """One token bucket per key, with idle buckets dropped to bound memory"""
+
+    def __init__(self, burst: float = 5, per_minute: float = 10, max_keys: int = 100_000):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def configure(self, burst: float, per_minute: float):
+        """New limits; existing buckets adopt them on their sender's next message"""
+        self.burst = burst
+        self.rate = per_minute / 60.0
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, self.rate, now)
+            self._buckets[key] = bucket
+            self._evict()
+        else:
+            self._buckets.move_to_end(key)
+            if bucket.capacity != self.burst or bucket.rate != self.rate:
+                bucket._refill(now)
+                bucket.capacity, bucket.rate = self.burst, self.rate
+                bucket.tokens = min(bucket.tokens, bucket.capacity)
+        return bucket.allow(cost, now)
+
+    def _evict(self):
+        # Least recently seen senders go first; their next message starts with a full bucket
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class FairScheduler:
+    """Round-robin admission across users in front of inference.
+
+    Each user has a FIFO of pending jobs; the scheduler starts at most
+    `concurrency` jobs at a time, taking the next job from the next user in
+    turn, so one busy sender can't starve everyone else.
+    """
+
+    def __init__(self, concurrency: int = 2, max_pending_per_user: int = 3, name: str = "inference"):
+        self.concurrency = max(1, concurrency)
+        self.max_pending_per_user = max_pending_per_user
+        self.name = name
+        self._queues: Dict[str, Deque[Tuple[Callable[[], Awaitable[Any]], asyncio.Future]]] = {}
+        self._ready: Deque[str] = deque()
+        self._running = 0
+        self._pending = 0
+        self._tasks = set()  # Strong refs so running jobs aren't garbage-collected
+
+    def resize(self, concurrency: int, max_pending_per_user: int):
+        """New limits. Running jobs above a lowered concurrency finish normally;
+        queued jobs start right away when it is raised (on the event loop) or as
+        soon as a running job finishes (from any other thread).
+        """
+        self.concurrency = max(1, concurrency)
+        self.max_pending_per_user = max_pending_per_user
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._dispatch()
+
+    def pending(self, user_id: Optional[str] = None) -> int:
+        if user_id is None:
+            return self._pending
+        return len(self._queues.get(user_id, ()))
+
+    def idle(self) -> bool:
+        return self._running == 0 and self._pending == 0
+
+    def has_capacity(self, user_id: str) -> bool:
+        return self.pending(user_id) < self.max_pending_per_user
+
+    async def submit(self, user_id: str, job: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = deque()
+            self._queues[user_id] = queue
+            self._ready.append(user_id)
+        queue.append((job, future))
+        self._pending += 1
+        QUEUE_DEPTH.set(self._pending, queue=f"{self.name}_pending")
+        self._dispatch()
+        return await future
+
+    def _dispatch(self):
+        while self._running < self.concurrency and self._ready:
+            user_id = self._ready.popleft()
+            queue = self._queues[user_id]
+            job, future = queue.popleft()
+            self._pending -= 1
+            if queue:
+                self._ready.append(user_id)
+            else:
+                del self._queues[user_id]
+            if future.cancelled():
+                continue
+            self._running += 1
+            task = asyncio.ensure_future(self._run(job, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        QUEUE_DEPTH.set(self._pending, queue=f"{self.name}_pending")
+        QUEUE_DEPTH.set(self._running, queue=f"{self.name}_running")
+
+    async def _run(self, job: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        try:
+            result = await job()
+        except asyncio.CancelledError:
+            # The submitter would otherwise wait forever on a job that will never finish
+            if not future.done():
+                future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._running -= 1
+            self._dispatch()
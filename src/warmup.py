@@ -0,0 +1,133 @@
+"""
+Post-startup cache warming from training data and recent traffic
+"""
+
+import logging
+import asyncio
+import csv
+import glob
+import json
+import os
+import re
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, List
+
+from actions.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUESTIONS = REGISTRY.counter("chatbot_warmup_questions_total", "Questions replayed to warm caches after startup", ("result",))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def top_questions(csv_path: str, limit: int) -> List[str]:
+    """Most frequent questions in a `text,label` CSV, spread across labels.
+
+    Each label contributes its most frequent question in turn, so the first
+    `limit` cover every intent before repeating one.
+    """
+    if limit <= 0 or not os.path.exists(csv_path):
+        return []
+    by_label = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = (row.get("text") or "").strip()
+            if text:
+                by_label.setdefault(row.get("label", ""), Counter())[text] += 1
+    # Busiest labels first
+    queues = [deque(t for t, _ in c.most_common()) for _, c in sorted(by_label.items(), key=lambda kv: -sum(kv[1].values()))]
+    questions, seen = [], set()
+    while queues and len(questions) < limit:
+        for q in list(queues):
+            if not q:
+                queues.remove(q)
+                continue
+            text = q.popleft()
+            if _normalize(text) not in seen:
+                seen.add(_normalize(text))
+                questions.append(text)
+                if len(questions) >= limit:
+                    break
+    return questions
+
+
+def recent_questions(log_path: str, limit: int) -> List[str]:
+    """Most frequent messages among the last lines of a JSONL traffic log.
+
+    Lines are JSON objects with a `text` or `message` field; anything else is
+    skipped. A directory (e.g. CAPTURE_DIR) means its newest *.jsonl file.
+    """
+    if limit <= 0 or not log_path or not os.path.exists(log_path):
+        return []
+    if os.path.isdir(log_path):
+        files = glob.glob(os.path.join(log_path, "*.jsonl"))
+        if not files:
+            return []
+        log_path = max(files, key=os.path.getmtime)
+    counts: Counter = Counter()
+    first_seen = {}
+    with open(log_path, encoding="utf-8") as f:
+        for line in deque(f, maxlen=limit * 50):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            text = record.get("text") or record.get("message") if isinstance(record, dict) else None
+            if isinstance(text, str) and text.strip():
+                key = _normalize(text)
+                counts[key] += 1
+                first_seen.setdefault(key, text.strip())
+    return [first_seen[key] for key, _ in counts.most_common(limit)]
+
+
+async def run_warmup(questions: List[str], answer: Callable[[int, str], Awaitable[None]],
+                     is_idle: Callable[[], bool], per_second: float = 0.5, max_wait: float = 60.0,
+                     delay: float = 2.0):
+    """Replay `questions` one at a time, at most `per_second`, only while idle.
+
+    A question that has to wait more than `max_wait` seconds for the server to
+    go idle is skipped - real traffic has warmed things up by then.
+    """
+    await asyncio.sleep(delay)  # Let the server start accepting connections first
+    interval = 1.0 / per_second if per_second > 0 else 0.0
+    start = time.perf_counter()
+    done = 0
+    for i, question in enumerate(questions):
+        waited = 0.0
+        while not is_idle() and waited < max_wait:
+            await asyncio.sleep(0.25)
+            waited += 0.25
+        if waited >= max_wait:
+            WARMUP_QUESTIONS.inc(result="skipped_busy")
+            continue
+        began = time.perf_counter()
+        try:
+            await answer(i, question)
+            WARMUP_QUESTIONS.inc(result="ok")
+            done += 1
+        except Exception as e:
+            WARMUP_QUESTIONS.inc(result="failed")
+            logger.warning(f"Warm-up question failed: {e}")
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - began)))
+    logger.info(f"Warm-up replayed {done}/{len(questions)} questions in {time.perf_counter() - start:.1f}s")
+
+
+def warmup_questions_from_env() -> List[str]:
+    """WARMUP_QUESTIONS (0 disables), WARMUP_TRAIN_CSV, WARMUP_TRAFFIC_LOG"""
+    limit = int(os.getenv("WARMUP_QUESTIONS", 20))
+    if limit <= 0:
+        return []
+    recent = recent_questions(os.getenv("WARMUP_TRAFFIC_LOG", ""), limit // 2)
+    trained = top_questions(os.getenv("WARMUP_TRAIN_CSV", "data/train_dataset.csv"), limit)
+    questions, seen = [], set()
+    # Recent traffic first: it is what patients are asking this week
+    for text in recent + trained:
+        key = _normalize(text)
+        if key not in seen:
+            seen.add(key)
+            questions.append(text)
+    return questions[:limit]
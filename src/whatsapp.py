@@ -0,0 +1,109 @@
+"""
+Typed WhatsApp (360Dialog / Cloud API) webhook payloads
+"""
+
+from typing import Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# Pydantic compiles each model's validator once at import time and
+# `model_validate_json` decodes straight from bytes in Rust, so parsing a
+# delivery is one pass with no intermediate dict. Fields we don't read -
+# notably the `statuses` callbacks (sent/delivered/read), which outnumber real
+# messages - are not declared and get skipped by the decoder.
+
+
+class _Model(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class TextBody(_Model):
+    body: str = ""
+
+
+class ButtonReply(_Model):
+    text: str = ""
+
+
+class Message(_Model):
+    sender: str = Field("", alias="from")
+    id: str = ""
+    type: str = "text"
+    text: Optional[TextBody] = None
+    button: Optional[ButtonReply] = None
+
+    @property
+    def body(self) -> str:
+        if self.text is not None:
+            return self.text.body
+        if self.button is not None:
+            return self.button.text
+        return ""
+
+
+class Contact(_Model):
+    wa_id: str = ""
+
+
+class Metadata(_Model):
+    phone_number_id: str = ""
+    display_phone_number: str = ""
+
+
+class Value(_Model):
+    metadata: Optional[Metadata] = None
+    contacts: List[Contact] = []
+    messages: List[Message] = []
+
+
+class Change(_Model):
+    field: str = "messages"
+    value: Value = Value()
+
+
+class Entry(_Model):
+    id: str = ""
+    changes: List[Change] = []
+
+
+class WebhookPayload(_Model):
+    """Cloud API (`entry[].changes[].value`), legacy on-premise (top-level
+    `messages`/`contacts`) and the flat `{wa_id|user_id, text|message}` test
+    format, all in one model."""
+
+    entry: List[Entry] = []
+    contacts: List[Contact] = []
+    messages: List[Message] = []
+    wa_id: Optional[str] = None
+    user_id: Optional[str] = None
+    text: Optional[str] = None
+    message: Optional[str] = None
+
+
+def _iter_value(contacts: List[Contact], messages: List[Message],
+                metadata: Optional[Metadata] = None) -> Iterator[Tuple[str, str, Optional[Metadata]]]:
+    default_sender = contacts[0].wa_id if contacts else ""
+    for message in messages:
+        body = message.body
+        if body:
+            yield message.sender or default_sender, body, metadata
+
+
+def iter_messages(payload: WebhookPayload) -> Iterator[Tuple[Optional[str], str, Optional[Metadata]]]:
+    """Yield (wa_id, text, metadata) for every user message in a delivery, in order.
+
+    `metadata` identifies the business number that received the message (None
+    for the legacy and flat formats, which don't carry it).
+    """
+    for entry in payload.entry:
+        for change in entry.changes:
+            if change.field == "messages":
+                yield from _iter_value(change.value.contacts, change.value.messages, change.value.metadata)
+    yield from _iter_value(payload.contacts, payload.messages)
+    flat_text = payload.text or payload.message
+    if flat_text:
+        yield payload.wa_id or payload.user_id, flat_text, None
+
+
+def parse_payload(raw: bytes) -> WebhookPayload:
+    return WebhookPayload.model_validate_json(raw)
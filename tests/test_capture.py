@@ -0,0 +1,51 @@
+import json
+
+from benchmarks.replay import fake_wa_id, load_captures
+from src.capture import TrafficCapture
+
+
+def read_lines(directory):
+    lines = []
+    for path in sorted(directory.glob("*.jsonl")):
+        lines.extend(json.loads(line) for line in path.read_text(encoding="utf-8").splitlines())
+    return lines
+
+
+def test_records_are_pseudonymised_and_redacted(tmp_path):
+    capture = TrafficCapture(str(tmp_path), salt="test-salt")
+    capture.record("/webhook", "6281234567890", "nomor saya 081298765432, api_key=abc123", arrived=100.0, latency=0.25,
+                   intent="faq_jam_buka")
+    capture.close()
+    [line] = read_lines(tmp_path)
+    assert line["user"] == capture.hash_id("6281234567890")
+    assert "6281234567890" not in json.dumps(line)
+    assert "081298765432" not in line["text"] and line["text"].startswith("nomor saya ***432")
+    assert "abc123" not in line["text"]
+    assert (line["endpoint"], line["intent"], line["latency_ms"]) == ("/webhook", "faq_jam_buka", 250.0)
+
+
+def test_hashes_depend_on_the_salt(tmp_path):
+    a = TrafficCapture(str(tmp_path), salt="a")
+    assert a.hash_id("628123") == TrafficCapture(str(tmp_path), salt="a").hash_id("628123")
+    assert a.hash_id("628123") != TrafficCapture(str(tmp_path), salt="b").hash_id("628123")
+    # No salt configured: random per process, never unsalted
+    assert TrafficCapture(str(tmp_path)).hash_id("628123") != TrafficCapture(str(tmp_path)).hash_id("628123")
+
+
+def test_sampling_keeps_whole_conversations(tmp_path):
+    capture = TrafficCapture(str(tmp_path), sample_rate=0.5, salt="s")
+    senders = [f"62812{i:07d}" for i in range(200)]
+    kept = [s for s in senders if capture.sampled(s)]
+    assert 40 < len(kept) < 160
+    assert all(capture.sampled(s) for s in kept)
+
+
+def test_replay_reads_captures_in_arrival_order(tmp_path):
+    capture = TrafficCapture(str(tmp_path), salt="s")
+    capture.record("/chat", "628111", "kedua", arrived=20.0, latency=0.1)
+    capture.record("/chat", "628222", "pertama", arrived=10.0, latency=0.1)
+    capture.record("/other", "628111", "diabaikan", arrived=15.0, latency=0.1)
+    capture.close()
+    records = load_captures([str(tmp_path)])
+    assert [r["text"] for r in records] == ["pertama", "kedua"]
+    assert fake_wa_id(records[1]["user"]) == fake_wa_id(capture.hash_id("628111"))
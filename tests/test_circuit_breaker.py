@@ -0,0 +1,74 @@
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def breaker(**kwargs) -> CircuitBreaker:
+    options = dict(failure_rate=0.5, min_calls=4, window=10.0, open_seconds=5.0)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+def test_stays_closed_below_min_calls_or_rate():
+    b = breaker()
+    for t in range(3):
+        b.record(False, now=t)
+    assert b.state == CLOSED
+    b = breaker()
+    for t, ok in enumerate([True, True, True, False, True]):
+        b.record(ok, now=t)
+    assert b.state == CLOSED and b.allow(now=5)
+
+
+def test_opens_at_the_failure_rate_and_fails_fast():
+    b = breaker()
+    for t, ok in enumerate([True, False, True, False]):
+        b.record(ok, now=t)
+    assert b.state == OPEN
+    assert not b.allow(now=4)
+
+
+def test_old_outcomes_expire():
+    b = breaker(window=5.0)
+    b.record(False, now=0)
+    b.record(False, now=1)
+    for t in (10, 11, 12):
+        b.record(True, now=t)
+    b.record(False, now=13)
+    assert b.state == CLOSED
+
+
+def test_half_open_probe_closes_or_reopens():
+    b = breaker()
+    for t in range(4):
+        b.record(False, now=t)
+    assert not b.allow(now=5)
+    assert b.allow(now=9)
+    assert b.state == HALF_OPEN
+    assert not b.allow(now=9)  # Only one probe at a time
+    b.record(True, now=9.5)
+    assert b.state == CLOSED and b.allow(now=10)
+
+    for t in range(20, 24):
+        b.record(False, now=t)
+    assert b.allow(now=30)
+    b.record(False, now=30)
+    assert b.state == OPEN and not b.allow(now=31)
+
+
+def test_late_results_while_open_are_ignored():
+    b = breaker()
+    for t in range(4):
+        b.record(False, now=t)
+    b.record(True, now=4)
+    assert b.state == OPEN
+
+
+def test_unreported_probe_is_written_off_after_open_seconds():
+    b = breaker()
+    for t in range(4):
+        b.record(False, now=t)
+    assert b.allow(now=9)  # Probe whose caller never calls record()
+    assert not b.allow(now=13)
+    assert b.allow(now=14)
+    assert b.state == HALF_OPEN
+    b.record(True, now=14.5)
+    assert b.state == CLOSED
@@ -0,0 +1,59 @@
+import asyncio
+
+from src.debounce import Debouncer, merge_texts
+
+
+def test_merge_texts_punctuates_fragments():
+    assert merge_texts(["halo", " mau tanya ", "", "jam buka poli gigi?"]) == "halo. mau tanya. jam buka poli gigi?"
+
+
+def test_burst_is_merged_into_the_first_caller():
+    async def scenario():
+        debouncer = Debouncer(window=0.05, max_wait=1.0)
+        first = asyncio.ensure_future(debouncer.collect("user", "halo"))
+        await asyncio.sleep(0.01)
+        second = await debouncer.collect("user", "jam buka poli gigi?")
+        return await first, second
+
+    merged, follower = asyncio.run(scenario())
+    assert merged == "halo. jam buka poli gigi?"
+    assert follower is None
+
+
+def test_senders_are_debounced_separately():
+    async def scenario():
+        debouncer = Debouncer(window=0.02, max_wait=1.0)
+        return await asyncio.gather(debouncer.collect("a", "satu"), debouncer.collect("b", "dua"))
+
+    assert asyncio.run(scenario()) == ["satu.", "dua."]
+
+
+def test_max_messages_closes_the_turn():
+    async def scenario():
+        debouncer = Debouncer(window=10.0, max_wait=10.0, max_messages=2)
+        first = asyncio.ensure_future(debouncer.collect("user", "satu"))
+        await asyncio.sleep(0)
+        await debouncer.collect("user", "dua")
+        return await asyncio.wait_for(first, timeout=1.0)
+
+    assert asyncio.run(scenario()) == "satu. dua."
+
+
+def test_max_wait_bounds_a_chatty_sender():
+    async def scenario():
+        debouncer = Debouncer(window=0.05, max_wait=0.1, max_messages=100)
+        first = asyncio.ensure_future(debouncer.collect("user", "0"))
+        for i in range(1, 10):
+            await asyncio.sleep(0.03)
+            if first.done():
+                break
+            await debouncer.collect("user", str(i))
+        return await first
+
+    merged = asyncio.run(scenario())
+    assert merged.startswith("0.")
+    assert len(merged.split()) < 10
+
+
+def test_zero_window_passes_through():
+    assert asyncio.run(Debouncer(window=0).collect("user", "halo")) == "halo"
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from actions.utils import embedders
+from actions.utils.embedders import Embedder, OnnxEmbedder, cosine_rows, load_embedder
+
+
+class FakeTokenizer:
+    """Token ids are word lengths"""
+
+    def encode_batch(self, texts):
+        encodings = []
+        for text in texts:
+            ids = [len(w) for w in text.split()]
+            encodings.append(SimpleNamespace(ids=ids, attention_mask=[1] * len(ids), type_ids=[0] * len(ids)))
+        return encodings
+
+
+class FakeSession:
+    """Hidden state of a token = (id, 1); records the padded batch shapes"""
+
+    def __init__(self):
+        self.shapes = []
+
+    def run(self, outputs, feeds):
+        ids = feeds["input_ids"]
+        self.shapes.append(ids.shape)
+        return [np.stack([ids.astype("float32"), np.ones_like(ids, dtype="float32")], axis=-1)]
+
+
+def onnx_embedder(pooling="mean", normalize=False):
+    embedder = OnnxEmbedder.__new__(OnnxEmbedder)
+    embedder.dimension = 2
+    embedder.pooling = pooling
+    embedder.normalize = normalize
+    embedder.tokenizer = FakeTokenizer()
+    embedder.session = FakeSession()
+    embedder.input_names = {"input_ids", "attention_mask"}
+    return embedder
+
+
+def test_embedder_must_implement_encode():
+    with pytest.raises(TypeError):
+        Embedder()
+
+
+def test_mean_pooling_ignores_padding_and_keeps_input_order():
+    embedder = onnx_embedder()
+    out = embedder.encode(["aaaa bb", "c", "dd dd dd"], batch_size=2)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, [[3.0, 1.0], [1.0, 1.0], [2.0, 1.0]])
+    # Sorted by length: the one-word text is batched with the shorter of the others
+    assert embedder.session.shapes == [(2, 2), (1, 3)]
+
+
+def test_cls_max_pooling_and_normalization():
+    np.testing.assert_allclose(onnx_embedder("cls").encode(["aaa b"]), [[3.0, 1.0]])
+    np.testing.assert_allclose(onnx_embedder("max").encode(["a bbbb", "cc"]), [[4.0, 1.0], [2.0, 1.0]])
+    normalized = onnx_embedder(normalize=True).encode(["aaa"])
+    np.testing.assert_allclose(np.linalg.norm(normalized, axis=1), [1.0], rtol=1e-6)
+    assert onnx_embedder().encode([]).shape == (0, 2)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        load_embedder("model", backend="tensorflow")
+
+
+def test_missing_onnx_export_falls_back_to_torch(tmp_path, monkeypatch):
+    class FakeTorchEmbedder(Embedder):
+        backend = "torch"
+
+        def __init__(self, model_name):
+            self.name = model_name
+
+        def encode(self, texts, convert_to_tensor=False, batch_size=32):
+            return np.zeros((len(texts), 2), dtype="float32")
+
+    monkeypatch.setattr(embedders, "SentenceTransformerEmbedder", FakeTorchEmbedder)
+    embedder = embedders._load.__wrapped__("model", "onnx-int8", str(tmp_path), 0)
+    assert embedder.backend == "torch" and embedder.name == "model"
+
+
+def test_cosine_rows():
+    a = np.array([[1.0, 0.0], [1.0, 1.0]])
+    b = np.array([[2.0, 0.0], [-1.0, -1.0]])
+    np.testing.assert_allclose(cosine_rows(a, b), [1.0, -1.0])
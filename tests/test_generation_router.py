@@ -0,0 +1,65 @@
+from actions.utils.generation_router import GenerationRouter, GroundingValidator, extract_facts
+
+FAQ = {"id": "faq_jam_buka", "answer": "Poli gigi buka Senin sampai Jumat pukul 08.00 - 14.00 di gedung B."}
+
+
+def test_extract_facts_normalizes_times_and_days():
+    assert extract_facts("Buka Senin 08:00, biaya Rp 50.000") == {"08.00", "50.000", "senin"}
+
+
+def test_faithful_rephrase_is_accepted():
+    validator = GroundingValidator()
+    response = "Poli gigi di gedung B buka setiap Senin sampai Jumat, pukul 08.00 - 14.00."
+    assert validator.check(response, [FAQ], "jam buka poli gigi?") == (True, "ok")
+
+
+def test_dropped_or_invented_facts_are_rejected():
+    validator = GroundingValidator()
+    assert validator.check("Poli gigi buka Senin sampai Jumat pukul 08.00 di gedung B.", [FAQ])[1] == "missing_fact"
+    invented = "Poli gigi buka Senin sampai Jumat pukul 08.00 - 14.00 di gedung B, biaya 50.000."
+    assert validator.check(invented, [FAQ])[1] == "new_fact"
+    # A number the user mentioned may be repeated back
+    assert validator.check(invented, [FAQ], "biayanya 50.000?")[0]
+
+
+def test_wording_overlap_and_similarity_fallback():
+    paraphrase = "Layanan dental tersedia Senin sampai Jumat, 08.00 - 14.00."
+    assert GroundingValidator().check(paraphrase, [FAQ])[1] == "low_overlap"
+    lenient = GroundingValidator(similarity=lambda a, b: 0.9)
+    assert lenient.check(paraphrase, [FAQ]) == (True, "ok")
+
+
+def test_short_or_answerless_responses_are_rejected():
+    validator = GroundingValidator()
+    assert validator.check("Ya.", [FAQ])[1] == "too_short"
+    assert validator.check("Jawaban yang cukup panjang.", [{"id": "x"}])[1] == "no_answer"
+
+
+def test_router_answers_short_on_intent_questions_verbatim():
+    router = GenerationRouter()
+    assert router.decide("jam buka poli gigi?", [FAQ], 0.5, intent="faq_jam_buka") == (False, "short_on_intent")
+    assert router.decide("jam buka poli gigi?", [FAQ], 0.9, intent="faq_other") == (False, "short_high_score")
+
+
+def test_router_generates_for_multi_question_and_conversational_messages():
+    router = GenerationRouter()
+    long_message = "kak saya mau tanya kalau besok saya datang ke poli gigi itu buka jam berapa ya"
+    assert router.decide("jam buka?", [FAQ], 0.9, multi_question=True) == (True, "multi_question")
+    assert router.decide(long_message, [FAQ], 0.5, intent="faq_jam_buka") == (True, "conversational")
+    assert router.decide(long_message, [FAQ], 0.5, intent="faq_other") == (True, "off_intent")
+    assert router.decide("apa saja", [], 0.5) == (False, "no_faq")
+
+
+def test_router_stops_generating_for_rejected_faqs():
+    router = GenerationRouter(min_samples=3, min_acceptance=0.5, explore=0.0)
+    long_message = "kak saya mau tanya kalau besok saya datang ke poli gigi itu buka jam berapa ya"
+    for _ in range(5):
+        router.record([FAQ], accepted=False)
+    rate, samples = router.acceptance_rate(FAQ["id"])
+    assert rate < 0.5 and samples >= 3
+    assert router.decide(long_message, [FAQ], 0.5) == (False, "low_acceptance")
+
+    explorer = GenerationRouter(min_samples=3, min_acceptance=0.5, explore=1.0)
+    for _ in range(5):
+        explorer.record([FAQ], accepted=False)
+    assert explorer.decide(long_message, [FAQ], 0.5) == (True, "explore")
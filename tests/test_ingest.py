@@ -0,0 +1,112 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from actions.utils import embedders
+from actions.utils.document_store import DocumentStore
+from actions.utils.ingest import chunk_blocks, ingest, read_blocks
+
+
+class FakeEmbedder:
+    """Deterministic 4-d vectors; raises once `fail_after` batches were embedded"""
+
+    backend = "fake"
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.batches = 0
+
+    def encode(self, texts):
+        if self.fail_after is not None and self.batches >= self.fail_after:
+            raise RuntimeError("worker died")
+        self.batches += 1
+        return np.array([[b / 255.0 for b in hashlib.sha1(t.encode()).digest()[:4]] for t in texts], dtype="float32")
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    fake = FakeEmbedder()
+    monkeypatch.setattr(embedders, "load_embedder", lambda model_name=None: fake)
+    return fake
+
+
+def run(docs, store, **kwargs):
+    return ingest([str(docs)], str(store), workers=0, batch_size=1, max_words=8, overlap_words=2, model_name="fake", **kwargs)
+
+
+def live_texts(store_dir):
+    store = DocumentStore(str(store_dir))
+    return sorted(store.chunk(int(row))["text"] for row in store.live_rows())
+
+
+def write_docs(docs):
+    docs.mkdir()
+    (docs / "jadwal.md").write_text("# Poli Gigi\nBuka Senin sampai Jumat pukul 08.00.\n\n"
+                                    "# Poli Anak\nBuka Selasa dan Kamis pukul 09.00 sampai 12.00.\n\n"
+                                    "# Poli Mata\nBuka Rabu pukul 10.00.\n\n- Bawa kartu berobat.\n- Datang 15 menit lebih awal.\n")
+    (docs / "tarif.html").write_text("<html><title>Tarif</title><h2>Konsultasi</h2><p>Dokter umum Rp 50.000.</p>"
+                                     "<script>var x = 1;</script><table><tr><td>Gigi</td><td>Rp 75.000</td></tr></table></html>")
+    (docs / "catatan.pdf").write_text("not ingested")
+
+
+def test_markdown_and_html_are_read_by_section(tmp_path):
+    write_docs(tmp_path / "docs")
+    assert list(read_blocks(str(tmp_path / "docs" / "jadwal.md")))[1] == ("Poli Anak", "Buka Selasa dan Kamis pukul 09.00 sampai 12.00.")
+    html = list(read_blocks(str(tmp_path / "docs" / "tarif.html")))
+    assert ("Konsultasi", "Dokter umum Rp 50.000.") in html
+    assert ("Konsultasi", "Gigi | Rp 75.000") in html
+    assert not any("var x" in text for _, text in html)
+
+
+def test_chunks_overlap_within_a_section_only():
+    blocks = [("A", "satu dua tiga"), ("A", "empat lima enam"), ("A", "tujuh delapan"), ("B", "sembilan")]
+    chunks = list(chunk_blocks(iter(blocks), max_words=6, overlap_words=2))
+    assert chunks == [("A", "satu dua tiga\n\nempat lima enam"), ("A", "lima enam\n\ntujuh delapan"), ("B", "sembilan")]
+
+
+def test_rerun_skips_unchanged_and_replaces_changed_documents(tmp_path, embedder):
+    docs = tmp_path / "docs"
+    write_docs(docs)
+    first = run(docs, tmp_path / "store")
+    assert first["documents"] == 2 and first["chunks"] == first["live_rows"] > 0
+    assert run(docs, tmp_path / "store")["unchanged"] == 2
+
+    (docs / "tarif.html").write_text("<h2>Konsultasi</h2><p>Dokter umum Rp 60.000.</p>")
+    changed = run(docs, tmp_path / "store")
+    assert changed["changed"] == 1
+    texts = live_texts(tmp_path / "store")
+    assert "Dokter umum Rp 60.000." in texts and "Dokter umum Rp 50.000." not in texts
+
+
+def test_interrupted_run_resumes_where_it_stopped(tmp_path, embedder):
+    docs = tmp_path / "docs"
+    write_docs(docs)
+    run(docs, tmp_path / "reference")
+    expected = live_texts(tmp_path / "reference")
+
+    embedder.batches, embedder.fail_after = 0, 3
+    with pytest.raises(RuntimeError):
+        run(docs, tmp_path / "store")
+    partial = DocumentStore(str(tmp_path / "store"))
+    assert 0 < len(partial.live_rows()) < len(expected)
+
+    embedder.fail_after = None
+    resumed = run(docs, tmp_path / "store")
+    assert resumed["resumed"] >= 1
+    assert live_texts(tmp_path / "store") == expected
+    assert DocumentStore(str(tmp_path / "store")).rows == len(expected)
+
+
+def test_prune_restores_chunks_shared_with_the_pruned_document(tmp_path, embedder):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("Parkir gratis untuk pasien.")
+    (docs / "b.txt").write_text("Parkir gratis untuk pasien.\n\nIGD buka 24 jam setiap hari.")
+    first = run(docs, tmp_path / "store")
+    assert first["duplicates"] == 1
+
+    (docs / "a.txt").unlink()
+    pruned = run(docs, tmp_path / "store", prune=True)
+    assert pruned["pruned"] == 1 and pruned["rechecked"] == 1
+    assert live_texts(tmp_path / "store") == ["Parkir gratis untuk pasien.", "untuk pasien.\n\nIGD buka 24 jam setiap hari."]
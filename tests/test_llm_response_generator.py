@@ -0,0 +1,40 @@
+from actions.utils.llm_response_generator import LLMResponseGenerator
+from actions.utils.tenants import Tenant
+
+FAQS = [
+    {"id": "faq_jam_buka", "question": "Jam buka poli gigi?", "answer": "Poli gigi buka Senin sampai Jumat pukul 08.00 - 14.00."},
+    {"id": "faq_bpjs", "question": "Apakah menerima BPJS?", "answer": "Kami menerima pasien BPJS di semua poli."},
+]
+
+
+class FakeLlama:
+    def __init__(self, text):
+        self.text = text
+
+    def __call__(self, prompt, **kwargs):
+        return {"choices": [{"text": self.text}], "usage": {}}
+
+
+class FakePrompts:
+    def build(self, template, stage, max_tokens, **slots):
+        return template
+
+
+def generator(reply):
+    gen = LLMResponseGenerator(model_path="missing.gguf", default_tenant=Tenant("rs", "RS Sehat", "missing.json", "models"))
+    gen.llm = FakeLlama(reply)
+    gen.prompts = FakePrompts()
+    return gen
+
+
+def test_rejected_multi_question_reply_answers_every_question_verbatim():
+    # Drops the BPJS answer and invents an hour: fails grounding
+    gen = generator("Poli gigi buka Senin sampai Jumat pukul 09.00 - 14.00.")
+    answer = gen.generate_response("jam buka poli gigi dan bpjs?", FAQS, {}, 0.9, multi_question=True)
+    assert answer == "\n\n".join(f["answer"] for f in FAQS)
+
+
+def test_grounded_reply_is_returned():
+    reply = "Poli gigi buka setiap Senin sampai Jumat, pukul 08.00 - 14.00."
+    gen = generator(reply)
+    assert gen.generate_response("jam buka poli gigi?", FAQS[:1], {}, 0.9) == reply
@@ -0,0 +1,58 @@
+import json
+import logging
+import queue
+
+from src.logging_setup import LOG_DROPPED, JsonFormatter, NonBlockingQueueHandler, SamplingFilter, parse_sampling, redact, truncate
+
+
+def record(name="actions", level=logging.INFO, msg="pesan", **extra):
+    rec = logging.LogRecord(name, level, __file__, 1, msg, None, None)
+    for key, value in extra.items():
+        setattr(rec, key, value)
+    return rec
+
+
+def test_redact_masks_phone_numbers_and_secrets():
+    assert redact("wa_id 6281234567890") == "wa_id ***890"
+    assert redact("hubungi 081298765432") == "hubungi ***432"
+    assert redact('{"api_key": "abc123", "token=xyz"}') == '{"api_key": "***", "token=***"}'
+    assert redact("jam 08.00 - 14.00") == "jam 08.00 - 14.00"
+
+
+def test_truncate_reports_the_cut():
+    assert truncate("abcdef", 3) == "abc…(+3 chars)"
+    assert truncate("abc", 3) == "abc"
+    assert truncate("abcdef", 0) == "abcdef"
+
+
+def test_json_formatter_cleans_message_and_extra_fields():
+    line = json.loads(JsonFormatter(max_chars=40).format(record(msg="dari 6281234567890", sender="6281234567890",
+                                                                latency_ms=12.5, body="x" * 100)))
+    assert line["msg"] == "dari ***890"
+    assert line["sender"] == "***890"
+    assert line["latency_ms"] == 12.5
+    assert line["body"].startswith("x" * 40 + "…")
+    assert line["level"] == "INFO" and line["logger"] == "actions"
+
+
+def test_sampling_uses_the_longest_prefix_and_keeps_warnings():
+    sampler = SamplingFilter(parse_sampling("actions=0, actions.utils=1,bad"))
+    assert sampler.rate("actions.utils.prefetch") == 1.0
+    assert sampler.rate("actions.optimized") == 0.0
+    assert sampler.rate("actionsx") == 1.0
+    assert not sampler.filter(record("actions.optimized"))
+    assert sampler.filter(record("actions.optimized", level=logging.WARNING))
+    assert sampler.filter(record("actions.utils.prefetch"))
+
+
+def test_parse_sampling_clamps_rates():
+    assert parse_sampling("webhook-debug=0.1,actions=5,x=-1") == {"webhook-debug": 0.1, "actions": 1.0, "x": 0.0}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = LOG_DROPPED.get(reason="queue_full")
+    handler.emit(record(msg="satu"))
+    handler.emit(record(msg="dua"))
+    assert handler.queue.qsize() == 1
+    assert LOG_DROPPED.get(reason="queue_full") == before + 1
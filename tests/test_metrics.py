@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from actions.utils.metrics import (CACHE_HIT_RATIO, STAGE_ERRORS, STAGE_LATENCY, MetricsRegistry, TraceIdFilter, new_trace_id,
+                                   record_cache, track_stage)
+
+
+def test_counters_gauges_and_labels_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests", ("endpoint", "status"))
+    requests.inc(endpoint="/chat", status="200")
+    requests.inc(2, endpoint="/chat", status="200")
+    depth = registry.gauge("test_queue_depth", "Depth")
+    depth.set(3)
+    depth.dec()
+    text = registry.render()
+    assert "# HELP test_requests_total Requests\n# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{endpoint="/chat",status="200"} 3.0' in text
+    assert "# TYPE test_queue_depth gauge\ntest_queue_depth 2.0" in text
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("test_escaped_total", "Escaped", ("value",)).inc(value='a"b\\c\nd')
+    assert 'test_escaped_total{value="a\\"b\\\\c\\nd"} 1.0' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, stage="llm")
+    text = registry.render()
+    assert 'test_latency_seconds_bucket{stage="llm",le="0.1"} 1.0' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="1.0"} 2.0' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_sum{stage="llm"} 5.55' in text
+    assert 'test_latency_seconds_count{stage="llm"} 3' in text
+
+
+def test_registering_a_name_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter("test_once_total", "Once") is registry.counter("test_once_total", "Once")
+    assert registry.render().count("# TYPE test_once_total") == 1
+
+
+def test_track_stage_times_and_counts_errors():
+    before = STAGE_ERRORS.get(stage="test_stage")
+    with track_stage("test_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with track_stage("test_stage"):
+            raise ValueError("boom")
+    assert STAGE_ERRORS.get(stage="test_stage") == before + 1
+    assert 'chatbot_stage_latency_seconds_count{stage="test_stage"} 2' in "\n".join(STAGE_LATENCY.render())
+
+
+def test_cache_hit_ratio_is_cumulative():
+    record_cache("test_cache", True)
+    record_cache("test_cache", False)
+    record_cache("test_cache", True)
+    assert CACHE_HIT_RATIO.get(cache="test_cache") == pytest.approx(2 / 3)
+
+
+def test_trace_id_is_attached_to_log_records():
+    trace_id = new_trace_id("abc123")
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", None, None)
+    assert TraceIdFilter().filter(record) and record.trace_id == trace_id == "abc123"
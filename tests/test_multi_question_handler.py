@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from actions.utils.multi_question_handler import MultiQuestionHandler
+
+
+@pytest.mark.parametrize("message", [
+    "Berapa biaya poli anak dan poli gigi?",
+    "Biaya Rp 50.000, apakah benar?",
+    "Jam buka poli gigi dan poli anak",
+    "halo kak, mau tanya jam buka poli gigi",
+    "Jadwal dokter diabetes, diare kapan?",
+    "Poli gigi, buka jam berapa?",
+])
+def test_single_questions_stay_whole(message):
+    assert len(MultiQuestionHandler.segment(message)) == 1
+    assert not MultiQuestionHandler.detect_multi_questions(message)
+
+
+def test_sentence_punctuation_splits():
+    assert MultiQuestionHandler.segment("Poli gigi buka jam berapa? Bisa pakai BPJS? Daftarnya dimana?") == [
+        "Poli gigi buka jam berapa", "Bisa pakai BPJS", "Daftarnya dimana"]
+
+
+def test_conjunction_splits_when_both_sides_ask():
+    assert MultiQuestionHandler.segment("Jam buka poli gigi kapan dan apakah terima BPJS?") == [
+        "Jam buka poli gigi kapan", "apakah terima BPJS"]
+    assert MultiQuestionHandler.segment("Berapa biaya poli anak, dan apakah bisa daftar online") == [
+        "Berapa biaya poli anak", "apakah bisa daftar online"]
+
+
+def test_bare_topic_after_a_question_is_its_own_clause():
+    assert MultiQuestionHandler.segment("jam buka dan bpjs?") == ["jam buka", "bpjs"]
+
+
+def test_affixed_nouns_are_not_verbs():
+    for noun in ("diabetes", "diare", "bersalin", "terapi", "merah"):
+        assert MultiQuestionHandler._scan(noun)[0] is False
+    for verb in ("dibuka", "mendaftar", "berobat", "menerima"):
+        assert MultiQuestionHandler._scan(verb)[0] is True
+
+
+def test_prices_and_times_are_not_boundaries():
+    assert MultiQuestionHandler.segment("Apakah biayanya Rp 150.000? Buka jam 08.00?") == [
+        "Apakah biayanya Rp 150.000", "Buka jam 08.00"]
+
+
+def test_filler_is_folded_into_the_next_clause():
+    assert MultiQuestionHandler.segment("Halo kak! Jam besuk kapan?") == ["Halo kak Jam besuk kapan"]
+    assert MultiQuestionHandler.segment("Jam besuk kapan? terima kasih") == ["Jam besuk kapan terima kasih"]
+
+
+def test_clause_count_is_bounded():
+    message = " ".join(f"Poli {i} buka kapan?" for i in range(8))
+    clauses = MultiQuestionHandler.segment(message)
+    assert len(clauses) == MultiQuestionHandler.MAX_CLAUSES
+    assert clauses[-1].count("buka") == 4
+
+
+def test_empty_message():
+    assert MultiQuestionHandler.segment("") == []
+
+
+def test_segmentation_is_linear_in_boundaries():
+    # Rescanning the clause at every comma took ~40s for 8000 commas
+    message = "kapan poli buka" + ", poli" * 50_000
+    started = time.perf_counter()
+    clauses = MultiQuestionHandler.segment(message)
+    assert time.perf_counter() - started < 2.0
+    assert len(clauses) == 1
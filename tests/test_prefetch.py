@@ -0,0 +1,93 @@
+import threading
+import time
+
+from actions.utils.prefetch import RelatedFaqPrefetcher
+
+FAQS = [
+    {"id": "faq_jam_buka", "related_faqs": ["faq_biaya", "faq_bpjs", "faq_parkir"]},
+    {"id": "faq_biaya", "related_faqs": ["faq_bpjs"]},
+    {"id": "faq_bpjs", "related_faqs": []},
+    {"id": "faq_parkir", "related_faqs": ["faq_jam_buka", "faq_unknown"]},
+]
+
+
+class Recorder:
+    def __init__(self, busy: int = 0):
+        self.warmed = []
+        self.busy = busy
+        self.event = threading.Event()
+
+    def __call__(self, faq):
+        if self.busy:
+            self.busy -= 1
+            return False
+        self.warmed.append(faq["id"])
+        self.event.set()
+        return True
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_warms_related_faqs_up_to_max_per_turn():
+    warm = Recorder()
+    prefetcher = RelatedFaqPrefetcher(FAQS, warm, max_per_turn=2, explore=0.0)
+    prefetcher.observe("user", "faq_jam_buka")
+    assert wait_for(lambda: len(warm.warmed) == 2)
+    assert set(warm.warmed) <= {"faq_biaya", "faq_bpjs", "faq_parkir"}
+
+
+def test_unknown_and_self_references_are_ignored():
+    prefetcher = RelatedFaqPrefetcher(FAQS, Recorder(), explore=0.0)
+    assert prefetcher._choose("faq_parkir") == ["faq_jam_buka"]
+    assert prefetcher._choose("faq_missing") == []
+
+
+def test_busy_model_is_retried():
+    warm = Recorder(busy=2)
+    prefetcher = RelatedFaqPrefetcher(FAQS, warm, idle_poll=0.01)
+    prefetcher.observe("user", "faq_biaya")
+    assert wait_for(lambda: warm.warmed == ["faq_bpjs"])
+
+
+def test_predictions_are_scored_against_the_next_question():
+    prefetcher = RelatedFaqPrefetcher(FAQS, Recorder(), max_per_turn=1, explore=0.0)
+    assert prefetcher.observe("user", "faq_biaya") is False
+    assert prefetcher.observe("user", "faq_bpjs") is True
+    rate, tries = prefetcher.edge_rate("faq_biaya", "faq_bpjs")
+    assert tries == 1.0 and rate > 0.5
+
+    prefetcher.observe("other", "faq_biaya")
+    assert prefetcher.observe("other", "faq_parkir") is False
+    assert prefetcher.edge_rate("faq_biaya", "faq_bpjs")[0] < rate
+
+
+def test_hit_rate_counts_served_answers_not_predictions():
+    prefetcher = RelatedFaqPrefetcher(FAQS, Recorder(), max_per_turn=1, explore=0.0)
+    prefetcher.observe("user", "faq_biaya")
+    prefetcher.observe("user", "faq_bpjs")
+    # A correct prediction whose answer wasn't ready yet is not a hit
+    assert prefetcher.hit_rate() == 0.0
+    prefetcher.served(False)
+    assert prefetcher.hit_rate() == 0.0
+    prefetcher.served(True)
+    assert 0.0 < prefetcher.hit_rate() < 1.0
+
+
+def test_rarely_followed_edges_stop_being_prefetched():
+    prefetcher = RelatedFaqPrefetcher(FAQS, Recorder(), max_per_turn=1, min_hit_rate=0.3, explore=0.0)
+    for i in range(10):
+        prefetcher.observe(f"user{i}", "faq_biaya")
+        prefetcher.observe(f"user{i}", "faq_parkir")
+    assert prefetcher._choose("faq_biaya") == []
+
+
+def test_prediction_memory_is_bounded():
+    prefetcher = RelatedFaqPrefetcher(FAQS, Recorder(), explore=0.0, max_users=3)
+    for i in range(10):
+        prefetcher.observe(f"user{i}", "faq_biaya")
+    assert len(prefetcher._predictions) == 3
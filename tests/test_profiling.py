@@ -0,0 +1,77 @@
+import threading
+import tracemalloc
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.profiling import admin_router, collapsed, rss_breakdown, sample_cpu
+
+HEADERS = {"X-Admin-Token": "secret"}
+
+
+def client(monkeypatch, engine=None):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    app = FastAPI()
+    app.include_router(admin_router(lambda: {"engine": engine, "indexes": None}))
+    return TestClient(app)
+
+
+def test_admin_routes_are_off_without_a_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert admin_router(lambda: {}) is None
+
+
+def test_every_route_requires_the_token(monkeypatch):
+    http = client(monkeypatch)
+    assert http.get("/admin/memory").status_code == 403
+    assert http.get("/admin/memory", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert http.get("/admin/profile/cpu?seconds=0.01").status_code == 403
+    assert http.post("/admin/tracemalloc/start").status_code == 403
+    assert http.get("/admin/memory", headers=HEADERS).status_code == 200
+
+
+def test_profile_duration_is_bounded(monkeypatch):
+    http = client(monkeypatch)
+    assert http.get("/admin/profile/cpu?seconds=600", headers=HEADERS).status_code == 422
+    response = http.get("/admin/profile/cpu?seconds=0.05&interval_ms=5", headers=HEADERS)
+    assert response.status_code == 200 and "X-Profile-Pid" in response.headers
+
+
+def test_tracemalloc_diff_needs_a_baseline(monkeypatch):
+    http = client(monkeypatch)
+    assert http.get("/admin/tracemalloc/top", headers=HEADERS).status_code == 409
+    try:
+        assert http.post("/admin/tracemalloc/start", headers=HEADERS).json()["tracing"]
+        assert http.get("/admin/tracemalloc/diff", headers=HEADERS).status_code == 409
+        assert http.post("/admin/tracemalloc/snapshot", headers=HEADERS).status_code == 200
+        assert "diff" in http.get("/admin/tracemalloc/diff?limit=5", headers=HEADERS).json()
+    finally:
+        http.post("/admin/tracemalloc/stop", headers=HEADERS)
+    assert not tracemalloc.is_tracing()
+
+
+def test_cpu_samples_busy_threads_as_collapsed_stacks():
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=spin, name="busy-worker")
+    worker.start()
+    try:
+        stacks = sample_cpu(0.05, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+    assert any(stack.startswith("busy-worker;") and "spin" in stack for stack in stacks)
+    line = collapsed(stacks).splitlines()[0]
+    assert line.rsplit(" ", 1)[1].isdigit()
+
+
+def test_memory_breakdown_sizes_engine_caches():
+    engine = SimpleNamespace(llm=None, sessions=None, cache={"key": "jawaban"}, prefetched={("rs", "faq"): (None, 0.0, "x" * 4096)})
+    report = rss_breakdown(engine=engine)
+    assert {"response_cache", "prefetched_answers"} <= set(report["components_mb"])
+    assert report["rss_mb"] >= 0
@@ -0,0 +1,72 @@
+import pytest
+
+from actions.utils.prompt_builder import ListSlot, PromptBuilder, PromptTooLong, Slot
+
+
+class WordLlama:
+    """One token per whitespace-separated word"""
+
+    def __init__(self, n_ctx=300):
+        self._n_ctx = n_ctx
+        self.tokenized = []
+
+    def tokenize(self, text, add_bos=False, special=True):
+        self.tokenized.append(text.decode())
+        return text.decode().split()
+
+    def detokenize(self, tokens):
+        return " ".join(tokens).encode()
+
+    def n_ctx(self):
+        return self._n_ctx
+
+
+def words(word, n):
+    return " ".join([word] * n)
+
+
+def test_prompt_that_fits_is_filled_as_is():
+    prompts = PromptBuilder(WordLlama())
+    out = prompts.build("Q: {user_message} A: {answer}", "test", 50, user_message="jam buka?", answer=Slot("08.00", required=True))
+    assert out == "Q: jam buka? A: 08.00"
+
+
+def test_budget_cuts_the_question_then_the_message_but_never_the_answer():
+    prompts = PromptBuilder(WordLlama(n_ctx=300))
+    answer = " ".join(f"fakta{i}" for i in range(60))
+    out = prompts.build("Q {user_message} A {answer} Z {question}", "test", 100,
+                        user_message=Slot(words("kata", 1200), priority=2, min_tokens=32),
+                        answer=Slot(answer, required=True),
+                        question=Slot(words("pertanyaan", 20), priority=3))
+    assert answer in out
+    assert "pertanyaan" not in out
+    assert len(out.split()) <= prompts.token_budget(100)
+
+
+def test_message_is_kept_to_its_minimum_and_lists_drop_last_items():
+    prompts = PromptBuilder(WordLlama(n_ctx=200))
+    out = prompts.build("{faqs} | {user_message}", "test", 100,
+                        faqs=ListSlot([words("a", 30), words("b", 30), words("c", 30)]),
+                        user_message=Slot(words("kata", 100), priority=2, min_tokens=32))
+    faqs, message = out.split(" | ")
+    assert len(message.split()) >= 32
+    assert "a" in faqs.split() and "c" not in faqs.split()
+
+
+def test_required_slot_that_cannot_fit_raises():
+    prompts = PromptBuilder(WordLlama(n_ctx=300))
+    with pytest.raises(PromptTooLong):
+        prompts.build("{user_message} {answer}", "test", 100,
+                      user_message=Slot(words("x", 500), priority=2, min_tokens=32),
+                      answer=Slot(words("y", 300), required=True))
+
+
+def test_unused_slots_are_ignored_and_cacheable_text_is_tokenized_once():
+    llm = WordLlama()
+    prompts = PromptBuilder(llm)
+    for message in ("satu", "dua"):
+        prompts.build("Halo {user_message} dari {hospital_name}", "test", 50,
+                      user_message=message, hospital_name=Slot("RS Sehat", cacheable=True), unused=Slot("tidak dipakai"))
+    assert llm.tokenized.count("RS Sehat") == 1
+    assert llm.tokenized.count("Halo ") == 1
+    assert "tidak dipakai" not in llm.tokenized
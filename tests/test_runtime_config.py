@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from src.runtime_config import RuntimeConfig, Settings, default_values, validate
+
+
+@pytest.fixture
+def defaults():
+    return default_values()
+
+
+def test_empty_overrides_keep_defaults(defaults):
+    assert validate({}, defaults) == defaults
+
+
+def test_overrides_are_applied_and_typed(defaults):
+    values = validate({"high_confidence": 1, "rate_limit_burst": 3, "generation": {"greeting": {"max_tokens": 40}}}, defaults)
+    assert values["high_confidence"] == 1.0 and isinstance(values["high_confidence"], float)
+    assert values["rate_limit_burst"] == 3.0
+    assert values["generation"]["greeting"] == {"max_tokens": 40, "temperature": 0.7}
+    # The defaults are not modified
+    assert defaults["generation"]["greeting"]["max_tokens"] == 60
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ([], "JSON object"),
+    ({"unknown": 1}, "unknown setting"),
+    ({"use_llm": "true"}, "true or false"),
+    ({"response_cache_size": 1.5}, "integer"),
+    ({"inference_concurrency": True}, "integer"),
+    ({"high_confidence": 1.5}, "between"),
+    ({"inference_concurrency": 0}, "between"),
+    ({"medium_confidence": 0.9, "high_confidence": 0.8}, "must not exceed"),
+    ({"generation": []}, "stage names"),
+    ({"generation": {"summary": {}}}, "unknown generation stage"),
+    ({"generation": {"faq": 100}}, "must be an object"),
+    ({"generation": {"faq": {"top_p": 0.9}}}, "unknown generation setting"),
+    ({"generation": {"faq": {"max_tokens": 0}}}, "between"),
+])
+def test_invalid_overrides_are_rejected(defaults, overrides, message):
+    with pytest.raises(ValueError, match=message):
+        validate(overrides, defaults)
+
+
+def test_settings_are_immutable(defaults):
+    settings = Settings(validate({}, defaults))
+    with pytest.raises(AttributeError):
+        settings.use_llm = False
+    with pytest.raises(TypeError):
+        settings.generation("faq")["max_tokens"] = 1
+
+
+def test_invalid_file_keeps_the_previous_settings(tmp_path):
+    path = tmp_path / "runtime.json"
+    path.write_text(json.dumps({"high_confidence": 0.9}))
+    config = RuntimeConfig(str(path), poll_seconds=0)
+    seen = []
+    config.subscribe(seen.append)
+    assert config.current().high_confidence == 0.9
+
+    path.write_text(json.dumps({"high_confidence": 2}))
+    assert not config.reload()
+    assert config.current().high_confidence == 0.9
+
+    path.write_text(json.dumps({"high_confidence": 0.85, "inference_concurrency": 4}))
+    assert config.reload()
+    assert config.current().version == 2
+    assert [s.inference_concurrency for s in seen][-1] == 4
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from src.scheduler import FairScheduler, RateLimiter, TokenBucket
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(capacity=2, rate=1.0, now=0.0)
+    assert bucket.allow(now=0.0)
+    assert bucket.allow(now=0.0)
+    assert not bucket.allow(now=0.0)
+    assert bucket.allow(now=1.0)
+    # Refill never exceeds the burst
+    bucket.allow(now=100.0)
+    assert bucket.tokens == pytest.approx(1.0)
+
+
+def test_rate_limiter_is_per_key():
+    limiter = RateLimiter(burst=1, per_minute=0.001)
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+    assert limiter.allow("b")
+
+
+def test_rate_limiter_configure_applies_to_existing_buckets():
+    limiter = RateLimiter(burst=3, per_minute=0.001)
+    for _ in range(3):
+        assert limiter.allow("a")
+    limiter.configure(burst=1, per_minute=0.001)
+    assert not limiter.allow("a")
+    assert limiter._buckets["a"].capacity == 1
+
+
+def test_rate_limiter_evicts_least_recent():
+    limiter = RateLimiter(burst=1, per_minute=0.001, max_keys=2)
+    limiter.allow("a")
+    limiter.allow("b")
+    limiter.allow("a")
+    limiter.allow("c")
+    assert list(limiter._buckets) == ["a", "c"]
+
+
+def test_fair_scheduler_round_robins_between_users():
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1, max_pending_per_user=10)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def run():
+                if name == "first":
+                    await gate.wait()
+                order.append(name)
+                return name
+            return run
+
+        first = asyncio.ensure_future(scheduler.submit("busy", job("first")))
+        await asyncio.sleep(0)
+        pending = [asyncio.ensure_future(scheduler.submit("busy", job(f"busy{i}"))) for i in range(3)]
+        pending.append(asyncio.ensure_future(scheduler.submit("quiet", job("quiet"))))
+        await asyncio.sleep(0)
+        assert scheduler.pending() == 4
+        assert scheduler.pending("busy") == 3
+        gate.set()
+        await asyncio.gather(first, *pending)
+        assert scheduler.idle()
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "busy0", "quiet", "busy1", "busy2"]
+
+
+def test_fair_scheduler_has_capacity():
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1, max_pending_per_user=1)
+        gate = asyncio.Event()
+        running = asyncio.ensure_future(scheduler.submit("a", gate.wait))
+        queued = asyncio.ensure_future(scheduler.submit("a", gate.wait))
+        await asyncio.sleep(0)
+        full = scheduler.has_capacity("a")
+        gate.set()
+        await asyncio.gather(running, queued)
+        return full
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_fair_scheduler_propagates_errors():
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1)
+
+        async def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await scheduler.submit("a", fail)
+        return await scheduler.submit("a", lambda: asyncio.sleep(0, result="ok"))
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_fair_scheduler_resolves_cancelled_jobs():
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1)
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(scheduler.submit("a", cancelled), timeout=1)
+        await asyncio.sleep(0)
+        return scheduler.idle()
+
+    assert asyncio.run(scenario())
+
+
+def test_fair_scheduler_resize_starts_queued_jobs():
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1)
+        gate = asyncio.Event()
+        jobs = [asyncio.ensure_future(scheduler.submit(f"u{i}", gate.wait)) for i in range(3)]
+        await asyncio.sleep(0)
+        before = scheduler._running
+        scheduler.resize(concurrency=3, max_pending_per_user=2)
+        after = scheduler._running
+        gate.set()
+        await asyncio.gather(*jobs)
+        return before, after
+
+    assert asyncio.run(scenario()) == (1, 3)
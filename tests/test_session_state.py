@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from actions.optimized_conversational_action import OptimizedConversationalAction
+from actions.utils.prompt_builder import PromptBuilder
+from actions.utils.session_state import SessionSnapshot, SessionStateStore, history_turns, transcript
+
+
+class FakeLlama:
+    """Records restored states; each completion appends its prompt's length as a token"""
+
+    def __init__(self, n_ctx=4096):
+        self._n_ctx = n_ctx
+        self.input_ids = np.zeros(n_ctx, dtype=np.intc)
+        self.n_tokens = 0
+        self.restored = []
+        self.prompts = []
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def n_vocab(self):
+        return 8
+
+    def tokenize(self, text, add_bos=False, special=True):
+        return list(text)
+
+    def save_state(self):
+        return SimpleNamespace(llama_state=f"state-{self.n_tokens}".encode(), seed=7)
+
+    def load_state(self, state):
+        self.restored.append(state.llama_state)
+        self.n_tokens = state.n_tokens
+        self.input_ids[:state.n_tokens] = state.input_ids[:state.n_tokens]
+
+    def __call__(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        self.input_ids[self.n_tokens] = len(prompt)
+        self.n_tokens += 1
+        return {"choices": [{"text": "jawaban"}], "usage": {}}
+
+
+def snapshot(turns, nbytes=10):
+    return SessionSnapshot(turns, np.arange(3, dtype=np.intc), b"x" * nbytes, 1)
+
+
+def test_snapshot_round_trip_restores_state_and_tokens():
+    llm = FakeLlama()
+    llm("halo")
+    saved = SessionSnapshot.capture(llm, [("p", "r")])
+    llm("lain")
+    saved.restore(llm)
+    assert llm.restored == [b"state-1"]
+    assert llm.n_tokens == 1 and list(llm.input_ids[:1]) == list(saved.input_ids)
+
+
+def test_store_spills_to_disk_and_promotes_back(tmp_path):
+    store = SessionStateStore(max_ram_bytes=150, max_disk_bytes=10_000, spill_dir=str(tmp_path))
+    store.put("a", snapshot([("p", "r")], 100))
+    store.put("b", snapshot([("p", "r")], 100))
+    assert list(store._ram) == ["b"] and list(store._disk) == ["a"]
+    assert store.get("a").turns == [("p", "r")]
+    assert "a" in store._ram and "a" not in store._disk
+    store.drop("a")
+    store.drop("b")
+    assert len(store) == 0 and store.get("a") is None
+
+
+def test_history_turns_pairs_user_and_bot_messages():
+    history = [{"type": "user", "text": "jam buka?"}, {"type": "bot", "text": "08.00"}, {"type": "user", "text": "bpjs?"}]
+    turns = history_turns(history)
+    assert turns == [("<s>[INST] jam buka? [/INST] ", "08.00")]
+    assert transcript(turns, "next") == "<s>[INST] jam buka? [/INST] 08.00</s>next"
+
+
+def engine(llm):
+    action = OptimizedConversationalAction.__new__(OptimizedConversationalAction)
+    action.llm = llm
+    action.sessions = SessionStateStore(max_ram_bytes=1 << 20)
+    action.prompts = PromptBuilder(llm)
+    return action
+
+
+def test_follow_up_restores_the_senders_snapshot():
+    llm = FakeLlama()
+    action = engine(llm)
+    action.complete("turn one", "test", "sender", max_tokens=16)
+    action.complete("turn two", "test", "sender", max_tokens=16)
+    assert llm.restored == [b"state-1"]
+    assert llm.prompts[-1] == "turn onejawaban</s>turn two"
+    assert [p for p, _ in action.sessions.get("sender").turns] == ["turn one", "turn two"]
+
+
+def test_trimmed_transcript_does_not_restore_a_stale_prefix():
+    llm = FakeLlama(n_ctx=64)
+    action = engine(llm)
+    action.complete("a" * 20, "test", "sender", max_tokens=16)
+    # Both turns no longer fit next to the reply: the first is dropped
+    action.complete("b" * 25, "test", "sender", max_tokens=16)
+    assert llm.restored == []
+    assert llm.prompts[-1] == "b" * 25
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from actions.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = 0
+        gate = asyncio.Event()
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            await gate.wait()
+            return "answer"
+
+        tasks = [asyncio.ensure_future(flight.do("key", fn)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        return calls, results, len(flight)
+
+    calls, results, inflight = asyncio.run(scenario())
+    assert calls == 1
+    assert results == ["answer"] * 5
+    assert inflight == 0
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def fn(value):
+            await asyncio.sleep(0)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: fn("a")), flight.do("b", lambda: fn("b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def test_followers_receive_the_exception():
+    async def scenario():
+        flight = SingleFlight("test")
+        gate = asyncio.Event()
+
+        async def fail():
+            await gate.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.ensure_future(flight.do("key", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_nothing_is_remembered_after_completion():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        first = await flight.do("key", fn)
+        second = await flight.do("key", fn)
+        return first, second
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    async def scenario():
+        flight = SingleFlight("test")
+        gate = asyncio.Event()
+
+        async def fn():
+            await gate.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        gate.set()
+        return await leader
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    async def scenario():
+        flight = SingleFlight("test")
+        gate = asyncio.Event()
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            await gate.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        gate.set()
+        return calls, await asyncio.gather(*followers)
+
+    calls, results = asyncio.run(scenario())
+    # The cancelled leader's run plus exactly one takeover
+    assert calls == 2
+    assert results == ["done"] * 3
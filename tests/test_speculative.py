@@ -0,0 +1,50 @@
+import numpy as np
+
+from actions.utils.metrics import timed_completion
+from actions.utils.speculative import ACCEPTED, DRAFTED, MeteredDraft, settle_draft
+
+
+class FixedDraft:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def __call__(self, input_ids, **kwargs):
+        return np.array(self.tokens, dtype=np.intc)
+
+
+def test_draft_is_settled_against_the_tokens_that_followed():
+    draft = MeteredDraft(FixedDraft([5, 6, 7]), "test_settle")
+    draft(np.array([1, 2, 3], dtype=np.intc))
+    assert DRAFTED.get(mode="test_settle") == 3
+    # Main model kept 5 and 6, then sampled 9
+    draft(np.array([1, 2, 3, 5, 6, 9], dtype=np.intc))
+    assert ACCEPTED.get(mode="test_settle") == 2
+
+
+def test_draft_from_an_earlier_completion_is_not_matched():
+    draft = MeteredDraft(FixedDraft([5]), "test_stale")
+    draft(np.array([1, 2, 3, 4], dtype=np.intc))
+    draft.settle(np.array([5], dtype=np.intc))
+    assert ACCEPTED.get(mode="test_stale") == 0
+
+
+class FakeLlama:
+    def __init__(self, draft):
+        self.draft_model = draft
+        self.input_ids = np.zeros(16, dtype=np.intc)
+        self.n_tokens = 0
+
+    def __call__(self, prompt, **kwargs):
+        self.draft_model(np.array([1, 2], dtype=np.intc))
+        self.input_ids[:4] = [1, 2, 5, 6]
+        self.n_tokens = 4
+        return {"choices": [{"text": "ok"}], "usage": {}}
+
+
+def test_timed_completion_settles_the_last_draft():
+    llm = FakeLlama(MeteredDraft(FixedDraft([5, 6]), "test_timed"))
+    timed_completion(llm, "prompt", "test_speculative")
+    assert ACCEPTED.get(mode="test_timed") == 2
+    # Nothing pending afterwards
+    settle_draft(llm)
+    assert ACCEPTED.get(mode="test_timed") == 2
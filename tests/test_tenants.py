@@ -0,0 +1,90 @@
+import json
+
+from actions.utils import tenants as tenants_module
+from actions.utils.prompt_builder import PromptBuilder
+from actions.utils.tenants import Tenant, TenantIndexes, TenantRegistry, load_registry
+
+
+def registry():
+    return TenantRegistry([
+        Tenant("rs", "RS Sehat", "missing.json", "models", phone_numbers=["111"], api_keys=["key-rs"]),
+        Tenant("klinik", "Klinik X", "missing.json", "models/klinik", phone_numbers=["222"], api_keys=["key-klinik"]),
+    ])
+
+
+def test_senders_and_routing_are_scoped_per_tenant():
+    reg = registry()
+    assert reg.default.id == "rs"
+    assert reg.get("klinik").session_key("628123") == "klinik:628123"
+    # The default tenant keeps plain ids so existing sessions survive
+    assert reg.default.session_key("628123") == "628123"
+    assert reg.by_phone_number(None, "222").id == "klinik"
+    assert reg.by_phone_number("999").id == "rs"
+    assert reg.by_api_key("key-klinik").id == "klinik"
+    assert reg.by_api_key("unknown") is None
+
+
+def test_each_tenant_reads_its_own_corpus_and_prompts(tmp_path):
+    for tenant_id, answer in (("a", "Buka 08.00"), ("b", "Buka 09.00")):
+        (tmp_path / f"{tenant_id}.json").write_text(json.dumps([{"id": "faq_jam_buka", "answer": answer}]))
+    spec = {"default": "b", "tenants": [
+        {"id": "a", "faqs": str(tmp_path / "a.json"), "prompts": {"faq": "A {user_message}"}},
+        {"id": "b", "faqs": str(tmp_path / "b.json")},
+    ]}
+    (tmp_path / "tenants.json").write_text(json.dumps(spec))
+    reg = load_registry(str(tmp_path / "tenants.json"))
+    assert reg.default.id == "b"
+    assert reg.get("a").faq("faq_jam_buka")["answer"] == "Buka 08.00"
+    assert reg.get("b").faq("faq_jam_buka")["answer"] == "Buka 09.00"
+    assert reg.get("a").template("faq") == "A {user_message}"
+    assert reg.get("b").template("faq") != "A {user_message}"
+
+
+class CountingLlama:
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, text, add_bos=False, special=True):
+        self.calls += 1
+        return list(text)
+
+
+def test_alternating_tenants_keep_cached_prompt_tokens():
+    llm = CountingLlama()
+    prompts = PromptBuilder(llm, max_cached=8)
+    for _ in range(3):
+        prompts.tokenize("Jawaban tenant A", cacheable=True)
+        prompts.tokenize("Jawaban tenant B", cacheable=True)
+    assert llm.calls == 2
+
+
+def test_prompt_token_cache_evicts_least_recently_used():
+    llm = CountingLlama()
+    prompts = PromptBuilder(llm, max_cached=2)
+    prompts.tokenize("a", cacheable=True)
+    prompts.tokenize("b", cacheable=True)
+    prompts.tokenize("a", cacheable=True)
+    prompts.tokenize("c", cacheable=True)
+    assert list(prompts._tokens) == ["a", "c"]
+
+
+class FakeIndex:
+    def __init__(self, faqs_path, index_path, emb_path, embedding_model=None, docs_dir=None):
+        self.index_path = index_path
+
+    def nbytes(self):
+        return 100
+
+
+def test_tenant_indexes_are_separate_and_evicted_lru(monkeypatch):
+    monkeypatch.setattr(tenants_module, "VectorSearchManager", FakeIndex)
+    reg = registry()
+    extra = Tenant("third", "Third", "missing.json", "models/third")
+    indexes = TenantIndexes(budget_bytes=250, embedder=object())
+    rs, klinik = indexes.get(reg.get("rs")), indexes.get(reg.get("klinik"))
+    assert rs is not klinik and klinik.index_path == "models/klinik/faq_faiss.index"
+    assert indexes.get(reg.get("rs")) is rs
+    indexes.get(extra)
+    # "klinik" was used least recently
+    assert indexes.peek(reg.get("klinik")) is None
+    assert indexes.peek(reg.get("rs")) is rs
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from src.whatsapp import iter_messages, parse_payload
+
+
+def parse(payload) -> list:
+    return list(iter_messages(parse_payload(json.dumps(payload).encode("utf-8"))))
+
+
+def test_cloud_api_payload():
+    messages = parse({
+        "entry": [{"id": "1", "changes": [{"field": "messages", "value": {
+            "metadata": {"phone_number_id": "555", "display_phone_number": "6221000"},
+            "contacts": [{"wa_id": "628111"}],
+            "messages": [
+                {"from": "628111", "id": "m1", "type": "text", "text": {"body": "jam buka?"}},
+                {"from": "628111", "id": "m2", "type": "button", "button": {"text": "Poli gigi"}},
+            ],
+            "statuses": [{"id": "m0", "status": "read"}],
+        }}]}],
+    })
+    assert [(sender, text) for sender, text, _ in messages] == [("628111", "jam buka?"), ("628111", "Poli gigi")]
+    assert messages[0][2].phone_number_id == "555"
+
+
+def test_status_only_and_other_fields_yield_nothing():
+    assert parse({"entry": [{"changes": [{"field": "messages", "value": {"statuses": [{"id": "m0"}]}}]}]}) == []
+    assert parse({"entry": [{"changes": [{"field": "account_update", "value": {
+        "messages": [{"from": "1", "text": {"body": "x"}}]}}]}]}) == []
+
+
+def test_messages_without_text_are_skipped():
+    messages = parse({"entry": [{"changes": [{"value": {"messages": [
+        {"from": "628111", "type": "image"},
+        {"from": "628111", "text": {"body": "halo"}},
+    ]}}]}]})
+    assert [(sender, text) for sender, text, _ in messages] == [("628111", "halo")]
+
+
+def test_legacy_payload_falls_back_to_the_contact():
+    messages = parse({"contacts": [{"wa_id": "628222"}], "messages": [{"text": {"body": "biaya?"}}]})
+    assert messages == [("628222", "biaya?", None)]
+
+
+def test_flat_test_format():
+    assert parse({"wa_id": "628333", "text": "halo"}) == [("628333", "halo", None)]
+    assert parse({"user_id": "u1", "message": "halo"}) == [("u1", "halo", None)]
+
+
+def test_malformed_payload_is_rejected():
+    with pytest.raises(ValidationError):
+        parse_payload(b"{not json")
+    with pytest.raises(ValidationError):
+        parse_payload(json.dumps({"entry": "oops"}).encode("utf-8"))